@@ -5,7 +5,6 @@ from flask import Flask, request, redirect, session
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 
-import dmapiclient
 from dmutils import init_app
 from dmutils.user import User
 
@@ -13,7 +12,9 @@ from govuk_frontend_jinja.flask_ext import init_govuk_frontend
 
 from config import configs  # type: ignore
 
-data_api_client = dmapiclient.DataAPIClient()
+from app.api_client import RequestCachedDataAPIClient
+
+data_api_client = RequestCachedDataAPIClient()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
@@ -37,6 +38,8 @@ def create_app(config_name):
         login_manager=login_manager,
     )
 
+    from . import template_cache
+    from .main.helpers import communications, declarations, signed_urls
     from .metrics import metrics as metrics_blueprint, gds_metrics
     from .main import main as main_blueprint
     from .status import status as status_blueprint
@@ -60,6 +63,10 @@ def create_app(config_name):
     main_blueprint.config = application.config.copy()
 
     gds_metrics.init_app(application)
+    communications.init_app(application)
+    declarations.init_app(application)
+    signed_urls.init_app(application)
+    template_cache.init_app(application)
     csrf.init_app(application)
 
     @application.before_request
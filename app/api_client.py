@@ -0,0 +1,46 @@
+from copy import deepcopy
+import re
+
+from flask import g, has_app_context, has_request_context
+
+import dmapiclient
+
+# the single suppliers, frameworks and supplier frameworks (including declarations) that decorators and views fetch
+# again and again while handling a request - not lists, which can be big and are only fetched once
+CACHED_URLS = re.compile(r"^/(suppliers/[^/]+(/frameworks/[^/]+)?|frameworks/[^/]+)$")
+
+
+class RequestCachedDataAPIClient(dmapiclient.DataAPIClient):
+    """A DataAPIClient that only fetches each supplier, framework and supplier framework once per incoming request.
+
+    Decorators, helpers and views often fetch the same framework or supplier framework info while handling a single
+    request. Responses to GETs of those are kept on `flask.g` for the rest of the request and any other (writing)
+    request clears them, so anything read after a write is fetched again. Other GETs, such as the pages of a list,
+    aren't cached. Calls made for a request from other threads share its cache if they share its `g` (see
+    `app.main.helpers.concurrency`). Otherwise nothing is cached.
+    """
+    def _request_cache(self):
+        if has_request_context():
+            return g.setdefault('data_api_cache', {})
+        if has_app_context():
+            # only there if this app context shares a request's `g`
+            return g.get('data_api_cache')
+        return None
+
+    def _request(self, method, url, data=None, params=None, *, client_wait_for_response=True):
+        if method != 'GET' or not client_wait_for_response:
+            if has_app_context():
+                g.pop('data_api_cache', None)
+            return super()._request(
+                method, url, data=data, params=params, client_wait_for_response=client_wait_for_response
+            )
+
+        cache = self._request_cache() if not params and CACHED_URLS.match(url) else None
+        if cache is None:
+            return super()._request(method, url, params=params)
+
+        if url not in cache:
+            cache[url] = super()._request(method, url, params=params)
+
+        # callers are free to modify the responses they're given, so don't hand out the cached one
+        return deepcopy(cache[url])
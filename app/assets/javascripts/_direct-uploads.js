@@ -0,0 +1,87 @@
+// Direct uploads.
+//
+// Uploads documents chosen on a form with a `data-direct-upload-url` straight
+// to S3, rather than posting them with the rest of the form. The page gives
+// us upload credentials for each document and a token, which is posted with
+// the form in place of the document.
+//
+// If anything goes wrong the file input is left alone, so the document is
+// posted with the form as it would be without javascript.
+
+;(function (global) {
+  'use strict'
+
+  var $ = global.jQuery
+  var GOVUK = global.GOVUK || {}
+  GOVUK.GDM = GOVUK.GDM || {}
+
+  var tokenFieldName = function (questionId) {
+    return questionId + '-upload-token'
+  }
+
+  var setUpForm = function (form) {
+    var $form = $(form)
+    var $buttons = $form.find('button[type=submit], input[type=submit], button:not([type])')
+    var pending = 0
+
+    var uploadStarted = function () {
+      pending += 1
+      $buttons.prop('disabled', true)
+    }
+
+    var uploadFinished = function () {
+      pending -= 1
+      if (pending === 0) $buttons.prop('disabled', false)
+    }
+
+    var upload = function (input) {
+      var $input = $(input)
+      var questionId = $input.data('question') || input.name
+      var file = input.files && input.files[0]
+
+      // forget any document uploaded for this question before
+      $form.find('input[name="' + tokenFieldName(questionId) + '"]').remove()
+      $input.attr('name', questionId)
+
+      if (!file) return
+
+      uploadStarted()
+      $.ajax({
+        url: $form.data('direct-upload-url'),
+        method: 'POST',
+        data: {
+          question: questionId,
+          filename: file.name,
+          csrf_token: $form.find('input[name=csrf_token]').val()
+        }
+      }).then(function (credentials) {
+        var data = new global.FormData()
+        $.each(credentials.fields, function (name, value) { data.append(name, value) })
+        // S3 ignores any fields after the file
+        data.append('file', file)
+
+        return $.ajax({
+          url: credentials.url,
+          method: 'POST',
+          data: data,
+          processData: false,
+          contentType: false
+        }).then(function () { return credentials.token })
+      }).then(function (token) {
+        $('<input type="hidden">').attr('name', tokenFieldName(questionId)).val(token).appendTo($form)
+        // the document's been uploaded, so don't post it with the form too
+        $input.data('question', questionId).removeAttr('name')
+      }).always(uploadFinished)
+    }
+
+    $form.on('change', 'input[type=file]', function () { upload(this) })
+  }
+
+  GOVUK.GDM.directUploads = function () {
+    if (!global.FormData) return
+
+    $('form[data-direct-upload-url]').each(function () { setUpForm(this) })
+  }
+
+  global.GOVUK = GOVUK
+})(window)
@@ -20,6 +20,7 @@
 //= require _stick-at-top-when-scrolling.js
 //= require _stop-scrolling-at-footer.js
 //= require category-picker.js
+//= require _direct-uploads.js
 
 GOVUKFrontend.initAll();
 DMGOVUKFrontend.initAll();
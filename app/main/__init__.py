@@ -1,14 +1,12 @@
-from copy import deepcopy
-
 from flask import Blueprint, current_app
 from werkzeug.local import Local, LocalProxy
 
 from dmutils.direct_plus_client import DirectPlusClient
 
-from dmcontent.content_loader import ContentLoader
-
 from dmutils.timing import logged_duration
 
+from .content_loader import SharedContentLoader, HOT, WARM, COLD
+
 main = Blueprint('main', __name__)
 
 # we use our own Local for objects we explicitly want to be able to retain between requests but shouldn't
@@ -16,8 +14,35 @@ main = Blueprint('main', __name__)
 _local = Local()
 
 
+# Expired frameworks are only needed by the few suppliers still editing their old services, so they needn't all sit
+# in memory - see SharedContentLoader.load_manifests. Frameworks not listed here are always loaded at startup.
+CONTENT_TIERS = {
+    'digital-outcomes-and-specialists': COLD,
+    'digital-outcomes-and-specialists-2': COLD,
+    'digital-outcomes-and-specialists-3': WARM,
+    'digital-outcomes-and-specialists-4': WARM,
+    'g-cloud-6': COLD,
+    'g-cloud-7': COLD,
+    'g-cloud-8': COLD,
+    'g-cloud-9': COLD,
+    'g-cloud-10': WARM,
+    'g-cloud-11': WARM,
+}
+# approximate memory (in bytes) that cold frameworks' manifests may use before the least recently used are dropped
+COLD_CONTENT_BUDGET = 32 * 1024 * 1024
+
+
+def _load_manifests(primary_cl, framework_slug, manifests_to_question_sets):
+    primary_cl.load_manifests(
+        framework_slug,
+        manifests_to_question_sets,
+        tier=CONTENT_TIERS.get(framework_slug, HOT),
+    )
+
+
 def _load_dos(primary_cl):
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'digital-outcomes-and-specialists',
         {
             'declaration': 'declaration',
@@ -27,7 +52,8 @@ def _load_dos(primary_cl):
     )
     primary_cl.load_messages('digital-outcomes-and-specialists', ['urls'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'digital-outcomes-and-specialists-2',
         {
             'declaration': 'declaration',
@@ -38,7 +64,8 @@ def _load_dos(primary_cl):
     )
     primary_cl.load_messages('digital-outcomes-and-specialists-2', ['urls'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'digital-outcomes-and-specialists-3',
         {
             'declaration': 'declaration',
@@ -50,7 +77,8 @@ def _load_dos(primary_cl):
     primary_cl.load_messages('digital-outcomes-and-specialists-3', ['urls'])
     primary_cl.load_metadata('digital-outcomes-and-specialists-3', ['copy_services', 'following_framework'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'digital-outcomes-and-specialists-4',
         {
             'declaration': 'declaration',
@@ -62,16 +90,23 @@ def _load_dos(primary_cl):
     primary_cl.load_messages('digital-outcomes-and-specialists-4', ['urls'])
     primary_cl.load_metadata('digital-outcomes-and-specialists-4', ['copy_services', 'following_framework'])
 
-    primary_cl.load_manifest('digital-outcomes-and-specialists-5', 'declaration', 'declaration')
-    primary_cl.load_manifest('digital-outcomes-and-specialists-5', 'services', 'edit_submission')
-    primary_cl.load_manifest('digital-outcomes-and-specialists-5', 'services', 'edit_service')
-    primary_cl.load_manifest('digital-outcomes-and-specialists-5', 'briefs', 'edit_brief')
+    _load_manifests(
+        primary_cl,
+        'digital-outcomes-and-specialists-5',
+        {
+            'declaration': 'declaration',
+            'edit_submission': 'services',
+            'edit_service': 'services',
+            'edit_brief': 'briefs',
+        },
+    )
     primary_cl.load_messages('digital-outcomes-and-specialists-5', ['urls', 'e-signature'])
     primary_cl.load_metadata('digital-outcomes-and-specialists-5', ['copy_services', 'following_framework'])
 
 
 def _load_g_cloud(primary_cl):
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-6',
         {
             'edit_service': 'services',
@@ -79,7 +114,8 @@ def _load_g_cloud(primary_cl):
     )
     primary_cl.load_messages('g-cloud-6', ['urls'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-7',
         {
             'edit_service': 'services',
@@ -89,7 +125,8 @@ def _load_g_cloud(primary_cl):
     )
     primary_cl.load_messages('g-cloud-7', ['urls'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-8',
         {
             'edit_service': 'services',
@@ -99,7 +136,8 @@ def _load_g_cloud(primary_cl):
     )
     primary_cl.load_messages('g-cloud-8', ['urls'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-9',
         {
             'edit_service': 'services',
@@ -109,7 +147,8 @@ def _load_g_cloud(primary_cl):
     )
     primary_cl.load_messages('g-cloud-9', ['urls', 'advice'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-10',
         {
             'edit_service': 'services',
@@ -120,7 +159,8 @@ def _load_g_cloud(primary_cl):
     primary_cl.load_messages('g-cloud-10', ['urls', 'advice'])
     primary_cl.load_metadata('g-cloud-10', ['copy_services'])
 
-    primary_cl.lazy_load_manifests(
+    _load_manifests(
+        primary_cl,
         'g-cloud-11',
         {
             'edit_service': 'services',
@@ -131,37 +171,52 @@ def _load_g_cloud(primary_cl):
     primary_cl.load_messages('g-cloud-11', ['urls', 'advice'])
     primary_cl.load_metadata('g-cloud-11', ['copy_services', 'following_framework'])
 
-    primary_cl.load_manifest('g-cloud-12', 'services', 'edit_service')
-    primary_cl.load_manifest('g-cloud-12', 'services', 'edit_submission')
-    primary_cl.load_manifest('g-cloud-12', 'declaration', 'declaration')
+    _load_manifests(
+        primary_cl,
+        'g-cloud-12',
+        {
+            'edit_service': 'services',
+            'edit_submission': 'services',
+            'declaration': 'declaration',
+        },
+    )
     primary_cl.load_messages('g-cloud-12', ['urls', 'advice', 'e-signature'])
     primary_cl.load_metadata('g-cloud-12', ['copy_services', 'following_framework'])
 
-    primary_cl.load_manifest('g-cloud-13', 'services', 'edit_service')
-    primary_cl.load_manifest('g-cloud-13', 'services', 'edit_submission')
-    primary_cl.load_manifest('g-cloud-13', 'declaration', 'declaration')
+    _load_manifests(
+        primary_cl,
+        'g-cloud-13',
+        {
+            'edit_service': 'services',
+            'edit_submission': 'services',
+            'declaration': 'declaration',
+        },
+    )
     primary_cl.load_messages('g-cloud-13', ['urls', 'advice', 'e-signature'])
     primary_cl.load_metadata('g-cloud-13', ['copy_services', 'following_framework'])
 
 
-def _make_content_loader_factory():
-    primary_cl = ContentLoader('app/content')
+CONTENT_PATH = 'app/content'
+# built by scripts/build-content-snapshot.py - lets workers skip parsing the YAML content at startup
+CONTENT_SNAPSHOT_PATH = 'app/content-snapshot.pickle'
+
+
+def _make_content_loader(snapshot_path=CONTENT_SNAPSHOT_PATH):
+    primary_cl = SharedContentLoader(CONTENT_PATH, cold_content_budget=COLD_CONTENT_BUDGET)
 
-    _load_dos(primary_cl)
-    _load_g_cloud(primary_cl)
+    if not (snapshot_path and primary_cl.load_snapshot(snapshot_path)):
+        _load_dos(primary_cl)
+        _load_g_cloud(primary_cl)
 
-    # seal primary_cl in a closure by returning a function which will only ever return an independent copy of it
-    return lambda: deepcopy(primary_cl)
+    return primary_cl
 
 
-_content_loader_factory = _make_content_loader_factory()
+# a single loader shared by all threads - manifests it hands out are per-call wrappers around its read-only content
+_content_loader = _make_content_loader()
 
 
-@logged_duration(message="Spent {duration_real}s in get_content_loader")
 def get_content_loader():
-    if not hasattr(_local, "content_loader"):
-        _local.content_loader = _content_loader_factory()
-    return _local.content_loader
+    return _content_loader
 
 
 @logged_duration(message="Spent {duration_real}s in get_direct_plus_client")
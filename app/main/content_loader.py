@@ -0,0 +1,455 @@
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+import hashlib
+from importlib.metadata import version, PackageNotFoundError
+import json
+import logging
+import os
+import pickle
+import sys
+from threading import Lock, RLock
+from weakref import WeakSet
+
+from jinja2 import meta, TemplateSyntaxError
+
+from dmcontent.content_loader import ContentLoader, ContentManifest, ContentNotFoundError
+from dmcontent.utils import TemplateField, template_environment
+
+logger = logging.getLogger(__name__)
+
+# bump this whenever the layout of the pickled loader state changes
+SNAPSHOT_FORMAT_VERSION = 3
+
+# How a framework's manifests are kept in memory:
+#  - HOT manifests are loaded at startup
+#  - WARM manifests are loaded the first time they're used and then kept
+#  - COLD manifests are loaded when used and dropped again when the least recently used ones exceed a memory budget
+HOT = 'hot'
+WARM = 'warm'
+COLD = 'cold'
+
+# how many differently filtered versions of each manifest to keep
+FILTERED_MANIFEST_CACHE_SIZE = 32
+
+_MISSING = object()
+
+
+def _content_loader_version():
+    try:
+        return version('digitalmarketplace-content-loader')
+    except PackageNotFoundError:
+        return None
+
+
+def content_hash(content_path):
+    """Return a hash of every file beneath `content_path`"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(content_path):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            digest.update(os.path.relpath(path, content_path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def content_stamp(content_path):
+    """Return something that changes whenever the content beneath `content_path` does, used to tell whether a snapshot
+    is still current.
+
+    The frontend build copies the frameworks package's package.json in alongside the content, so that's its version.
+    Without it, every content file is hashed, which means reading all of them.
+    """
+    try:
+        with open(os.path.join(content_path, 'package.json'), 'rb') as f:
+            return 'digitalmarketplace-frameworks=={}'.format(json.load(f)['version'])
+    except (FileNotFoundError, KeyError, ValueError):
+        return content_hash(content_path)
+
+
+def approximate_size(obj):
+    """Return a rough estimate of the memory in bytes used by a piece of loaded content"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(key) + approximate_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(approximate_size(item) for item in obj)
+    elif isinstance(obj, TemplateField):
+        size += approximate_size(obj.source)
+
+    return size
+
+
+def _add_context_keys(item, keys):
+    if isinstance(item, TemplateField):
+        keys.update(meta.find_undeclared_variables(template_environment.parse(item.source)))
+    elif isinstance(item, dict):
+        if item.get('type') == 'dynamic_list':
+            raise ValueError("Filtering a dynamic list depends on the whole context")
+        keys.update(depends['on'] for depends in item.get('depends', []))
+        _add_context_keys(list(item.values()), keys)
+    elif isinstance(item, list):
+        for value in item:
+            _add_context_keys(value, keys)
+
+
+def get_context_keys(sections):
+    """Return the set of context keys that filtering `sections` depends on.
+
+    These are the keys named in `depends` rules plus any variables used by templated fields. Returns None if the
+    result of filtering can depend on more than that (dynamic lists expand based on the contents of the context).
+    """
+    keys = set()
+    try:
+        _add_context_keys(sections, keys)
+    except (ValueError, TemplateSyntaxError):
+        return None
+
+    return frozenset(keys)
+
+
+class _ColdManifests(Mapping):
+    """Stands in for the manifests of a COLD framework, fetching them through the loader's LRU cache"""
+    def __init__(self, content_loader, framework_slug, manifests_to_question_sets):
+        self._content_loader = content_loader
+        self._framework_slug = framework_slug
+        self._question_sets = dict(manifests_to_question_sets)
+
+    def __getitem__(self, manifest):
+        if manifest not in self._question_sets:
+            raise KeyError(manifest)
+
+        return self._content_loader._get_cold_manifest(self._framework_slug, self._question_sets[manifest], manifest)
+
+    def __contains__(self, manifest):
+        return manifest in self._question_sets
+
+    def __iter__(self):
+        return iter(self._question_sets)
+
+    def __len__(self):
+        return len(self._question_sets)
+
+
+class _WarmManifests(MutableMapping):
+    """Stands in for the manifests of a WARM framework, loading each through the loader the first time it's used"""
+    def __init__(self, content_loader, framework_slug, manifests_to_question_sets, loaded=None):
+        self._content_loader = content_loader
+        self._framework_slug = framework_slug
+        self._question_sets = dict(manifests_to_question_sets)
+        # manifest -> sections, for those loaded so far
+        self._loaded = dict(loaded or {})
+
+    def __getitem__(self, manifest):
+        sections = self._loaded.get(manifest)
+        if sections is not None:
+            return sections
+        if manifest not in self._question_sets:
+            raise KeyError(manifest)
+
+        return self._content_loader._get_warm_manifest(self, manifest)
+
+    def __setitem__(self, manifest, sections):
+        self._loaded[manifest] = sections
+
+    def __delitem__(self, manifest):
+        if manifest not in self:
+            raise KeyError(manifest)
+        self._question_sets.pop(manifest, None)
+        self._loaded.pop(manifest, None)
+
+    def __contains__(self, manifest):
+        return manifest in self._loaded or manifest in self._question_sets
+
+    def __iter__(self):
+        return iter(self._question_sets.keys() | self._loaded.keys())
+
+    def __len__(self):
+        return len(self._question_sets.keys() | self._loaded.keys())
+
+
+class _SnapshotTemplateField(TemplateField):
+    """A TemplateField restored from a snapshot, which only compiles its template the first time it's rendered"""
+    def __init__(self, field_value, markdown):
+        self.source = field_value
+        self.markdown = markdown
+        self._template = None
+
+    @property
+    def template(self):
+        if self._template is None:
+            self._template = self.make_template(self.source)
+        return self._template
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, content_loader):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._content_loader = content_loader
+
+    def persistent_id(self, obj):
+        # lazily loaded manifests hold bound methods of the loader - rebind those to whichever loader restores us
+        return 'content_loader' if obj is self._content_loader else None
+
+    def reducer_override(self, obj):
+        # compiled templates can't be pickled, so keep their source and recompile on first use
+        if isinstance(obj, TemplateField):
+            return _SnapshotTemplateField, (obj.source, obj.markdown)
+        return NotImplemented
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, content_loader):
+        super().__init__(file)
+        self._content_loader = content_loader
+
+    def persistent_load(self, pid):
+        if pid != 'content_loader':
+            raise pickle.UnpicklingError("Unknown persistent id in content snapshot: {}".format(pid))
+        return self._content_loader
+
+
+class SharedContentLoader(ContentLoader):
+    """A ContentLoader that can be shared read-only between every thread in a worker.
+
+    Each call to `get_manifest` builds a new ContentManifest around the shared section data, so the `filter` and
+    `summary` calls a request makes only ever modify its own wrapper objects. The only writes left after startup
+    (lazily generated manifests, cached questions and messages loaded during a request) are done under a lock.
+
+    That lock is only held to read and update the loader's state, so that loading a WARM or COLD manifest from YAML
+    doesn't hold up requests for any other content. Each manifest has a lock of its own, held while it's loaded, so
+    that it's only loaded by one thread at a time.
+    """
+    def __init__(self, content_path, cold_content_budget=None):
+        super().__init__(content_path)
+        self._lock = RLock()
+        # (framework_slug, manifest) -> Lock held while that manifest is loaded
+        self._load_locks = {}
+
+        # least recently used first, (framework_slug, manifest) -> (sections, approximate size)
+        self._cold_manifests = OrderedDict()
+        self._cold_content_size = 0
+        self._cold_content_budget = cold_content_budget
+
+        # (framework_slug, manifest) -> context keys, and -> {filter context values: filtered ContentManifest}
+        self._context_keys = {}
+        self._filtered_manifests = {}
+        # the questions of those filtered manifests, which every request for them shares
+        self._shared_questions = WeakSet()
+
+    def _get_manifest_sections(self, framework_slug, manifest):
+        with self._lock:
+            manifests = self._content.get(framework_slug, {})
+
+        # outside the lock, as WARM and COLD manifests are loaded the first time they're used
+        try:
+            return manifests[manifest]
+        except KeyError:
+            raise ContentNotFoundError("Content not found for {} and {}".format(framework_slug, manifest))
+
+    def get_manifest(self, framework_slug, manifest):
+        return ContentManifest(self._get_manifest_sections(framework_slug, manifest))
+
+    get_builder = get_manifest
+
+    def get_filtered_manifest(self, framework_slug, manifest, context):
+        """Return the equivalent of `get_manifest(framework_slug, manifest).filter(context)`.
+
+        Filtered manifests are cached by the values of just the context keys the manifest's `depends` rules and
+        templates read, so e.g. all the drafts in a lot share one. Each call returns a new ContentManifest wrapping
+        the cached sections, so callers can go on to call `summary(..., inplace_allowed=True)` on it.
+        """
+        sections = self._get_manifest_sections(framework_slug, manifest)
+        manifest_key = (framework_slug, manifest)
+
+        with self._lock:
+            if manifest_key not in self._context_keys:
+                self._context_keys[manifest_key] = get_context_keys(sections)
+            context_keys = self._context_keys[manifest_key]
+
+        if context_keys is None:
+            return ContentManifest(sections).filter(context, inplace_allowed=True)
+
+        filter_key = tuple((key, context[key] if key in context else _MISSING) for key in sorted(context_keys))
+        try:
+            hash(filter_key)
+        except TypeError:
+            return ContentManifest(sections).filter(context, inplace_allowed=True)
+
+        with self._lock:
+            filtered_manifests = self._filtered_manifests.setdefault(manifest_key, OrderedDict())
+            filtered = filtered_manifests.get(filter_key)
+            if filtered is None:
+                # only keep the bits of the context that matter, rather than a reference to e.g. someone's draft
+                filtered = ContentManifest(sections).filter(
+                    {key: value for key, value in filter_key if value is not _MISSING},
+                    inplace_allowed=True,
+                )
+                filtered_manifests[filter_key] = filtered
+                self._shared_questions.update(
+                    question for section in filtered.sections for question in section.questions
+                )
+                if len(filtered_manifests) > FILTERED_MANIFEST_CACHE_SIZE:
+                    filtered_manifests.popitem(last=False)
+            else:
+                filtered_manifests.move_to_end(filter_key)
+
+        return ContentManifest(filtered.sections)
+
+    def is_shared(self, sections):
+        """Whether the questions in `sections` are all shared by requests for a filtered manifest, rather than e.g. a
+        request's summary of one. Each request gets its own copies of the sections, so only the questions are shared.
+        """
+        questions = [question for section in sections for question in section.questions]
+        with self._lock:
+            return bool(questions) and all(question in self._shared_questions for question in questions)
+
+    def load_manifest(self, framework_slug, question_set, manifest):
+        with self._lock:
+            return super().load_manifest(framework_slug, question_set, manifest)
+
+    def lazy_load_manifests(self, framework_slug, manifests_to_question_sets):
+        with self._lock:
+            self._content[framework_slug] = _WarmManifests(
+                self, framework_slug, manifests_to_question_sets, loaded=self._content.get(framework_slug),
+            )
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, Lock())
+
+    def _get_warm_manifest(self, warm_manifests, manifest):
+        with self._load_lock((warm_manifests._framework_slug, manifest)):
+            # another thread may have loaded it while we were waiting
+            with self._lock:
+                sections = warm_manifests._loaded.get(manifest)
+            if sections is not None:
+                return sections
+
+            sections = self.generate_manifest(
+                warm_manifests._framework_slug, warm_manifests._question_sets[manifest], manifest
+            )
+            with self._lock:
+                warm_manifests[manifest] = sections
+
+            return sections
+
+    def load_manifests(self, framework_slug, manifests_to_question_sets, tier=HOT):
+        """Load all the manifests for a framework, keeping them in memory according to `tier`"""
+        if tier == HOT:
+            for manifest, question_set in manifests_to_question_sets.items():
+                self.load_manifest(framework_slug, question_set, manifest)
+        elif tier == WARM:
+            self.lazy_load_manifests(framework_slug, manifests_to_question_sets)
+        elif tier == COLD:
+            with self._lock:
+                self._content[framework_slug] = _ColdManifests(self, framework_slug, manifests_to_question_sets)
+        else:
+            raise ValueError("Unknown content tier: {}".format(tier))
+
+    def _get_cached_cold_manifest(self, key):
+        with self._lock:
+            if key in self._cold_manifests:
+                self._cold_manifests.move_to_end(key)
+                return self._cold_manifests[key][0]
+
+        return None
+
+    def _get_cold_manifest(self, framework_slug, question_set, manifest):
+        key = (framework_slug, manifest)
+        sections = self._get_cached_cold_manifest(key)
+        if sections is not None:
+            return sections
+
+        with self._load_lock(key):
+            # another thread may have loaded it while we were waiting
+            sections = self._get_cached_cold_manifest(key)
+            if sections is not None:
+                return sections
+
+            sections = self.generate_manifest(framework_slug, question_set, manifest)
+            size = approximate_size(sections)
+
+            with self._lock:
+                # loading the manifest also cached its questions, which would keep them in memory after it's evicted
+                self._questions.pop(framework_slug, None)
+
+                self._cold_manifests[key] = (sections, size)
+                self._cold_content_size += size
+
+                # evict least recently used manifests, but always keep the one we've just loaded
+                while (
+                    self._cold_content_budget is not None
+                    and self._cold_content_size > self._cold_content_budget
+                    and len(self._cold_manifests) > 1
+                ):
+                    evicted_key, (_, evicted_size) = self._cold_manifests.popitem(last=False)
+                    self._cold_content_size -= evicted_size
+                    self._filtered_manifests.pop(evicted_key, None)
+
+                return sections
+
+    def get_question(self, framework_slug, question_set, question):
+        with self._lock:
+            return super().get_question(framework_slug, question_set, question)
+
+    def load_messages(self, framework_slug, blocks):
+        with self._lock:
+            return super().load_messages(framework_slug, blocks)
+
+    def load_metadata(self, framework_slug, blocks):
+        with self._lock:
+            return super().load_metadata(framework_slug, blocks)
+
+    def _snapshot_header(self):
+        return {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'content_loader_version': _content_loader_version(),
+            'content_stamp': content_stamp(self.content_path),
+        }
+
+    def dump_snapshot(self, snapshot_path):
+        """Write everything loaded so far to `snapshot_path`, to be restored at startup with `load_snapshot`"""
+        with self._lock:
+            state = {
+                'content': self._content,
+                'messages': self._messages,
+                'metadata': self._metadata,
+                'questions': self._questions,
+            }
+            tmp_path = '{}.tmp'.format(snapshot_path)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self._snapshot_header(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                _SnapshotPickler(f, self).dump(state)
+            os.replace(tmp_path, snapshot_path)
+
+    def load_snapshot(self, snapshot_path):
+        """Restore the state written by `dump_snapshot`.
+
+        Returns False, leaving the loader untouched, if there is no snapshot or if it was built from different content
+        or by a different version of the content loader - the caller should then load content from YAML as usual.
+        """
+        try:
+            f = open(snapshot_path, 'rb')
+        except FileNotFoundError:
+            return False
+
+        with f, self._lock:
+            try:
+                header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                header = None
+
+            if header != self._snapshot_header():
+                logger.warning("Ignoring out of date content snapshot at %s", snapshot_path)
+                return False
+
+            state = _SnapshotUnpickler(f, self).load()
+            self._content = state['content']
+            self._messages = state['messages']
+            self._metadata = state['metadata']
+            self._questions = state['questions']
+
+        return True
@@ -0,0 +1,184 @@
+from bisect import bisect_left
+from threading import Lock, Thread
+import time
+
+from flask import current_app
+
+from dmutils import s3
+
+# how long a listing is used before it's fetched again - communications are uploaded by the admin app, so unless a
+# supplier downloads a new one first (see `communication_found`) this is how long it can take to show up
+LISTING_TTL = 5 * 60
+# how much longer an out of date listing is still used while a fresh one is fetched in the background
+LISTING_STALE_TTL = 60 * 60
+
+
+class FileIndex:
+    """An index of the files in an S3 listing by path.
+
+    Files beneath a prefix are found by binary search of the sorted paths, and the most recent of them by looking up
+    a sparse table of the latest file in each power-of-two run of paths, rather than by scanning the whole listing.
+    """
+    def __init__(self, listing):
+        # S3.list returns files oldest first, so a file's position in the listing says how recent it is
+        self._files = sorted(enumerate(listing), key=lambda position_and_file: position_and_file[1]['path'])
+        self._paths = [file['path'] for _, file in self._files]
+
+        # _latest[level][i] is the position in the listing of the latest file in _files[i:i + 2 ** level]
+        self._latest = [[position for position, _ in self._files]]
+        width = 1
+        while width * 2 <= len(self._files):
+            previous = self._latest[-1]
+            self._latest.append([max(previous[i], previous[i + width]) for i in range(len(previous) - width)])
+            width *= 2
+
+        self._files_by_position = {position: file for position, file in self._files}
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        start, end = self._find(path)
+        return start < end and self._paths[start] == path
+
+    def _find(self, prefix):
+        start = bisect_left(self._paths, prefix)
+        # every path beginning with the prefix sorts before the prefix followed by the highest possible character
+        end = bisect_left(self._paths, prefix + '\U0010ffff', start)
+        return start, end
+
+    def latest(self, prefix):
+        """Return the most recent file whose path starts with `prefix`, or None"""
+        start, end = self._find(prefix)
+        if start == end:
+            return None
+
+        level = (end - start).bit_length() - 1
+        latest = self._latest[level]
+        return self._files_by_position[max(latest[start], latest[end - 2 ** level])]
+
+    def group_by_folder(self, prefix):
+        """Return the files beneath `prefix` grouped by the name of the folder directly beneath it, oldest first"""
+        start, end = self._find(prefix)
+        folders = {}
+        for _, file in sorted(self._files[start:end], key=lambda position_and_file: position_and_file[0]):
+            folder, _, _ = file['path'][len(prefix):].partition('/')
+            folders.setdefault(folder, []).append(file)
+
+        return folders
+
+
+class S3ListingCache:
+    """FileIndexes of the listings of S3 prefixes, shared by every thread in a worker.
+
+    A listing is fetched again once it's `ttl` seconds old. For `stale_ttl` seconds after that the old listing is
+    still returned while a fresh one is fetched in the background, so only the first request after a listing has
+    gone completely out of date waits for S3. Call `invalidate` when a file is added to or removed from a bucket.
+
+    Files are added to these buckets by other apps, so this app only finds out about a new one when it's downloaded.
+    The listings are kept in memory, so restarting the app's workers forgets all of them straight away.
+    """
+    def __init__(self, ttl=LISTING_TTL, stale_ttl=LISTING_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = Lock()
+        # (bucket_name, prefix) -> (time fetched, FileIndex)
+        self._listings = {}
+        self._refreshing = set()
+        # bumped by invalidate, so that listings fetched from before then aren't stored
+        self._generation = 0
+
+    def _fetch(self, bucket_name, prefix):
+        with self._lock:
+            generation = self._generation
+
+        index = FileIndex(s3.S3(bucket_name).list(prefix, load_timestamps=True))
+
+        with self._lock:
+            if generation == self._generation:
+                self._listings[(bucket_name, prefix)] = (time.monotonic(), index)
+
+        return index
+
+    def _refresh_in_background(self, bucket_name, prefix):
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self._fetch(bucket_name, prefix)
+            except Exception:
+                app.logger.exception(
+                    "Failed to refresh listing of {bucket_name}/{prefix}",
+                    extra={'bucket_name': bucket_name, 'prefix': prefix},
+                )
+            finally:
+                with self._lock:
+                    self._refreshing.discard((bucket_name, prefix))
+
+        Thread(target=refresh, daemon=True).start()
+
+    def get(self, bucket_name, prefix):
+        """Return a FileIndex of `s3.S3(bucket_name).list(prefix, load_timestamps=True)`.
+
+        The index is shared, so the files in it mustn't be modified.
+        """
+        key = (bucket_name, prefix)
+        refresh = False
+        with self._lock:
+            fetched_at, index = self._listings.get(key, (None, None))
+            age = time.monotonic() - fetched_at if index is not None else None
+
+            if age is None or age >= self.ttl + self.stale_ttl:
+                index = None
+            elif age >= self.ttl and key not in self._refreshing:
+                self._refreshing.add(key)
+                refresh = True
+
+        if index is None:
+            index = self._fetch(bucket_name, prefix)
+        elif refresh:
+            self._refresh_in_background(bucket_name, prefix)
+
+        return index
+
+    def invalidate(self, bucket_name, path='', unless_listed=False):
+        """Forget the listings of `bucket_name` that could include `path`, or all of them if no path is given.
+
+        With `unless_listed`, listings that already include a file at `path` are kept, for when it's known to exist.
+        """
+        with self._lock:
+            self._generation += 1
+            for listing_bucket_name, prefix in list(self._listings):
+                if listing_bucket_name != bucket_name or not (path.startswith(prefix) or prefix.startswith(path)):
+                    continue
+                if unless_listed and path in self._listings[(bucket_name, prefix)][1]:
+                    continue
+                del self._listings[(bucket_name, prefix)]
+
+
+def init_app(application):
+    application.extensions['communications_listings'] = S3ListingCache()
+
+
+def get_communications(framework_slug):
+    """Return a FileIndex of a framework's files in the communications bucket"""
+    bucket_name = current_app.config['DM_COMMUNICATIONS_BUCKET']
+    prefix = '{}/communications'.format(framework_slug)
+    return current_app.extensions['communications_listings'].get(bucket_name, prefix)
+
+
+def invalidate_communications(path=''):
+    """Call when a communication is uploaded to or removed from `path`, so that the change shows up straight away"""
+    bucket_name = current_app.config['DM_COMMUNICATIONS_BUCKET']
+    current_app.extensions['communications_listings'].invalidate(bucket_name, path)
+
+
+def communication_found(path):
+    """Call when a communication has been found at `path`, so that if it's new it shows up straight away.
+
+    Nothing tells this app when a communication is uploaded, so the first supplier to download a new one is how it
+    finds out.
+    """
+    bucket_name = current_app.config['DM_COMMUNICATIONS_BUCKET']
+    current_app.extensions['communications_listings'].invalidate(bucket_name, path, unless_listed=True)
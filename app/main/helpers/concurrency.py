@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from flask import current_app, g
+
+# shared by every request a worker handles, so a busy worker can't start an unbounded number of threads
+MAX_CONCURRENT_CALLS = 8
+
+# longer than the data API client's own read timeout, so this only catches calls that have really hung
+DEFAULT_TIMEOUT = 60
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix='concurrent-call')
+
+
+def _with_request_globals(call):
+    """Wrap `call` so that it runs in an app context that shares the current request's `g`.
+
+    The data API client's request cache is on `g`, so is visible to (and kept up to date by) calls made from other
+    threads. The request context itself stays with the request's own thread - popping a copy of it elsewhere would
+    close the request's uploaded files - so calls can't use `request`, `session` or `current_user`, and should be
+    passed anything they need from them instead.
+    """
+    app = current_app._get_current_object()
+    request_globals = g._get_current_object()
+
+    def wrapper():
+        app_ctx = app.app_context()
+        app_ctx.g = request_globals
+        with app_ctx:
+            return call()
+
+    return wrapper
+
+
+def call_concurrently(*calls, timeout=DEFAULT_TIMEOUT, executor=None):
+    """Run each of `calls` (functions taking no arguments) on a thread pool and return a list of their results.
+
+    Each kind of work should have its own `executor`, so that it can't be held up waiting behind another - by default
+    calls share a pool of `MAX_CONCURRENT_CALLS` threads.
+
+    Any exception raised by a call - including aborting the request - is raised here. If the calls take longer than
+    `timeout` seconds a `concurrent.futures.TimeoutError` is raised and calls that haven't started are cancelled.
+    """
+    executor = executor or _executor
+    futures = [executor.submit(_with_request_globals(call)) for call in calls]
+    deadline = time.monotonic() + timeout
+
+    try:
+        return [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
@@ -0,0 +1,306 @@
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+from threading import Lock
+
+from flask import Markup, current_app, url_for
+
+from dmcontent import govuk_frontend
+from dmcontent.html import to_summary_list_row
+from dmutils.forms.errors import govuk_error
+from dmutils.forms.helpers import govuk_options
+
+from ...main import content_loader
+from .frameworks import question_references
+from .validation import get_validator
+
+# enough for the suppliers checking their declarations at any one time - each overview is a few tens of KB of rows
+DECLARATION_OVERVIEW_CACHE_SIZE = 256
+# enough for every section of every open framework's declaration
+QUESTION_PARAMS_CACHE_SIZE = 64
+
+# the types of question whose answers and errors can be added to their cached macro parameters, rather than
+# building the parameters again
+MERGEABLE_QUESTION_TYPES = ('text', 'number', 'textbox_large', 'radios', 'checkboxes', 'boolean')
+
+
+# what the declaration overview shows of each section, without the section's questions
+DeclarationOverviewSection = namedtuple(
+    'DeclarationOverviewSection', ['slug', 'id', 'name', 'editable', 'summary_page_description', 'summary_list']
+)
+
+
+def declaration_hash(declaration):
+    """Return a hash of a declaration's answers, which is the same for any declaration with the same answers"""
+    return hashlib.sha256(json.dumps(declaration, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def build_declaration_overview(framework, supplier_framework):
+    """Return the sections of a supplier's declaration for the declaration overview, with their errors.
+
+    Returns an ordered dict of the form {section_slug: (section, section_errors)}, where each section is a
+    DeclarationOverviewSection with a `summary_list` of govukSummaryList rows, and whether the declaration validates.
+    """
+    declaration = supplier_framework["declaration"]
+    content = content_loader.get_filtered_manifest(framework["slug"], 'declaration', declaration)
+
+    # the declaration is validated once and the errors shared out between the sections.
+    declaration_validator = get_validator(framework, content, declaration)
+    summary_sections = content.summary(declaration)
+    errors_by_section = declaration_validator.get_error_messages_by_section(
+        section for section in summary_sections if section.editable
+    )
+
+    sections_errors = OrderedDict()
+    for section in summary_sections:
+        # Create govukSummaryList-friendly fields
+        summary_list = []
+        for question in section.questions:
+            if supplier_framework["prefillDeclarationFromFrameworkSlug"] and section.prefill:
+                question.empty_message = "Review answer"
+            else:
+                question.empty_message = "Answer question"
+            row = to_summary_list_row(
+                question,
+                action_link=url_for(
+                    ".framework_supplier_declaration_edit",
+                    framework_slug=framework["slug"],
+                    section_id=section.id,
+                    _anchor=question.id if section.questions[0].id != question.id else None
+                ) if framework["status"] == "open" else None
+            )
+
+            # We need to parse key text for question references. This isn't optimal, but references only apply to
+            # this app, so holding off on centralising this logic to the Content Loader.
+            row["key"]["text"] = question_references(row.get("key", {}).get("text", ""), section.get_question)
+            summary_list.append(row)
+
+        sections_errors[section.slug] = (
+            DeclarationOverviewSection(
+                slug=section.slug,
+                id=section.id,
+                name=section.name,
+                editable=section.editable,
+                summary_page_description=section.summary_page_description,
+                summary_list=tuple(summary_list),
+            ),
+            errors_by_section.get(section.slug),
+        )
+
+    return sections_errors, not any(errors for section, errors in sections_errors.values())
+
+
+class DeclarationOverviewCache:
+    """Declaration overviews, shared by every thread in a worker and kept for as long as the declaration is unchanged.
+
+    Suppliers come back to the overview often to check their progress, and building it means summarising and
+    validating every question. The overview only depends on the framework's content and whether it's open, whether
+    the declaration is being prefilled from another framework, and the answers, so that's what it's cached by. The
+    content can't change while the app is running.
+
+    Only the rows and errors the overview page shows are kept, rather than the summarised content they were built
+    from. Cached overviews are shared between requests, so must only be read.
+    """
+    def __init__(self, size=DECLARATION_OVERVIEW_CACHE_SIZE):
+        self.size = size
+        self._lock = Lock()
+        # least recently used first, key -> (sections_errors, validates)
+        self._overviews = OrderedDict()
+
+    def get(self, framework, supplier_framework):
+        """Return the equivalent of `build_declaration_overview(framework, supplier_framework)`"""
+        key = (
+            framework["slug"],
+            framework["status"] == "open",
+            bool(supplier_framework["prefillDeclarationFromFrameworkSlug"]),
+            declaration_hash(supplier_framework["declaration"]),
+        )
+        with self._lock:
+            overview = self._overviews.get(key)
+            if overview is not None:
+                self._overviews.move_to_end(key)
+                return overview
+
+        overview = build_declaration_overview(framework, supplier_framework)
+
+        with self._lock:
+            self._overviews[key] = overview
+            while len(self._overviews) > self.size:
+                self._overviews.popitem(last=False)
+
+        return overview
+
+
+def init_app(application):
+    application.extensions['declaration_overviews'] = DeclarationOverviewCache()
+
+
+def get_declaration_overview(framework, supplier_framework):
+    """Return the sections of a supplier's declaration for the declaration overview and whether it validates"""
+    return current_app.extensions['declaration_overviews'].get(framework, supplier_framework)
+
+
+def _adjust_question_params(question_data, question, get_question):
+    """Add the classes, question number and question references the declaration edit page uses to the macro
+    parameters `govuk_frontend.from_question` made for `question`
+    """
+    if isinstance(question_data, list):
+        for q in question_data:
+            _adjust_question_params(q, question, get_question)
+        return question_data
+
+    # we want to use a class to style numbered questions
+    if "fieldset" in question_data:
+        label_or_legend = question_data["fieldset"]["legend"]
+        question_data["fieldset"]["classes"] = (
+            "dm-numbered-question {}".format(question_data['fieldset'].get('classes', ''))
+        )
+    else:
+        label_or_legend = question_data["label"]
+        question_data["label"]["classes"] = (
+            "dm-numbered-question {}".format(question_data['label'].get('classes', ''))
+        )
+
+    params = question_data["params"]
+
+    # we allow question references in the question label, hint, and error message
+    label_or_legend["text"] = question_references(label_or_legend["text"], get_question)
+    if "hint" in params:
+        params["hint"]["text"] = question_references(params["hint"]["text"], get_question)
+    if "errorMessage" in params:
+        params["errorMessage"]["text"] = question_references(params["errorMessage"]["text"], get_question)
+
+    # we want question numbers in the label
+    label_or_legend["html"] = (
+        Markup(f'<span class="dm-numbered-question__number">{question.number}</span> ')
+        + label_or_legend["text"]
+    )
+    del label_or_legend["text"]
+
+    return question_data
+
+
+def _merge_question_answer(question_data, question, get_question, answers, errors):
+    """Add an answer and error to the macro parameters for an unanswered question, the same as `from_question` would"""
+    params = question_data["params"]
+    answer = answers.get(question.id)
+
+    if question.type == "boolean":
+        params["items"] = govuk_options(
+            [{"label": "Yes", "value": "True"}, {"label": "No", "value": "False"}], str(answer)
+        )
+    elif question.type in ("radios", "checkboxes"):
+        params["items"] = govuk_options(question.options, answer)
+    elif answer is not None:
+        # If value is 0, it can get evaluated as False, so we should stringify it
+        params["value"] = str(answer) if question.type == "number" and isinstance(answer, int) else answer
+
+    if errors and errors.get(question.id):
+        params["errorMessage"] = govuk_error(errors[question.id])["errorMessage"]
+        params["errorMessage"]["text"] = question_references(params["errorMessage"]["text"], get_question)
+
+    return question_data
+
+
+def _copy_question_params(question_data):
+    """Copy macro parameters so a request can change them, sharing the strings, which `copy.deepcopy` is slower at"""
+    if isinstance(question_data, dict):
+        return {key: _copy_question_params(value) for key, value in question_data.items()}
+    if isinstance(question_data, list):
+        return [_copy_question_params(value) for value in question_data]
+    return question_data
+
+
+def _add_prefill_notice(question_data, framework_name):
+    if isinstance(question_data, list):
+        for q in question_data:
+            _add_prefill_notice(q, framework_name)
+        return
+
+    # this is a misuse of error message component but I can't think of a better way right now
+    question_data["params"]["formGroup"] = {"classes": "dm-form-group--notice"}
+    question_data["params"]["errorMessage"] = {
+        "classes": "dm-error-message--notice",
+        "text": "This answer is from your {} declaration".format(framework_name),
+        "visuallyHiddenText": "Notice",
+    }
+
+
+# least recently used first, (framework slug, section id) -> (the section's questions, their parameters unanswered)
+_question_params: "OrderedDict[tuple, tuple]" = OrderedDict()
+_question_params_lock = Lock()
+
+
+def _get_unanswered_question_params(framework_slug, section, get_question):
+    """Return the macro parameters for each of `section`'s questions when they're unanswered, which only depend on
+    the content, so are built once for each section and kept for as long as its questions are the same objects
+    """
+    key = (framework_slug, section.id)
+    questions = tuple(section.questions)
+
+    with _question_params_lock:
+        cached_questions, question_params = _question_params.get(key, ((), None))
+        if question_params is not None and len(cached_questions) == len(questions) and all(
+            cached is question for cached, question in zip(cached_questions, questions)
+        ):
+            _question_params.move_to_end(key)
+            return question_params
+
+    question_params = [
+        _adjust_question_params(
+            govuk_frontend.from_question(question, {}, {}, is_page_heading=False), question, get_question
+        )
+        for question in questions
+    ]
+
+    with _question_params_lock:
+        _question_params[key] = (questions, question_params)
+        while len(_question_params) > QUESTION_PARAMS_CACHE_SIZE:
+            _question_params.popitem(last=False)
+
+    return question_params
+
+
+def get_declaration_question_params(
+    framework_slug, section, get_question, answers, errors,
+    prefilled_from_framework_name=None, prefilled_answers=(),
+):
+    """Return the govuk-frontend macro parameters for each of the questions on a declaration edit page.
+
+    The parameters for unanswered questions are built once for each section and copied, and the answers and errors
+    added to them where that's straightforward. Only questions of other types with answers or errors are built
+    from scratch. Questions whose answers were prefilled from `prefilled_answers` get a notice saying so.
+    """
+    form_html = []
+    for question, unanswered_params in zip(
+        section.questions, _get_unanswered_question_params(framework_slug, section, get_question)
+    ):
+        question_ids = [question.id, *question.get_question_ids()]
+        has_answer_or_error = any(
+            question_id in answers or (errors and errors.get(question_id)) for question_id in question_ids
+        )
+
+        if not has_answer_or_error:
+            question_data = _copy_question_params(unanswered_params)
+        elif question.type in MERGEABLE_QUESTION_TYPES:
+            question_data = _merge_question_answer(
+                _copy_question_params(unanswered_params), question, get_question, answers, errors
+            )
+        else:
+            question_data = _adjust_question_params(
+                govuk_frontend.from_question(question, answers, errors, is_page_heading=False),
+                question, get_question,
+            )
+
+        # we add a 'message' to each question which is prefilled
+        if (
+            (question.id not in errors)
+            and prefilled_from_framework_name
+            and (question.id in answers)
+            and (question.id in prefilled_answers)
+        ):
+            _add_prefill_notice(question_data, prefilled_from_framework_name)
+
+        form_html.append(question_data)
+
+    return form_html
@@ -0,0 +1,130 @@
+from io import BytesIO
+import mimetypes
+import urllib.parse as urlparse
+
+from botocore.exceptions import ClientError
+from flask import current_app
+from itsdangerous import BadData, URLSafeTimedSerializer
+from werkzeug.datastructures import FileStorage
+
+from dmutils import s3
+from dmutils.documents import file_is_open_document_format, generate_file_name, get_extension
+
+from .s3_client import get_s3_client
+
+# the extensions `dmutils.documents.file_is_open_document_format` accepts
+DIRECT_UPLOAD_EXTENSIONS = ('.pdf', '.odt', '.ods', '.odp')
+# how long the browser has to start uploading once it's been given the credentials
+DIRECT_UPLOAD_EXPIRES_IN = 10 * 60
+# how long after the upload the form can be submitted, which is how long a session lasts
+DIRECT_UPLOAD_MAX_AGE = 60 * 60
+# the form field a page posts the token for an upload to the question `question_id` in
+DIRECT_UPLOAD_TOKEN_FIELD = '{question_id}-upload-token'
+
+_TOKEN_SALT = 'direct-document-upload'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt=_TOKEN_SALT)
+
+
+def _upload_owner(upload_type, service, field):
+    return {
+        'uploadType': upload_type,
+        'frameworkSlug': service['frameworkSlug'],
+        'supplierId': service['supplierId'],
+        'serviceId': service.get('id'),
+        'field': field,
+    }
+
+
+def create_direct_upload(bucket_name, upload_type, service, field, filename, public=True):
+    """Return the credentials for the browser to upload a document for `field` straight to S3, or None if the
+    filename couldn't be a valid document.
+
+    The arguments are the same as `dmutils.documents.upload_document`'s. The browser POSTs the document to `url` along
+    with `fields`, then posts `token` with the rest of the form so that `record_direct_uploads` can find the document.
+    S3 is told to reject documents that are empty, too big or of a different content type.
+    """
+    if get_extension(filename) not in DIRECT_UPLOAD_EXTENSIONS:
+        return None
+
+    key = generate_file_name(
+        service['frameworkSlug'], upload_type, service['supplierId'], service.get('id'), field, filename
+    )
+    acl = 'public-read' if public else 'bucket-owner-full-control'
+    content_type, _ = mimetypes.guess_type(key)
+
+    # dmutils' S3 wrapper doesn't do presigned POSTs
+    upload = get_s3_client().generate_presigned_post(
+        bucket_name,
+        key,
+        Fields={'acl': acl, 'Content-Type': content_type},
+        Conditions=[
+            {'acl': acl},
+            {'Content-Type': content_type},
+            # the same limit as `dmutils.documents.file_is_less_than_5mb`
+            ['content-length-range', 1, s3.FILE_SIZE_LIMIT - 1],
+        ],
+        ExpiresIn=DIRECT_UPLOAD_EXPIRES_IN,
+    )
+    upload['token'] = _serializer().dumps(dict(_upload_owner(upload_type, service, field), key=key))
+
+    return upload
+
+
+def _validate_direct_upload(bucket_name, key):
+    """Return the name of the validator the uploaded document fails, if any"""
+    try:
+        # one ranged GET tells us both the size of the document and what format it's in
+        response = get_s3_client().get_object(Bucket=bucket_name, Key=key, Range='bytes=0-127')
+    except ClientError:
+        return 'file_can_be_saved'
+
+    first_bytes = response['Body'].read()
+    size = int(response['ContentRange'].rpartition('/')[2])
+
+    if not file_is_open_document_format(FileStorage(BytesIO(first_bytes), filename=key)):
+        return 'file_is_open_document_format'
+    if size >= s3.FILE_SIZE_LIMIT:
+        return 'file_is_less_than_5mb'
+
+
+def record_direct_uploads(bucket_name, upload_type, documents_url, service, form, section):
+    """Find the documents uploaded straight to S3 for `section`'s questions.
+
+    Returns the same as `dmutils.documents.upload_service_documents`: the URLs of the documents by question id, and
+    the names of the validators any documents failed by question id. Documents that fail validation are removed.
+    """
+    documents, errors = {}, {}
+    serializer = _serializer()
+
+    for field in section.get_question_ids(type="upload"):
+        token = form.get(DIRECT_UPLOAD_TOKEN_FIELD.format(question_id=field))
+        if not token:
+            continue
+
+        try:
+            upload = serializer.loads(token, max_age=DIRECT_UPLOAD_MAX_AGE)
+        except BadData:
+            errors[field] = 'file_can_be_saved'
+            continue
+
+        key = upload.pop('key')
+        if upload != _upload_owner(upload_type, service, field):
+            errors[field] = 'file_can_be_saved'
+            continue
+
+        error = _validate_direct_upload(bucket_name, key)
+        if error:
+            current_app.logger.info(
+                "Directly uploaded document {key} failed {error}",
+                extra={'key': key, 'error': error},
+            )
+            if error != 'file_can_be_saved':
+                s3.S3(bucket_name).delete_key(key)
+            errors[field] = error
+        else:
+            documents[field] = urlparse.urljoin(documents_url, key)
+
+    return documents, errors
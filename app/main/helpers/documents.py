@@ -0,0 +1,212 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+import hashlib
+import mimetypes
+import urllib.parse as urlparse
+
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from flask import current_app
+from redis import RedisError
+
+from dmutils.documents import filter_empty_files, generate_file_name, get_extension, validate_documents
+from dmutils.formats import DATETIME_FORMAT
+from dmutils.timing import logged_duration_for_external_request as log_external_request
+
+from .concurrency import call_concurrently
+from .s3_client import get_s3_client
+
+# S3's smallest multipart part, so documents bigger than this are sent in parts
+MULTIPART_CHUNK_SIZE = 5 * 1024 * 1024
+# how much of a document is read into memory at a time
+READ_CHUNK_SIZE = 256 * 1024
+
+# shared by every request a worker handles, and separate from other concurrent calls so that uploads never wait for them
+MAX_CONCURRENT_UPLOADS = 8
+
+# how long to remember where a supplier's documents are stored, long enough to cover the next iteration of a framework
+DOCUMENT_HASH_CACHE_TIMEOUT = 400 * 24 * 60 * 60
+
+# the documents in a form are uploaded at the same time as each other, so each is sent on a single thread
+_transfer_config = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    io_chunksize=READ_CHUNK_SIZE,
+    use_threads=False,
+)
+
+_upload_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS, thread_name_prefix='document-upload')
+
+
+def _stream_document(client, bucket_name, path, stream, acl):
+    """Equivalent to `dmutils.s3.S3(bucket_name).save(path, file_contents, acl=acl)`, but sends the file's `stream` in
+    chunks rather than in one request with the whole file in memory. Returns whether the document was saved.
+    """
+    # Werkzeug spools uploaded files of any size to disk, so this reads them from there a chunk at a time
+    stream.seek(0)
+
+    with log_external_request('S3', 'streamed file upload [{filepath} with acl {fileacl}]') as log_context:
+        log_context.update({"filepath": path, "fileacl": acl})
+        try:
+            client.upload_fileobj(
+                stream,
+                bucket_name,
+                path,
+                ExtraArgs={
+                    "ACL": acl,
+                    "ContentType": mimetypes.guess_type(path)[0],
+                    # the same custom "timestamp" `dmutils.s3.S3.save` sets
+                    "Metadata": {"timestamp": datetime.utcnow().strftime(DATETIME_FORMAT)},
+                },
+                Config=_transfer_config,
+            )
+        except (ClientError, S3UploadFailedError):
+            return False
+
+    return True
+
+
+def _hash_document(stream):
+    """Return the SHA-256 of a document's stream, read a chunk at a time"""
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(partial(stream.read, READ_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    stream.seek(0)
+
+    return sha256.hexdigest()
+
+
+def _document_hash_cache_key(uploader, supplier_id, digest, path):
+    # documents are only ever shared between a supplier's own services and declarations, in the same bucket
+    return 'document-hash:{}:{}:{}{}'.format(uploader.bucket_name, supplier_id, digest, get_extension(path))
+
+
+def _get_stored_document_path(cache, key):
+    if cache is None:
+        return None
+
+    try:
+        stored_path = cache.get(key)
+    except RedisError as e:
+        current_app.logger.warning("Failed to look up stored document: {error}", extra={'error': str(e)})
+        return None
+
+    return stored_path.decode() if stored_path else None
+
+
+def _set_stored_document_path(cache, key, path):
+    if cache is None:
+        return
+
+    try:
+        cache.set(key, path, ex=DOCUMENT_HASH_CACHE_TIMEOUT)
+    except RedisError as e:
+        current_app.logger.warning("Failed to record stored document: {error}", extra={'error': str(e)})
+
+
+def _copy_document(client, bucket_name, stored_path, path, acl):
+    """Copy a document within S3 rather than uploading it again. Returns whether the document was copied."""
+    with log_external_request('S3', 'copy document [{src_key} to {filepath}]') as log_context:
+        log_context.update({"src_key": stored_path, "filepath": path})
+        try:
+            client.copy_object(
+                CopySource={"Bucket": bucket_name, "Key": stored_path},
+                Bucket=bucket_name,
+                Key=path,
+                ACL=acl,
+                ContentType=mimetypes.guess_type(path)[0],
+                Metadata={"timestamp": datetime.utcnow().strftime(DATETIME_FORMAT)},
+                MetadataDirective='REPLACE',
+            )
+        except ClientError:
+            return False
+
+    return True
+
+
+def _save_document(uploader, client, path, stream, acl, supplier_id, cache):
+    """Save the document in `stream` to `path`, copying an identical one the supplier has already saved rather than
+    uploading it again. Returns `path`, or None if the document couldn't be saved.
+
+    The document is always saved at its own `path`, so that it belongs to this service or declaration alone and is
+    unaffected by anything later done to the other service's copy.
+    """
+    key = _document_hash_cache_key(uploader, supplier_id, _hash_document(stream), path)
+    stored_path = _get_stored_document_path(cache, key)
+
+    if stored_path is not None and uploader.path_exists(stored_path):
+        if stored_path == path:
+            return path
+        saved = _copy_document(client, uploader.bucket_name, stored_path, path, acl)
+    else:
+        saved = _stream_document(client, uploader.bucket_name, path, stream, acl)
+
+    if not saved:
+        return None
+
+    _set_stored_document_path(cache, key, path)
+    return path
+
+
+def upload_service_documents(uploader, upload_type, documents_url, service, request_files, section, public=True):
+    """A drop-in replacement for `dmutils.documents.upload_service_documents` that streams the documents to S3, all at
+    the same time, so that a page with several documents takes as long as its biggest document to upload.
+
+    Documents identical to ones the supplier has uploaded before aren't uploaded again, but are copied within S3.
+    """
+    if upload_type not in ('documents', 'submissions',):
+        raise ValueError(f"Unexpected upload_type {upload_type!r}")
+
+    files = {field: request_files[field] for field in section.get_question_ids(type="upload")
+             if field in request_files}
+    files = filter_empty_files(files)
+    errors = validate_documents(files)
+
+    if errors:
+        return None, errors
+
+    if len(files) == 0:
+        return {}, {}
+
+    acl = 'public-read' if public else 'bucket-owner-full-control'
+    paths = {
+        field: generate_file_name(
+            service['frameworkSlug'], upload_type, service['supplierId'], service.get('id'), field, contents.filename
+        )
+        for field, contents in files.items()
+    }
+
+    # the uploads run on other threads, so are given everything they need from the request
+    cache = current_app.config.get('SESSION_REDIS')
+    client = get_s3_client()
+    saved_paths = call_concurrently(
+        *(
+            partial(
+                _save_document, uploader, client, paths[field], contents.stream, acl, service['supplierId'], cache
+            )
+            for field, contents in files.items()
+        ),
+        executor=_upload_executor,
+    )
+
+    for field, saved_path in zip(list(files), saved_paths):
+        if saved_path:
+            files[field] = urlparse.urljoin(documents_url, saved_path)
+        else:
+            errors[field] = 'file_can_be_saved'
+
+    return files, errors
+
+
+def upload_declaration_documents(
+    uploader, upload_type, documents_url, request_files, section, framework_slug, supplier_id, public=True
+):
+    # Provide a pseudo 'service' without a Service ID, to construct the filename
+    return upload_service_documents(
+        uploader, upload_type, documents_url,
+        {"frameworkSlug": framework_slug, "supplierId": supplier_id},
+        request_files, section, public=public
+    )
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
+from collections import Counter, OrderedDict
 from datetime import datetime
 from functools import wraps
 from itertools import chain, islice, groupby
 import re
-from typing import Optional, Container, Dict, List
+from threading import Lock
+from typing import Any, Optional, Container, Dict, List, Tuple
+from weakref import WeakKeyDictionary
 
 from flask import abort, current_app, render_template, request
 from flask_login import current_user
@@ -11,9 +14,10 @@ from flask_login import current_user
 from dmapiclient import DataAPIClient, APIError, HTTPError
 from dmutils.dates import update_framework_with_formatted_dates
 from dmutils.formats import DATETIME_FORMAT
+from dmcontent.content_loader import ContentManifest, ContentSection
 from dmcontent.errors import ContentNotFoundError
 
-from ...main import content_loader
+from ...main import content_loader, get_content_loader
 
 
 def get_framework_or_404(client, framework_slug, allowed_statuses=None):
@@ -58,14 +62,14 @@ def frameworks_by_slug(client):
 
 def get_completed_lots(client, lots, framework_slug, supplier_id):
     """Return an array of completed lot names for a supplier"""
-    def has_submitted(lot):
-        return client.find_draft_services_by_framework(framework_slug=framework_slug,
-                                                       status="submitted",
-                                                       supplier_id=supplier_id,
-                                                       lot=lot['slug'],
-                                                       page=1)['meta']['total'] > 0
+    submitted_counts = count_drafts_by_lot(
+        draft for draft in client.find_draft_services_iter(supplier_id, framework=framework_slug)
+        if draft['status'] == 'submitted'
+    )
 
-    return [f"Lot {number}: {lot['name']}" for number, lot in enumerate(lots, start=1) if has_submitted(lot)]
+    return [
+        f"Lot {number}: {lot['name']}" for number, lot in enumerate(lots, start=1) if submitted_counts[lot['slug']]
+    ]
 
 
 def get_framework_lot_or_404(framework, lot_slug):
@@ -91,19 +95,19 @@ def register_interest_in_framework(client, framework_slug):
     client.register_framework_interest(current_user.supplier_id, framework_slug, current_user.email_address)
 
 
-def get_last_modified_from_first_matching_file(key_list, framework_slug, prefix):
+def get_last_modified_from_first_matching_file(communications, framework_slug, prefix):
     """
-    Takes a list of file keys, a framework slug and a string that is a whole or start of a filename.
-    Returns the 'last_modified' timestamp for first file whose path starts with the framework slug and passed-in string,
-    or None if no matching file is found.
+    Takes an index of file keys, a framework slug and a string that is a whole or start of a filename.
+    Returns the 'last_modified' timestamp for the most recent file whose path starts with the framework slug and
+    passed-in string, or None if no matching file is found.
 
-    :param key_list: list of file keys (from an s3 bucket)
+    :param communications: FileIndex of file keys (from an s3 bucket)
     :param framework_slug: the framework that we're looking up a document for (this is the first part of the file path)
     :param prefix: the first part of the filename to match (this could also be the complete filename for an exact match)
-    :return: the timestamp of the first matching file key or None
+    :return: the timestamp of the most recent matching file key or None
     """
     path_starts_with = '{}/{}'.format(framework_slug, prefix)
-    return next((key for key in key_list if key.get('path').startswith(path_starts_with)), {}).get('last_modified')
+    return (communications.latest(path_starts_with) or {}).get('last_modified')
 
 
 def get_first_question_index(content, section):
@@ -154,10 +158,13 @@ def get_framework_for_reuse(
     ), None)
 
 
-def get_supplier_framework_info(data_api_client, framework_slug):
+def get_supplier_framework_info(data_api_client, framework_slug, supplier_id=None):
+    if supplier_id is None:
+        supplier_id = current_user.supplier_id
+
     try:
         return data_api_client.get_supplier_framework_info(
-            current_user.supplier_id, framework_slug
+            supplier_id, framework_slug
         )['frameworkInterest']
     except APIError as e:
         if e.status_code == 404:
@@ -189,6 +196,90 @@ def return_supplier_framework_info_if_on_framework_or_abort(data_api_client, fra
     return supplier_framework
 
 
+QUESTION_REFERENCE = re.compile(r"\[\[([^\]]+)\]\]")  # anything that looks like [[nameOfQuestion]]
+
+# how many versions of manifests to keep question numbers for, enough for every manifest in use at once
+QUESTION_NUMBERS_CACHE_SIZE = 64
+# how many strings with their question references replaced to keep for each, more than the biggest manifest has
+REPLACED_STRINGS_CACHE_SIZE = 1024
+
+
+class QuestionNumbers:
+    """The numbers of the questions in a shared manifest or section, and the strings whose question references have
+    been replaced with them so far, so that rendering the same content again doesn't have to search for the questions.
+    """
+    def __init__(self, content, questions):
+        # kept so that the ids of the questions, which the numbers are cached by, can't be reused
+        self.questions = questions
+        self.numbers = {}
+        for question_id in (
+            question_id for question in questions for question_id in [question.id, *question.get_question_ids()]
+        ):
+            question = content.get_question(question_id)
+            if question is not None and question.get('number') is not None:
+                self.numbers.setdefault(question_id, question['number'])
+        # least recently used first, (type of string, string) -> string with question references replaced
+        self._replaced = OrderedDict()
+        self._replaced_lock = Lock()
+
+    def get_replaced(self, key):
+        with self._replaced_lock:
+            replaced = self._replaced.get(key)
+            if replaced is not None:
+                self._replaced.move_to_end(key)
+            return replaced
+
+    def set_replaced(self, key, replaced):
+        with self._replaced_lock:
+            self._replaced[key] = replaced
+            while len(self._replaced) > REPLACED_STRINGS_CACHE_SIZE:
+                self._replaced.popitem(last=False)
+
+
+# least recently used first, ids of a manifest's or section's top level questions -> QuestionNumbers
+_question_numbers: "OrderedDict[Tuple[int, ...], QuestionNumbers]" = OrderedDict()
+# each manifest or section whose question numbers have been looked up -> its QuestionNumbers
+_question_numbers_by_content: "WeakKeyDictionary[Any, QuestionNumbers]" = WeakKeyDictionary()
+_question_numbers_lock = Lock()
+
+
+def _get_question_numbers(get_question) -> Optional[QuestionNumbers]:
+    """Return the QuestionNumbers for the manifest or section `get_question` belongs to, if it belongs to one whose
+    sections are shared by the content loader.
+
+    A request's own content, e.g. the summary of a declaration, has new questions every time, so isn't worth keeping
+    numbers for and would only push out the shared content's.
+    """
+    content = getattr(get_question, '__self__', None)
+    if not isinstance(content, (ContentManifest, ContentSection)):
+        return None
+
+    with _question_numbers_lock:
+        question_numbers = _question_numbers_by_content.get(content)
+    if question_numbers is not None:
+        return question_numbers
+
+    sections = content.sections if isinstance(content, ContentManifest) else [content]
+    if not get_content_loader().is_shared(sections):
+        return None
+
+    # every request wraps the same (filtered) questions in its own manifest, so they share numbers by the questions
+    questions = tuple(question for section in sections for question in section.questions)
+    key = tuple(id(question) for question in questions)
+
+    with _question_numbers_lock:
+        question_numbers = _question_numbers.get(key)
+        if question_numbers is None:
+            question_numbers = _question_numbers[key] = QuestionNumbers(content, questions)
+            while len(_question_numbers) > QUESTION_NUMBERS_CACHE_SIZE:
+                _question_numbers.popitem(last=False)
+        else:
+            _question_numbers.move_to_end(key)
+        _question_numbers_by_content[content] = question_numbers
+
+    return question_numbers
+
+
 def question_references(data, get_question):
     """
     Replace placeholders for question references with the number of the referenced question
@@ -202,13 +293,28 @@ def question_references(data, get_question):
     """
     if not data:
         return data
-    references = re.sub(
-        r"\[\[([^\]]+)\]\]",  # anything that looks like [[nameOfQuestion]]
-        lambda question_id: str(get_question(question_id.group(1))['number']),
-        data
-    )
 
-    return data.__class__(references)
+    question_numbers = _get_question_numbers(get_question)
+    if question_numbers is None:
+        return data.__class__(QUESTION_REFERENCE.sub(
+            lambda question_id: str(get_question(question_id.group(1))['number']),
+            data
+        ))
+
+    key = (data.__class__, data)
+    replaced = question_numbers.get_replaced(key)
+    if replaced is None:
+        numbers = question_numbers.numbers
+        replaced = data.__class__(QUESTION_REFERENCE.sub(
+            lambda question_id: str(
+                numbers[question_id.group(1)] if question_id.group(1) in numbers
+                else get_question(question_id.group(1))['number']
+            ),
+            data
+        ))
+        question_numbers.set_replaced(key, replaced)
+
+    return replaced
 
 
 def get_frameworks_by_status(
@@ -233,10 +339,9 @@ def get_most_recent_expired_dos_framework(all_frameworks: List[Dict]) -> List[Di
     return []
 
 
-def count_drafts_by_lot(drafts, lotSlug):
-    return len([
-        draft for draft in drafts if draft['lotSlug'] == lotSlug
-    ])
+def count_drafts_by_lot(drafts):
+    """Return a Counter of the number of `drafts` in each lot, counted in a single pass"""
+    return Counter(draft['lotSlug'] for draft in drafts)
 
 
 def get_statuses_for_lot(
@@ -0,0 +1,28 @@
+from threading import Lock
+
+import boto3
+from flask import current_app
+
+from dmutils import s3
+
+_client_lock = Lock()
+
+
+def get_s3_client():
+    """Return a boto3 S3 client, for the things `dmutils.s3.S3` doesn't do, e.g. streaming uploads.
+
+    It connects to the same endpoint `dmutils.s3.S3` would, e.g. a local stand-in for S3 in development. boto3 clients
+    can be shared between threads, so one is made for the app the first time it's needed.
+    """
+    with _client_lock:
+        # made under the lock, as boto3's default session isn't safe to make clients from on several threads at once
+        client = current_app.extensions.get('s3_client')
+        if client is None:
+            endpoint_url = None
+            if current_app.env == "development":
+                endpoint_url = current_app.config.get("DM_S3_ENDPOINT_URL")
+            client = current_app.extensions['s3_client'] = boto3.client(
+                's3', region_name=s3.default_region, endpoint_url=endpoint_url,
+            )
+
+    return client
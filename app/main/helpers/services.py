@@ -1,13 +1,18 @@
+from collections import Counter
 from datetime import datetime
 import re
-import urllib.parse as urlparse
 
 from dmapiclient import HTTPError
+from dmcontent.utils import count_unanswered_questions
 from flask import abort, current_app
+from redis import RedisError
 from flask_login import current_user
 
 from .frameworks import get_supplier_framework_info
 
+# drafts are only worth keeping counts for while someone's working on them
+UNANSWERED_COUNTS_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
 
 def get_drafts(apiclient, framework_slug):
     drafts = apiclient.find_draft_services_iter(
@@ -24,6 +29,34 @@ def get_drafts(apiclient, framework_slug):
     return unsubmitted_drafts, complete_drafts
 
 
+def count_drafts_by_lot_and_status(apiclient, framework_slug, supplier_id=None):
+    """Return a Counter of a supplier's drafts for a framework, keyed by (lot slug, status). The supplier is the current
+    user's unless `supplier_id` is given, as it must be outside of the request's own thread.
+
+    Each draft is dropped as soon as it's been counted, for pages that only need to know how many drafts there are.
+    Draft listings aren't kept in the request's API cache either (see `app.api_client`), so none are held afterwards.
+    """
+    if supplier_id is None:
+        supplier_id = current_user.supplier_id
+
+    return Counter(
+        (draft['lotSlug'], draft['status'])
+        for draft in apiclient.find_draft_services_iter(supplier_id, framework=framework_slug)
+    )
+
+
+def get_draft_counts(apiclient, framework_slug, supplier_id=None):
+    """Like `get_drafts`, but return Counters of the number of unsubmitted and complete drafts in each lot"""
+    draft_counts, complete_counts = Counter(), Counter()
+    for (lot_slug, status), count in count_drafts_by_lot_and_status(apiclient, framework_slug, supplier_id).items():
+        if status in ('submitted', 'failed'):
+            complete_counts[lot_slug] += count
+        if status == 'not-submitted':
+            draft_counts[lot_slug] += count
+
+    return draft_counts, complete_counts
+
+
 def get_lot_drafts(apiclient, framework_slug, lot_slug):
     drafts, complete_drafts = get_drafts(apiclient, framework_slug)
     return (
@@ -32,6 +65,69 @@ def get_lot_drafts(apiclient, framework_slug, lot_slug):
     )
 
 
+def _unanswered_counts_cache_key(framework_slug, draft):
+    # the app version changes with the content, which changes which questions need answering
+    return 'unanswered-counts:{}:{}:{}:{}'.format(
+        current_app.config['VERSION'], framework_slug, draft['id'], draft['updatedAt']
+    )
+
+
+def _get_cached_unanswered_counts(cache, keys):
+    if cache is None or not keys:
+        return [None] * len(keys)
+
+    try:
+        values = cache.mget(keys)
+    except RedisError as e:
+        current_app.logger.warning("Failed to get unanswered question counts: {error}", extra={'error': str(e)})
+        return [None] * len(keys)
+
+    return [tuple(int(count) for count in value.split(b',')) if value else None for value in values]
+
+
+def _set_cached_unanswered_counts(cache, counts_by_key):
+    if cache is None or not counts_by_key:
+        return
+
+    try:
+        pipeline = cache.pipeline(transaction=False)
+        for key, counts in counts_by_key.items():
+            pipeline.set(key, '{},{}'.format(*counts), ex=UNANSWERED_COUNTS_CACHE_TIMEOUT)
+        pipeline.execute()
+    except RedisError as e:
+        current_app.logger.warning("Failed to cache unanswered question counts: {error}", extra={'error': str(e)})
+
+
+def add_unanswered_counts_to_drafts(framework_slug, lot_service_sections, drafts):
+    """Add the number of `unanswered_required` and `unanswered_optional` questions to each of `drafts`.
+
+    Counting them means summarising every question for each draft, so the counts are kept in the shared Redis keyed
+    by each draft's id and `updatedAt`. Only drafts that have changed since their counts were cached are summarised.
+    """
+    cache = current_app.config.get('SESSION_REDIS')
+    keys = [
+        _unanswered_counts_cache_key(framework_slug, draft) if draft.get('updatedAt') else None for draft in drafts
+    ]
+    cached_counts = _get_cached_unanswered_counts(cache, [key for key in keys if key])
+    cached_counts_by_key = dict(zip([key for key in keys if key], cached_counts))
+
+    new_counts_by_key = {}
+    for draft, key in zip(drafts, keys):
+        counts = cached_counts_by_key.get(key)
+        if counts is None:
+            counts = count_unanswered_questions(lot_service_sections.summary(draft, inplace_allowed=True))
+            if key:
+                new_counts_by_key[key] = counts
+
+        unanswered_required, unanswered_optional = counts
+        draft.update({
+            'unanswered_required': unanswered_required,
+            'unanswered_optional': unanswered_optional,
+        })
+
+    _set_cached_unanswered_counts(cache, new_counts_by_key)
+
+
 def get_draft_service_or_404(data_api_client, service_id, framework_slug, lot_slug):
     try:
         draft = data_api_client.get_draft_service(service_id).get('services')
@@ -51,14 +147,6 @@ def is_service_associated_with_supplier(service):
     return service.get('supplierId') == current_user.supplier_id
 
 
-def get_signed_document_url(uploader, document_path):
-    url = uploader.get_signed_url(document_path)
-    if url is not None:
-        url = urlparse.urlparse(url)
-        base_url = urlparse.urlparse(current_app.config['DM_ASSETS_URL'])
-        return url._replace(netloc=base_url.netloc, scheme=base_url.scheme).geturl()
-
-
 def parse_document_upload_time(data):
     match = re.search(r"(\d{4}-\d{2}-\d{2}-\d{2}\d{2})\..{2,3}$", data)
     if match:
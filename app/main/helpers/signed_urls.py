@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+import urllib.parse as urlparse
+
+from flask import current_app
+
+from dmutils import s3
+
+# S3.get_signed_url's default, which we keep so that cached URLs aren't usable for any longer than before
+SIGNED_URL_EXPIRES_IN = 30
+# stop handing out a URL this long before it expires, so that the browser has time to follow it
+SIGNED_URL_EXPIRY_MARGIN = 5
+SIGNED_URL_CACHE_SIZE = 1024
+
+
+class SignedURLCache:
+    """Signed S3 URLs, shared by every thread in a worker and kept until shortly before they expire.
+
+    Signing a URL means checking the document exists in S3 first, so a burst of downloads of the same document only
+    makes that round trip once.
+    """
+    def __init__(self, expires_in=SIGNED_URL_EXPIRES_IN, margin=SIGNED_URL_EXPIRY_MARGIN, size=SIGNED_URL_CACHE_SIZE):
+        self.expires_in = expires_in
+        self.margin = margin
+        self.size = size
+        self._lock = Lock()
+        # least recently signed first, (bucket_name, path, base_url) -> (time to stop using the URL, URL)
+        self._urls = OrderedDict()
+
+    def get(self, bucket_name, path, base_url):
+        """Return the equivalent of `dmutils.documents.get_signed_url(s3.S3(bucket_name), path, base_url)`"""
+        key = (bucket_name, path, base_url)
+        with self._lock:
+            use_until, url = self._urls.get(key, (0, None))
+        if time.monotonic() < use_until:
+            return url
+
+        signed_at = time.monotonic()
+        url = s3.S3(bucket_name).get_signed_url(path, expires_in=self.expires_in)
+        if url is None:
+            return None
+
+        if base_url is not None:
+            base_url = urlparse.urlparse(base_url)
+            url = urlparse.urlparse(url)._replace(netloc=base_url.netloc, scheme=base_url.scheme).geturl()
+
+        with self._lock:
+            self._urls.pop(key, None)
+            self._urls[key] = (signed_at + self.expires_in - self.margin, url)
+            while len(self._urls) > self.size:
+                self._urls.popitem(last=False)
+
+        return url
+
+
+def init_app(application):
+    application.extensions['signed_urls'] = SignedURLCache()
+
+
+def get_signed_document_url(bucket_name, document_path):
+    """Return a signed URL for a document on the assets domain, or None if there's no such document"""
+    return current_app.extensions['signed_urls'].get(bucket_name, document_path, current_app.config['DM_ASSETS_URL'])
@@ -0,0 +1,44 @@
+from flask import before_render_template, current_app, get_flashed_messages, stream_with_context, template_rendered
+from flask_wtf.csrf import generate_csrf
+
+from dmutils.flask import SLOW_RENDER_THRESHOLD
+from dmutils.timing import logged_duration
+
+# how many pieces of a template's output are sent at a time, rather than sending each tag and line on its own
+STREAM_BUFFER_SIZE = 64
+
+
+def stream_template(template_name_or_list, **context):
+    """Render a template a piece at a time as the response is sent, like `render_template` - the equivalent of
+    Flask 2.2's `stream_template`. Use it as `Response(stream_template(...))`.
+
+    Suppliers' biggest listings are sent as they're rendered, rather than being held in memory in full first. The
+    response's status and headers, including the session cookie, are sent before any of the template is rendered, so
+    the flashed messages the template shows and the CSRF token it uses are taken from the session now. Any error
+    while rendering the template cuts the page short, rather than showing an error page.
+
+    Like `timed_render_template`, the time spent is logged for sampled requests and slow renders, once the stream has
+    finished. As the template is rendered while it's sent, that includes the time spent sending it.
+    """
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name_or_list)
+    app.update_template_context(context)
+
+    get_flashed_messages()
+    generate_csrf()
+
+    def generate():
+        with logged_duration(
+            message="Spent {duration_real}s in stream_template",
+            condition=lambda log_context: (
+                logged_duration.default_condition(log_context)  # type: ignore
+                or log_context["duration_real"] > SLOW_RENDER_THRESHOLD
+            ),
+        ):
+            before_render_template.send(app, template=template, context=context)
+            stream = template.stream(context)
+            stream.enable_buffering(STREAM_BUFFER_SIZE)
+            yield from stream
+            template_rendered.send(app, template=template, context=context)
+
+    return stream_with_context(generate())
@@ -1,11 +1,14 @@
-from functools import reduce
-from operator import add
+from collections import OrderedDict
 import re
+from threading import Lock
 from typing import Any, List, Dict, Set, Tuple, Optional
 
 from werkzeug.datastructures import ImmutableOrderedMultiDict
 
 EMAIL_REGEX = r'^[^@^\s]+@[^@^\.^\s]+(\.[^@^\.^\s]+)+$'
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+
+TEXT_QUESTION_TYPES = ('text', 'textbox_large')
 
 
 def get_validator(framework, content, answers):
@@ -19,41 +22,211 @@ def get_validator(framework, content, answers):
         return validator_cls(content, answers)
 
 
+class Condition(object):
+    """A test of the answers to some of a declaration's questions, which only ever reads the answers to `fields`"""
+    def __init__(self, fields, test):
+        self.fields = tuple(fields)
+        self.test = test
+
+    def __call__(self, answers) -> bool:
+        return bool(self.test(answers))
+
+
+def answered(*fields) -> Condition:
+    """Any of `fields` has a truthy answer"""
+    return Condition(fields, lambda answers: any(answers.get(field) for field in fields))
+
+
+def answer_is(field, value) -> Condition:
+    """The answer to `field` is `value` itself, e.g. `False` rather than just falsy"""
+    return Condition((field,), lambda answers: answers.get(field) is value)
+
+
+def answer_in(field, values) -> Condition:
+    return Condition((field,), lambda answers: answers.get(field) in values)
+
+
+def answer_includes(field, values) -> Condition:
+    """The answer to `field`, a list of options, includes any of `values`"""
+    return Condition((field,), lambda answers: any(value in (answers.get(field) or ()) for value in values))
+
+
+def answered_no(field) -> Condition:
+    """`field` has been answered, but with something falsy"""
+    return Condition((field,), lambda answers: field in answers and not answers[field])
+
+
+class Rule(object):
+    """Applies to `fields` whenever all of `conditions` hold"""
+    def __init__(self, fields, *conditions):
+        self.fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        self.conditions = conditions
+        self._tests = tuple(condition.test for condition in conditions)
+
+    def applies(self, answers) -> bool:
+        return all(test(answers) for test in self._tests)
+
+
+class RuleGraph(object):
+    """
+    A validator class's rules, indexed by kind, so that the fields each kind of rule applies to can be collected from
+    the rules that apply to a set of answers.
+
+    `required_when` rules make their fields required, `not_required_when` rules make their fields optional again
+    whatever other rules say, and `conflicting_answers` rules give their fields a 'dependent_question_error'.
+    """
+    REQUIRED, NOT_REQUIRED, CONFLICTING = 'required', 'not_required', 'conflicting'
+
+    def __init__(self, validator_cls):
+        self.rules: List[Tuple[str, Rule]] = (
+            [(self.REQUIRED, rule) for rule in validator_cls.required_when]
+            + [(self.NOT_REQUIRED, rule) for rule in validator_cls.not_required_when]
+            + [(self.CONFLICTING, rule) for rule in validator_cls.conflicting_answers]
+        )
+        # kind -> indexes of the rules of that kind
+        self.kinds: Dict[str, Set[int]] = {self.REQUIRED: set(), self.NOT_REQUIRED: set(), self.CONFLICTING: set()}
+        for index, (kind, _) in enumerate(self.rules):
+            self.kinds[kind].add(index)
+
+    def applying_rules(self, answers) -> Set[int]:
+        """Return the indexes of the rules that apply to `answers`"""
+        return {index for index, (_, rule) in enumerate(self.rules) if rule.applies(answers)}
+
+    def fields(self, applying: Set[int], kind: str) -> Set[str]:
+        """Return the fields the applying rules of a kind apply to"""
+        return {field for index in applying & self.kinds[kind] for field in self.rules[index][1].fields}
+
+
+class ValidationPlan(object):
+    """
+    Everything a validator class needs to know about a content manifest, worked out in one pass over the manifest so
+    that validating a set of answers doesn't have to search the manifest for each question.
+    """
+    def __init__(self, validator_cls, content):
+        # the manifest's top level questions, which the plan is cached by
+        self.manifest_questions = tuple(question for section in content for question in section.questions)
+
+        # question ids in the order they appear in the manifest
+        self.fields: List[str] = []
+        self.questions: Dict[str, Any] = {}
+        for section in content:
+            for question_id in section.get_question_ids():
+                self.fields.append(question_id)
+                if question_id not in self.questions:
+                    self.questions[question_id] = section.get_question(question_id)
+
+        # question id -> word limit, for each question with a limit on the length of its answer
+        self.text_fields: Dict[str, Optional[int]] = {
+            question_id: question.get('max_length_in_words', validator_cls.word_limit)
+            for question_id, question in self.questions.items()
+            if question.get('type') in TEXT_QUESTION_TYPES
+        }
+        self.number_string_patterns = [
+            (field, re.compile(r'^\d{{{0}}}$'.format(length)))
+            for field, length in validator_cls.number_string_fields or []
+        ]
+        self.required_fields = frozenset(self.fields) - frozenset(validator_cls.optional_fields or ())
+        self.rules = RuleGraph(validator_cls)
+
+
+# how many ValidationPlans to keep, enough for every validator class and manifest in use at once
+VALIDATION_PLAN_CACHE_SIZE = 64
+
+# least recently used first, (validator class, ids of the manifest's questions) -> ValidationPlan
+_validation_plans: "OrderedDict[Tuple[type, Tuple[int, ...]], ValidationPlan]" = OrderedDict()
+_validation_plans_lock = Lock()
+
+
+def get_validation_plan(validator_cls, content) -> ValidationPlan:
+    """Return the ValidationPlan for a validator class and content manifest.
+
+    Manifests handed out by the content loader share their question objects (see `get_filtered_manifest`), so plans
+    are cached by the identity of the questions rather than of the manifest, and can be reused between requests. The
+    plan keeps hold of the questions, so their ids can't be reused while it's cached.
+    """
+    questions = tuple(question for section in content for question in section.questions)
+    key = (validator_cls, tuple(id(question) for question in questions))
+
+    with _validation_plans_lock:
+        plan = _validation_plans.get(key)
+        if plan is not None:
+            _validation_plans.move_to_end(key)
+            return plan
+
+    plan = ValidationPlan(validator_cls, content)
+
+    with _validation_plans_lock:
+        _validation_plans[key] = plan
+        while len(_validation_plans) > VALIDATION_PLAN_CACHE_SIZE:
+            _validation_plans.popitem(last=False)
+
+    return plan
+
+
 class DeclarationValidator(object):
     email_validation_fields: Set[str] = set()
     number_string_fields: List[Tuple[str, int]] = []
     character_limit: Optional[int] = None
     word_limit: Optional[int] = None
     optional_fields: Set[str] = set()
+    # rules for which answers make other questions required or optional, or can't be given together, see RuleGraph
+    required_when: List[Rule] = []
+    not_required_when: List[Rule] = []
+    conflicting_answers: List[Rule] = []
 
     def __init__(self, content, answers):
         self.content = content
         self.answers = answers
+        self.plan = get_validation_plan(type(self), content)
+        self._applying_rules: Optional[Set[int]] = None
+
+    @property
+    def applying_rules(self) -> Set[int]:
+        if self._applying_rules is None:
+            self._applying_rules = self.plan.rules.applying_rules(self.answers)
+        return self._applying_rules
+
+    def _page_question_ids(self, section) -> List[str]:
+        return [question_id for question_id in dict.fromkeys(section.get_question_ids())
+                if question_id in self.plan.questions]
 
     def get_error_messages_for_page(self, section) -> ImmutableOrderedMultiDict:
-        all_errors = self.get_error_messages()
-        page_ids = section.get_question_ids()
-        return ImmutableOrderedMultiDict(filter(lambda err: err[0] in page_ids, all_errors))
+        """Return the errors for the questions in `section`, only validating the answers to those questions"""
+        return ImmutableOrderedMultiDict(self.get_error_messages(self._page_question_ids(section)))
+
+    def get_error_messages_by_section(self, sections) -> Dict[str, ImmutableOrderedMultiDict]:
+        """Return the same as `get_error_messages_for_page` for each section by slug, validating the answers once"""
+        all_errors = dict(self.get_error_messages())
+
+        return {
+            section.slug: ImmutableOrderedMultiDict(
+                (question_id, all_errors[question_id])
+                for question_id in self._page_question_ids(section) if question_id in all_errors
+            )
+            for section in sections
+        }
 
-    def get_error_messages(self) -> List[Tuple[str, dict]]:
-        raw_errors_map = self.errors()
+    def get_error_messages(self, question_ids=None) -> List[Tuple[str, dict]]:
+        """Return the errors for every question in the manifest, or just the ones in `question_ids`, in order"""
+        raw_errors_map = self.errors(question_ids)
         errors_map = list()
-        for question_id in self.all_fields():
+        for question_id in self.plan.fields if question_ids is None else question_ids:
             if question_id in raw_errors_map:
-                question_number = self.content.get_question(question_id).get('number')
+                question = self.plan.questions[question_id]
+                question_number = question.get('number')
                 validation_message = self.get_error_message(question_id, raw_errors_map[question_id])
                 errors_map.append((question_id, {
                     'input_name': question_id,
-                    'href': self.content.get_question(question_id).get('href') or None,
+                    'href': question.get('href') or None,
                     'question': "Question {}".format(question_number)
-                    if question_number else self.content.get_question(question_id).get('question'),
+                    if question_number else question.get('question'),
                     'message': validation_message,
                 }))
 
         return errors_map
 
     def get_error_message(self, question_id: str, message_key: str) -> str:
-        for validation in self.content.get_question(question_id).get('validations', []):
+        for validation in self.plan.questions[question_id].get('validations', []):
             if validation['name'] == message_key:
                 return validation['message']  # type: ignore
         default_messages = {
@@ -65,79 +238,104 @@ class DeclarationValidator(object):
             message_key, 'There was a problem with the answer to this question')
 
     def all_fields(self) -> List[str]:
-        return reduce(add, (section.get_question_ids() for section in self.content))
-
-    def fields_with_values(self) -> Set[str]:
-        return set(key for key, value in self.answers.items()
+        return list(self.plan.fields)
+
+    def fields_with_values(self, fields=None) -> Set[str]:
+        """Return the fields that have been answered, out of `fields` if given"""
+        answers = self.answers.items() if fields is None else (
+            (field, self.answers[field]) for field in fields if field in self.answers
+        )
+        return set(key for key, value in answers
                    if value is not None and (not isinstance(value, str) or len(value) > 0))
 
-    def errors(self) -> Dict[str, str]:
+    def errors(self, question_ids=None) -> Dict[str, str]:
+        """Return the name of the validation each answer fails by question id.
+
+        If `question_ids` is given only those questions' answers are validated, although whether they need answering
+        can still depend on the answers to other questions.
+        """
         errors_map = {}
-        errors_map.update(self.character_limit_errors())
-        errors_map.update(self.word_limit_errors())
+        errors_map.update(self.character_limit_errors(question_ids))
+        errors_map.update(self.word_limit_errors(question_ids))
         errors_map.update(self.formatting_errors(self.answers))
-        errors_map.update(self.answer_required_errors())
+        errors_map.update(self.answer_required_errors(question_ids))
+        errors_map.update(
+            (field, 'dependent_question_error')
+            for field in self.plan.rules.fields(self.applying_rules, RuleGraph.CONFLICTING)
+        )
+
+        if question_ids is not None:
+            # there are only ever a few formatted fields, so it's quicker to check them all than pick them out
+            errors_map = {field: error for field, error in errors_map.items() if field in question_ids}
+
         return errors_map
 
-    def answer_required_errors(self) -> Dict[str, str]:
+    def answer_required_errors(self, question_ids=None) -> Dict[str, str]:
         req_fields = self.get_required_fields()
-        filled_fields = self.fields_with_values()
+        if question_ids is not None:
+            req_fields &= set(question_ids)
         errors_map = {}
 
-        for field in req_fields - filled_fields:
+        for field in req_fields - self.fields_with_values(req_fields):
             errors_map[field] = 'answer_required'
 
         return errors_map
 
-    def character_limit_errors(self) -> Dict[str, str]:
-        errors_map = {}
-        for question_id in self.all_fields():
-            if self.content.get_question(question_id).get('type') in ['text', 'textbox_large']:
-                answer = self.answers.get(question_id) or ''
-                if self.character_limit is not None and len(answer) > self.character_limit:
-                    errors_map[question_id] = "under_character_limit"
+    def _text_fields(self, question_ids):
+        if question_ids is None:
+            return self.plan.text_fields.items()
+        return ((question_id, self.plan.text_fields[question_id])
+                for question_id in question_ids if question_id in self.plan.text_fields)
+
+    def character_limit_errors(self, question_ids=None) -> Dict[str, str]:
+        errors_map: Dict[str, str] = {}
+        if self.character_limit is None:
+            return errors_map
+
+        for question_id, _ in self._text_fields(question_ids):
+            answer = self.answers.get(question_id) or ''
+            if len(answer) > self.character_limit:
+                errors_map[question_id] = "under_character_limit"
 
         return errors_map
 
-    def word_limit_errors(self) -> Dict[str, str]:
+    def word_limit_errors(self, question_ids=None) -> Dict[str, str]:
         errors_map = {}
-        for question_id in self.all_fields():
-            question = self.content.get_question(question_id)
-            if question.get('type') in ['text', 'textbox_large']:
-                # Get word limit from question content, fall back to class attribute
-                word_limit = question.get('max_length_in_words', self.word_limit)
-                answer = self.answers.get(question_id) or ''
-                if word_limit is not None and len(answer.split()) > word_limit:
-                    errors_map[question_id] = "under_word_limit"
+        # Word limits come from the question content, falling back to the class attribute
+        for question_id, word_limit in self._text_fields(question_ids):
+            answer = self.answers.get(question_id) or ''
+            if word_limit is not None and len(answer.split()) > word_limit:
+                errors_map[question_id] = "under_word_limit"
 
         return errors_map
 
     def formatting_errors(self, answers) -> Dict[str, str]:
         errors_map = {}
-        if self.email_validation_fields is not None and len(self.email_validation_fields) > 0:
-            for field in self.email_validation_fields:
-                if self.answers.get(field) is None or not re.match(EMAIL_REGEX, self.answers.get(field, '')):
-                    errors_map[field] = 'invalid_format'
-
-        if self.number_string_fields is not None and len(self.number_string_fields) > 0:
-            for field, length in self.number_string_fields:
-                if self.answers.get(field) is None or not re.match(
-                        r'^\d{{{0}}}$'.format(length), self.answers.get(field, '')
-                ):
-                    errors_map[field] = 'invalid_format'
+        for field in self.email_validation_fields or ():
+            if self.answers.get(field) is None or not EMAIL_PATTERN.match(self.answers.get(field, '')):
+                errors_map[field] = 'invalid_format'
+
+        for field, pattern in self.plan.number_string_patterns:
+            if self.answers.get(field) is None or not pattern.match(self.answers.get(field, '')):
+                errors_map[field] = 'invalid_format'
+
         return errors_map
 
     def get_required_fields(self) -> Set[str]:
         try:
-            req_fields = self.required_fields  # type: ignore
+            req_fields = set(self.required_fields)  # type: ignore
         except AttributeError:
-            req_fields = set(self.all_fields())
+            req_fields = set(self.plan.required_fields)
+        else:
+            #  Remove optional fields
+            if self.optional_fields is not None:
+                req_fields -= set(self.optional_fields)
 
-        #  Remove optional fields
-        if self.optional_fields is not None:
-            req_fields -= set(self.optional_fields)
+        rules = self.plan.rules
+        req_fields |= rules.fields(self.applying_rules, RuleGraph.REQUIRED)
+        req_fields -= rules.fields(self.applying_rules, RuleGraph.NOT_REQUIRED)
 
-        return req_fields  # type: ignore
+        return req_fields
 
 
 class G7Validator(DeclarationValidator):
@@ -152,43 +350,23 @@ class G7Validator(DeclarationValidator):
     email_validation_fields = {'SQ1-1o', 'SQ1-2b'}
     character_limit = 5000
 
-    def get_required_fields(self) -> Set[str]:
-        req_fields = super(G7Validator, self).get_required_fields()
-
+    required_when = [
         #  If you answered other to question 19 (trading status)
-        if self.answers.get('SQ1-1ci') == 'other (please specify)':
-            req_fields.add('SQ1-1cii')
-
+        Rule('SQ1-1cii', answer_in('SQ1-1ci', ['other (please specify)'])),
         #  If you answered yes to question 27 (non-UK business registered in EU)
-        if self.answers.get('SQ1-1i-i', False):
-            req_fields.add('SQ1-1i-ii')
-
+        Rule('SQ1-1i-ii', answered('SQ1-1i-i')),
         #  If you answered 'licensed' or 'a member of a relevant organisation' in question 29
-        answer_29 = self.answers.get('SQ1-1j-i', [])
-        if answer_29 and len(answer_29) > 0 and (
-            'licensed' in answer_29
-            or 'a member of a relevant organisation' in answer_29
-        ):
-            req_fields.add('SQ1-1j-ii')
-
+        Rule('SQ1-1j-ii', answer_includes('SQ1-1j-i', ['licensed', 'a member of a relevant organisation'])),
         # If you answered yes to either question 53 or 54 (tax returns)
-        if self.answers.get('SQ4-1a', False) or self.answers.get('SQ4-1b', False):
-            req_fields.add('SQ4-1c')
-
+        Rule('SQ4-1c', answered('SQ4-1a', 'SQ4-1b')),
         # If you answered Yes to questions 39 - 51 (discretionary exclusion)
-        dependent_fields = [
+        Rule('SQ3-1k', answered(
             'SQ2-2a', 'SQ3-1a', 'SQ3-1b', 'SQ3-1c', 'SQ3-1d', 'SQ3-1e', 'SQ3-1f', 'SQ3-1g',
             'SQ3-1h-i', 'SQ3-1h-ii', 'SQ3-1i-i', 'SQ3-1i-ii', 'SQ3-1j'
-        ]
-        if any(self.answers.get(field) for field in dependent_fields):
-            req_fields.add('SQ3-1k')
-
+        )),
         # If you answered No to question 26 (established in the UK)
-        if 'SQ5-2a' in self.answers and not self.answers['SQ5-2a']:
-            req_fields.add('SQ1-1i-i')
-            req_fields.add('SQ1-1j-i')
-
-        return req_fields
+        Rule(['SQ1-1i-i', 'SQ1-1j-i'], answered_no('SQ5-2a')),
+    ]
 
 
 class DOSValidator(DeclarationValidator):
@@ -221,39 +399,35 @@ class DOSValidator(DeclarationValidator):
         ],
     }
 
-    email_validation_fields = {"contactEmailContractNotice", "primaryContactEmail"}
-    character_limit = 5000
-
-    def get_required_fields(self) -> Set[str]:
-        req_fields = super(DOSValidator, self).get_required_fields()
-
-        for target_field, fields in self.dependent_fields.items():
-            if any(self.answers.get(field) for field in fields):
-                req_fields.add(target_field)
-
+    required_when = [
+        Rule(target_field, answered(*fields)) for target_field, fields in dependent_fields.items()
+    ] + [
         # Describe your trading status
-        if self.answers.get('tradingStatus') == "other (please specify)":
-            req_fields.add('tradingStatusOther')
-
+        Rule('tradingStatusOther', answer_in('tradingStatus', ["other (please specify)"])),
         # If your company was not established in the UK
-        if self.answers.get('establishedInTheUK') is False:
-            req_fields.add('appropriateTradeRegisters')
-            # If yes to appropriate trade registers
-            if self.answers.get('appropriateTradeRegisters') is True:
-                req_fields.add('appropriateTradeRegistersNumber')
-
-            req_fields.add('licenceOrMemberRequired')
-            # If not 'none of the above' to licenceOrMemberRequired
-            if self.answers.get('licenceOrMemberRequired') in ['licensed', 'a member of a relevant organisation']:
-                req_fields.add('licenceOrMemberRequiredDetails')
-
-        # If supplier doesn't meet the Modern Slavery reporting requirements, they don't need to upload a statement
-        # but must have mitigatingFactors3 explanation
-        if self.answers.get('modernSlaveryReportingRequirements') is False:
-            req_fields.add('mitigatingFactors3')
-            req_fields.remove('modernSlaveryStatement')
+        Rule(['appropriateTradeRegisters', 'licenceOrMemberRequired'], answer_is('establishedInTheUK', False)),
+        # If yes to appropriate trade registers
+        Rule(
+            'appropriateTradeRegistersNumber',
+            answer_is('establishedInTheUK', False), answer_is('appropriateTradeRegisters', True),
+        ),
+        # If not 'none of the above' to licenceOrMemberRequired
+        Rule(
+            'licenceOrMemberRequiredDetails',
+            answer_is('establishedInTheUK', False),
+            answer_in('licenceOrMemberRequired', ['licensed', 'a member of a relevant organisation']),
+        ),
+        # If supplier doesn't meet the Modern Slavery reporting requirements, they must have mitigatingFactors3
+        # explanation
+        Rule('mitigatingFactors3', answer_is('modernSlaveryReportingRequirements', False)),
+    ]
+    not_required_when = [
+        # ...but don't need to upload a statement
+        Rule('modernSlaveryStatement', answer_is('modernSlaveryReportingRequirements', False)),
+    ]
 
-        return req_fields
+    email_validation_fields = {"contactEmailContractNotice", "primaryContactEmail"}
+    character_limit = 5000
 
 
 class SharedValidator(DOSValidator):
@@ -263,24 +437,19 @@ class SharedValidator(DOSValidator):
 
 
 class G12Validator(SharedValidator):
-
-    def errors(self) -> Dict[str, str]:
-
-        errors_map = super().errors()
-
-        q1_answer = self.answers.get('servicesHaveOrSupportCloudHostingCloudSoftware')
-        q2_answer = self.answers.get('servicesHaveOrSupportCloudSupport')
-
-        q1_negative = "My organisation isn't submitting cloud hosting (lot 1) or cloud software (lot 2) services"
-        q2_negative = "My organisation isn't submitting cloud support (lot 3) services"
-
-        if q1_answer == q1_negative and q2_answer == q2_negative:
-            errors_map.update({
-                'servicesHaveOrSupportCloudHostingCloudSoftware': 'dependent_question_error',
-                'servicesHaveOrSupportCloudSupport': 'dependent_question_error',
-            })
-
-        return errors_map
+    conflicting_answers = [
+        Rule(
+            ['servicesHaveOrSupportCloudHostingCloudSoftware', 'servicesHaveOrSupportCloudSupport'],
+            answer_in(
+                'servicesHaveOrSupportCloudHostingCloudSoftware',
+                ["My organisation isn't submitting cloud hosting (lot 1) or cloud software (lot 2) services"],
+            ),
+            answer_in(
+                'servicesHaveOrSupportCloudSupport',
+                ["My organisation isn't submitting cloud support (lot 3) services"],
+            ),
+        ),
+    ]
 
 
 def is_valid_percentage(value: Any) -> bool:
@@ -305,19 +474,14 @@ class DOS5Validator(SharedValidator):
         "subcontractingInvoicesPaid"}
     )
 
-    def get_required_fields(self) -> Set[str]:
-        req_fields = super(DOS5Validator, self).get_required_fields()
-
+    required_when = SharedValidator.required_when + [
         # as per subcontracting configuration on digitalmarketplace-frameworks
-        if self.answers.get("subcontracting") in [
+        Rule(["subcontracting30DayPayments", "subcontractingInvoicesPaid"], answer_in("subcontracting", [
             "as a prime contractor, using third parties (subcontractors) to provide some services",
             "as part of a consortium or special purpose vehicle, using third parties (subcontractors) to provide some "
             "services"
-        ]:
-            req_fields.add("subcontracting30DayPayments")
-            req_fields.add("subcontractingInvoicesPaid")
-
-        return req_fields
+        ])),
+    ]
 
     def formatting_errors(self, answers) -> Dict[str, str]:
         error_map = super(DOS5Validator, self).formatting_errors(answers)
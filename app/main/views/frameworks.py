@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import partial
 
 from dmutils.errors import render_error_page
 from itertools import chain
 
 from dmutils.forms.errors import govuk_errors
-from flask import Markup, request, abort, flash, redirect, url_for, current_app, session
+from flask import request, abort, flash, redirect, url_for, current_app, session, jsonify, Response
 from flask_login import current_user
 
 from dmapiclient import APIError, HTTPError
@@ -14,13 +15,10 @@ from dmapiclient.audit import AuditTypes
 from dmcontent import govuk_frontend
 from dmcontent.questions import ContentQuestion
 from dmcontent.errors import ContentNotFoundError
-from dmcontent.html import to_summary_list_row
-from dmcontent.utils import count_unanswered_questions
 from dmutils import s3
 from dmutils.dates import update_framework_with_formatted_dates
 from dmutils.documents import (
-    RESULT_LETTER_FILENAME, get_document_path, degenerate_document_path_and_return_doc_name, get_signed_url,
-    upload_declaration_documents
+    RESULT_LETTER_FILENAME, get_document_path, degenerate_document_path_and_return_doc_name,
 )
 from dmutils.email.dm_notify import DMNotifyClient
 from dmutils.email.exceptions import EmailError
@@ -33,6 +31,13 @@ from dmutils.timing import logged_duration
 from ... import data_api_client
 from ...main import main, content_loader
 from ..helpers import login_required
+from ..helpers.communications import communication_found, get_communications
+from ..helpers.direct_uploads import create_direct_upload, record_direct_uploads
+from ..helpers.documents import upload_declaration_documents
+from ..helpers.signed_urls import get_signed_document_url
+from ..helpers.streaming import stream_template
+from ..helpers.concurrency import call_concurrently
+from ..helpers.declarations import get_declaration_overview, get_declaration_question_params
 from ..helpers.frameworks import (
     count_drafts_by_lot,
     EnsureApplicationCompanyDetailsHaveBeenConfirmed,
@@ -53,12 +58,12 @@ from ..helpers.frameworks import (
     return_404_if_applications_closed,
     check_framework_supports_e_signature_or_404,
     get_completed_lots, get_framework_contract_title,
-    question_references,
 )
 from ..helpers.services import (
+    add_unanswered_counts_to_drafts,
     get_drafts,
+    get_draft_counts,
     get_lot_drafts,
-    get_signed_document_url,
 )
 from ..helpers.suppliers import supplier_company_details_are_complete, get_company_details_from_supplier
 from ..helpers.validation import get_validator
@@ -113,12 +118,19 @@ def framework_dashboard(framework_slug):
                 reply_to_address_id=current_app.config['DM_ENQUIRIES_EMAIL_ADDRESS_UUID']
             )
 
-    drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
+    # these don't depend on each other, so fetch them all at once - on other threads, which can't use `current_user`
+    supplier_id = current_user.supplier_id
+    (draft_counts, complete_counts), supplier_framework_info, supplier, communications = call_concurrently(
+        partial(get_draft_counts, data_api_client, framework_slug, supplier_id),
+        partial(get_supplier_framework_info, data_api_client, framework_slug, supplier_id),
+        partial(data_api_client.get_supplier, supplier_id),
+        partial(get_communications, framework_slug),
+    )
+    supplier = supplier['suppliers']
+    draft_count, complete_count = sum(draft_counts.values()), sum(complete_counts.values())
 
-    supplier_framework_info = get_supplier_framework_info(data_api_client, framework_slug)
     declaration_status = get_declaration_status_from_info(supplier_framework_info)
     supplier_is_on_framework = get_supplier_on_framework_from_info(supplier_framework_info)
-    supplier = data_api_client.get_supplier(current_user.supplier_id)['suppliers']
 
     # Do not show a framework dashboard for earlier G-Cloud iterations
     if declaration_status == 'unstarted' and framework['status'] == 'live':
@@ -129,12 +141,12 @@ def framework_dashboard(framework_slug):
     )
     application_made = (
         supplier_is_on_framework or (
-            len(complete_drafts) > 0
+            complete_count > 0
             and declaration_status == 'complete'
             and application_company_details_confirmed
         )
     )
-    lots_with_completed_drafts = [lot for lot in framework['lots'] if count_drafts_by_lot(complete_drafts, lot['slug'])]
+    lots_with_completed_drafts = [lot for lot in framework['lots'] if complete_counts[lot['slug']]]
 
     # GA custom dimension stages for the application
     if supplier_framework_info and not supplier_framework_info['applicationCompanyDetailsConfirmed']:
@@ -143,7 +155,7 @@ def framework_dashboard(framework_slug):
         custom_dimension_stage = "company_details_confirmed"
     if declaration_status == 'complete':
         custom_dimension_stage = "declaration_confirmed"
-    if complete_drafts:
+    if complete_count:
         # At least one service has been confirmed
         custom_dimension_stage = "services_confirmed"
     if application_made:
@@ -172,10 +184,6 @@ def framework_dashboard(framework_slug):
                 supplier_framework_info['agreementPath']
             )
 
-    communications_folder = "{}/communications".format(framework_slug)
-    key_list = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET']).list(communications_folder, load_timestamps=True)
-    key_list.reverse()
-
     base_communications_files = {
         "invitation": {
             "path": "communications/",
@@ -210,7 +218,7 @@ def framework_dashboard(framework_slug):
         label: dict(
             d,
             last_modified=get_last_modified_from_first_matching_file(
-                key_list,
+                communications,
                 framework_slug,
                 d["path"] + d.get("filename", ""),
             ),
@@ -224,13 +232,13 @@ def framework_dashboard(framework_slug):
         application_made=application_made,
         communications_files=communications_files,
         completed_lots=tuple(
-            dict(lot, complete_count=count_drafts_by_lot(complete_drafts, lot['slug']))
+            dict(lot, complete_count=complete_counts[lot['slug']])
             for lot in lots_with_completed_drafts
         ),
         countersigned_agreement_file=countersigned_agreement_file,
         counts={
-            "draft": len(drafts),
-            "complete": len(complete_drafts)
+            "draft": draft_count,
+            "complete": complete_count
         },
         declaration_status=declaration_status,
         signed_agreement_document_name=signed_agreement_document_name,
@@ -252,16 +260,23 @@ def framework_dashboard(framework_slug):
 def framework_submission_lots(framework_slug):
     framework = get_framework_or_404(data_api_client, framework_slug)
 
-    drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
-    declaration_status = get_declaration_status(data_api_client, framework_slug)
-    application_made = len(complete_drafts) > 0 and declaration_status == 'complete'
     if framework['status'] not in ["open", "pending", "standstill"]:
         abort(404)
 
+    # the drafts themselves are only listed while the framework is open
+    if framework['status'] == 'open':
+        drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
+        draft_counts, complete_counts = count_drafts_by_lot(drafts), count_drafts_by_lot(complete_drafts)
+    else:
+        drafts, complete_drafts = [], []
+        draft_counts, complete_counts = get_draft_counts(data_api_client, framework_slug)
+
+    declaration_status = get_declaration_status(data_api_client, framework_slug)
+    application_made = sum(complete_counts.values()) > 0 and declaration_status == 'complete'
     lots = [
         dict(lot,
-             draft_count=count_drafts_by_lot(drafts, lot['slug']),
-             complete_count=count_drafts_by_lot(complete_drafts, lot['slug']))
+             draft_count=draft_counts[lot['slug']],
+             complete_count=complete_counts[lot['slug']])
         for lot in framework['lots']]
 
     lot_question = {
@@ -286,7 +301,7 @@ def framework_submission_lots(framework_slug):
         ),
     } for lot in lots if framework["status"] == "open" or (lot['draft_count'] + lot['complete_count']) > 0]
 
-    return render_template(
+    return Response(stream_template(
         "frameworks/submission_lots.html",
         complete_drafts=list(reversed(complete_drafts)),
         drafts=list(reversed(drafts)),
@@ -294,7 +309,7 @@ def framework_submission_lots(framework_slug):
         framework=framework,
         lots=lots,
         application_made=application_made
-    ), 200
+    )), 200
 
 
 @main.route('/frameworks/<framework_slug>/submissions/service-type', methods=['GET', 'POST'])
@@ -398,22 +413,12 @@ def framework_submission_services(framework_slug, lot_slug):
                     framework_slug=framework_slug, lot_slug=lot_slug, service_id=draft['id'])
         )
 
-    lot_service_sections = content_loader.get_manifest(
-        framework_slug,
-        'edit_submission',
-    ).filter(context={'lot': lot_slug}, inplace_allowed=True)
+    lot_service_sections = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', {'lot': lot_slug})
 
     with logged_duration(message="Annotated draft details in {duration_real}s"):
-        for draft in drafts:
-            sections = lot_service_sections.summary(draft, inplace_allowed=True)
-
-            unanswered_required, unanswered_optional = count_unanswered_questions(sections)
-            draft.update({
-                'unanswered_required': unanswered_required,
-                'unanswered_optional': unanswered_optional,
-            })
+        add_unanswered_counts_to_drafts(framework_slug, lot_service_sections, drafts)
 
-    return render_template(
+    return Response(stream_template(
         "frameworks/services.html",
         previous_framework=previous_framework if previous_services_still_to_copy else None,
         complete_drafts=list(reversed(complete_drafts)),
@@ -421,7 +426,7 @@ def framework_submission_services(framework_slug, lot_slug):
         declaration_status=declaration_status,
         framework=framework,
         lot=lot,
-    ), 200
+    )), 200
 
 
 @main.route('/frameworks/<framework_slug>/declaration/start', methods=['GET'])
@@ -569,57 +574,16 @@ def framework_supplier_declaration_overview(framework_slug):
         abort(410)
 
     try:
-        content = content_loader.get_manifest(
-            framework_slug,
-            'declaration',
-        ).filter(sf["declaration"], inplace_allowed=True)
+        sections_errors, validates = get_declaration_overview(framework, sf)
     except ContentNotFoundError:
         abort(404)
 
-    # generate an (ordered) dict of the form {section_slug: (section, section_errors)}.
-    # to perform validation per section.
-    declaration_validator = get_validator(framework, content, sf["declaration"])
-
-    sections_errors = OrderedDict()
-    for section in content.summary(sf["declaration"]):
-        errors = None
-        if section.editable:
-            errors = declaration_validator.get_error_messages_for_page(section)
-
-        sections_errors[section.slug] = (section, errors)
-
-        # Create govukSummaryList-friendly fields
-        section.summary_list = []
-        for question in section.questions:
-            if sf["prefillDeclarationFromFrameworkSlug"] and section.prefill:
-                question.empty_message = "Review answer"
-            else:
-                question.empty_message = "Answer question"
-            section.summary_list.append(
-                to_summary_list_row(
-                    question,
-                    action_link=url_for(
-                        ".framework_supplier_declaration_edit",
-                        framework_slug=framework_slug,
-                        section_id=section.id,
-                        _anchor=question.id if section.questions[0].id != question.id else None
-                    ) if framework["status"] == "open" and sections_errors else None
-                )
-            )
-
-        # We need to parse key text for question references. This isn't optimal, but references only apply to
-        # this app, so holding off on centralising this logic to the Content Loader.
-        def label_question_reference(row):
-            row["key"]["text"] = question_references(row.get("key", {}).get("text", ""), section.get_question)
-            return row
-        section.summary_list = list(map(label_question_reference, section.summary_list))
-
     return render_template(
         "frameworks/declaration_overview.html",
         framework=framework,
         supplier_framework=sf,
         sections_errors=sections_errors,
-        validates=not any(errors for section, errors in sections_errors.values()),
+        validates=validates,
     ), 200
 
 
@@ -634,10 +598,7 @@ def framework_supplier_declaration_submit(framework_slug):
     # ensure our declaration is at least a dict
     sf["declaration"] = sf.get("declaration") or {}
 
-    content = content_loader.get_manifest(
-        framework_slug,
-        'declaration',
-    ).filter(sf["declaration"], inplace_allowed=True)
+    content = content_loader.get_filtered_manifest(framework_slug, 'declaration', sf["declaration"])
 
     validator = get_validator(framework, content, sf["declaration"])
     errors = validator.get_error_messages()
@@ -666,7 +627,7 @@ def framework_supplier_declaration_submit(framework_slug):
 def framework_supplier_declaration_edit(framework_slug, section_id):
     framework = get_framework_or_404(data_api_client, framework_slug, allowed_statuses=['open'])
 
-    content = content_loader.get_manifest(framework_slug, 'declaration').filter({}, inplace_allowed=True)
+    content = content_loader.get_filtered_manifest(framework_slug, 'declaration', {})
     status_code = 200
 
     # Get and check the current section.
@@ -711,10 +672,20 @@ def framework_supplier_declaration_edit(framework_slug, section_id):
     else:
         submitted_answers = section.get_data(request.form)
 
-        # File fields won't be returned by `section.get_data` so handle these separately
-        if request.files:
+        # File fields won't be returned by `section.get_data` so handle these separately, starting with documents
+        # the browser has already uploaded straight to S3
+        uploaded_documents, document_errors = record_direct_uploads(
+            current_app.config['DM_DOCUMENTS_BUCKET'],
+            'documents',
+            current_app.config['DM_ASSETS_URL'],
+            {"frameworkSlug": framework_slug, "supplierId": supplier_framework["supplierId"]},
+            request.form,
+            section,
+        )
+
+        if request.files and not document_errors:
             # This utils method filters out any empty documents and validates against service document rules
-            uploaded_documents, document_errors = upload_declaration_documents(
+            uploaded_files, document_errors = upload_declaration_documents(
                 s3.S3(current_app.config['DM_DOCUMENTS_BUCKET']),
                 'documents',
                 current_app.config['DM_ASSETS_URL'],
@@ -723,11 +694,12 @@ def framework_supplier_declaration_edit(framework_slug, section_id):
                 framework_slug,
                 supplier_framework["supplierId"]
             )
+            uploaded_documents.update(uploaded_files or {})
 
-            if document_errors:
-                errors = govuk_errors(section.get_error_messages(document_errors, question_descriptor_from="question"))
-            else:
-                submitted_answers.update(uploaded_documents)
+        if document_errors:
+            errors = govuk_errors(section.get_error_messages(document_errors, question_descriptor_from="question"))
+        else:
+            submitted_answers.update(uploaded_documents)
 
         validator = get_validator(framework, content, submitted_answers)
 
@@ -788,64 +760,15 @@ def framework_supplier_declaration_edit(framework_slug, section_id):
         errors = updated_errors
 
     # prepare the govuk-frontend macro calls for this page with some customizations
-    form_html = []
-
-    def adjust_params(question_data):
-        if isinstance(question_data, list):
-            for q in question_data:
-                adjust_params(q)
-        else:
-            # we want to use a class to style numbered questions
-            if "fieldset" in question_data:
-                label_or_legend = question_data["fieldset"]["legend"]
-                question_data["fieldset"]["classes"] = (
-                    "dm-numbered-question {}".format(question_data['fieldset'].get('classes', ''))
-                )
-            else:
-                label_or_legend = question_data["label"]
-                question_data["label"]["classes"] = (
-                    "dm-numbered-question {}".format(question_data['label'].get('classes', ''))
-                )
-
-            params = question_data["params"]
-
-            # we allow question references in the question label, hint, and error message
-            label_or_legend["text"] = question_references(label_or_legend["text"], content.get_question)
-            if "hint" in params:
-                params["hint"]["text"] = question_references(params["hint"]["text"], content.get_question)
-            if "errorMessage" in params:
-                params["errorMessage"]["text"] = question_references(
-                    params["errorMessage"]["text"], content.get_question
-                )
-
-            # we want question numbers in the label
-            label_or_legend["html"] = (
-                Markup(f'<span class="dm-numbered-question__number">{question.number}</span> ')
-                + label_or_legend["text"]
-            )
-            del label_or_legend["text"]
-
-            # we add a 'message' to each question which is prefilled
-            if (
-                (question.id not in errors)
-                and name_of_framework_that_section_has_been_prefilled_from
-                and (question.id in all_answers)
-                and (question.id in declaration_to_reuse)
-            ):
-                # this is a misuse of error message component but I can't think of a better way right now
-                params["formGroup"] = {"classes": "dm-form-group--notice"}
-                params["errorMessage"] = {
-                    "classes": "dm-error-message--notice",
-                    "text": "This answer is from your {} declaration".format(
-                        name_of_framework_that_section_has_been_prefilled_from),
-                    "visuallyHiddenText": "Notice",
-                }
-        return question_data
-
-    for question in section.questions:
-        question_data = govuk_frontend.from_question(question, all_answers, errors, is_page_heading=False)
-
-        form_html.append(adjust_params(question_data))
+    form_html = get_declaration_question_params(
+        framework_slug,
+        section,
+        content.get_question,
+        all_answers,
+        errors,
+        prefilled_from_framework_name=name_of_framework_that_section_has_been_prefilled_from,
+        prefilled_answers=declaration_to_reuse if name_of_framework_that_section_has_been_prefilled_from else (),
+    )
 
     session_timeout = displaytimeformat(datetime.utcnow() + timedelta(hours=1))
     return render_template(
@@ -860,17 +783,45 @@ def framework_supplier_declaration_edit(framework_slug, section_id):
         render=govuk_frontend.render,
         errors=errors,
         session_timeout=session_timeout,
+        direct_upload_url=url_for('.create_declaration_upload', framework_slug=framework_slug),
     ), status_code
 
 
+@main.route('/frameworks/<framework_slug>/declaration/upload', methods=['POST'])
+@login_required
+@EnsureApplicationCompanyDetailsHaveBeenConfirmed(data_api_client)
+@return_404_if_applications_closed(lambda: data_api_client)
+def create_declaration_upload(framework_slug):
+    """Return the credentials for the browser to upload a declaration document straight to S3"""
+    get_framework_or_404(data_api_client, framework_slug, allowed_statuses=['open'])
+
+    content = content_loader.get_filtered_manifest(framework_slug, 'declaration', {})
+    question = content.get_question(request.form.get('question'))
+    if question is None or question.type != 'upload':
+        abort(404)
+
+    upload = create_direct_upload(
+        current_app.config['DM_DOCUMENTS_BUCKET'],
+        'documents',
+        {"frameworkSlug": framework_slug, "supplierId": current_user.supplier_id},
+        question.id,
+        request.form.get('filename', ''),
+    )
+    if upload is None:
+        return jsonify(error='file_is_open_document_format'), 400
+
+    return jsonify(upload)
+
+
 @main.route('/frameworks/<framework_slug>/files/<path:filepath>', methods=['GET'])
 @login_required
 def download_supplier_file(framework_slug, filepath):
-    uploader = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET'])
-    url = get_signed_document_url(uploader, "{}/communications/{}".format(framework_slug, filepath))
+    path = "{}/communications/{}".format(framework_slug, filepath)
+    url = get_signed_document_url(current_app.config['DM_COMMUNICATIONS_BUCKET'], path)
     if not url:
         abort(404)
 
+    communication_found(path)
     return redirect(url)
 
 
@@ -881,9 +832,8 @@ def download_agreement_file(framework_slug, document_name):
     if supplier_framework_info is None or not supplier_framework_info.get("declaration"):
         abort(404)
 
-    agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
     path = get_document_path(framework_slug, current_user.supplier_id, 'agreements', document_name)
-    url = get_signed_url(agreements_bucket, path, current_app.config['DM_ASSETS_URL'])
+    url = get_signed_document_url(current_app.config['DM_AGREEMENTS_BUCKET'], path)
     if not url:
         abort(404)
 
@@ -903,8 +853,8 @@ def download_declaration_document(framework_slug, supplier_id, document_name):
     if current_user.supplier_id != supplier_id:
         abort(404)
 
-    uploader = s3.S3(current_app.config['DM_DOCUMENTS_BUCKET'])
-    s3_url = get_signed_document_url(uploader, "{}/documents/{}/{}".format(framework_slug, supplier_id, document_name))
+    path = "{}/documents/{}/{}".format(framework_slug, supplier_id, document_name)
+    s3_url = get_signed_document_url(current_app.config['DM_DOCUMENTS_BUCKET'], path)
     if not s3_url:
         abort(404)
 
@@ -923,16 +873,14 @@ def framework_updates(framework_slug, error_message=None, default_textbox_value=
                                    'user_id': current_user.id,
                                    'supplier_id': current_user.supplier_id})
 
-    communications_bucket = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET'])
-    file_list = communications_bucket.list('{}/communications/updates/'.format(framework_slug), load_timestamps=True)
+    communications_folder = '{}/communications/'.format(framework_slug)
+    updates_folder = '{}updates/'.format(communications_folder)
     files = {
         'communications': [],
         'clarifications': [],
     }
-    for file in file_list:
-        path_parts = file['path'].split('/')
-        file['path'] = '/'.join(path_parts[2:])
-        files[path_parts[3]].append(file)
+    for folder, folder_files in get_communications(framework_slug).group_by_folder(updates_folder).items():
+        files[folder] = [dict(file, path=file['path'][len(communications_folder):]) for file in folder_files]
 
     errors = {CLARIFICATION_QUESTION_NAME: {
         "text": error_message,
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 
 from dmutils.forms.errors import govuk_errors
-from flask import request, redirect, url_for, abort, flash, current_app, Markup
+from flask import request, redirect, url_for, abort, flash, current_app, Markup, jsonify, Response
 from flask_login import current_user
 
 from dmapiclient import HTTPError
@@ -9,7 +9,6 @@ from dmcontent.content_loader import ContentNotFoundError
 from dmcontent.utils import count_unanswered_questions
 from dmutils import s3
 from dmutils.dates import update_framework_with_formatted_dates
-from dmutils.documents import upload_service_documents
 from dmutils.formats import displaytimeformat
 from dmutils.flask import timed_render_template as render_template
 from dmutils.forms.helpers import get_errors_from_wtform
@@ -18,12 +17,15 @@ from dmutils.errors import render_error_page
 from ... import data_api_client
 from ...main import main, content_loader
 from ..helpers import login_required
+from ..helpers.direct_uploads import create_direct_upload, record_direct_uploads
+from ..helpers.documents import upload_service_documents
 from ..helpers.services import (
     copy_service_from_previous_framework,
     get_lot_drafts,
-    get_signed_document_url,
     is_service_associated_with_supplier, get_draft_service_or_404,
 )
+from ..helpers.signed_urls import get_signed_document_url
+from ..helpers.streaming import stream_template
 from ..helpers.frameworks import (
     get_framework_and_lot_or_404,
     get_declaration_status,
@@ -66,11 +68,11 @@ def list_services(framework_slug):
         framework=framework_slug,
     )["services"]
 
-    return render_template(
+    return Response(stream_template(
         "services/list_services.html",
         services=suppliers_services,
         framework=framework,
-    ), 200
+    )), 200
 
 
 #  #######################  EDITING LIVE SERVICES #############################
@@ -314,10 +316,7 @@ def start_new_draft_service(framework_slug, lot_slug):
 
     framework, lot = get_framework_and_lot_or_404(data_api_client, framework_slug, lot_slug, allowed_statuses=['open'])
 
-    content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(
-        {'lot': lot['slug']},
-        inplace_allowed=True,
-    )
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', {'lot': lot['slug']})
 
     section = content.get_section(content.get_next_editable_section_id())
     if section is None:
@@ -379,10 +378,7 @@ def copy_draft_service(framework_slug, lot_slug, service_id):
 
     draft = get_draft_service_or_404(data_api_client, service_id, framework_slug, lot_slug)
 
-    content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(
-        {'lot': lot['slug']},
-        inplace_allowed=True,
-    )
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', {'lot': lot['slug']})
 
     draft_copy = data_api_client.copy_draft_service(
         service_id,
@@ -502,9 +498,8 @@ def service_submission_document(framework_slug, supplier_id, document_name):
     if current_user.supplier_id != supplier_id:
         abort(404)
 
-    uploader = s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET'])
-    s3_url = get_signed_document_url(uploader,
-                                     "{}/submissions/{}/{}".format(framework_slug, supplier_id, document_name))
+    path = "{}/submissions/{}/{}".format(framework_slug, supplier_id, document_name)
+    s3_url = get_signed_document_url(current_app.config['DM_SUBMISSIONS_BUCKET'], path)
     if not s3_url:
         abort(404)
 
@@ -530,10 +525,11 @@ def view_service_submission(framework_slug, lot_slug, service_id):
     if not is_service_associated_with_supplier(draft):
         abort(404)
 
-    sections = content_loader.get_manifest(
+    sections = content_loader.get_filtered_manifest(
         framework['slug'],
         'edit_submission',
-    ).filter(draft, inplace_allowed=True).summary(draft, inplace_allowed=True)
+        draft,
+    ).summary(draft, inplace_allowed=True)
 
     unanswered_required, unanswered_optional = count_unanswered_questions(sections)
 
@@ -572,7 +568,7 @@ def edit_service_submission(framework_slug, lot_slug, service_id, section_id, qu
 
     draft = get_draft_service_or_404(data_api_client, service_id, framework_slug, lot_slug)
 
-    content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(draft, inplace_allowed=True)
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', draft)
     section = content.get_section(section_id)
     if section and (question_slug is not None):
         next_question = section.get_question_by_slug(section.get_next_question_slug(question_slug))
@@ -585,18 +581,23 @@ def edit_service_submission(framework_slug, lot_slug, service_id, section_id, qu
     if request.method == "POST":
         update_data = section.get_data(request.form)
 
-        if request.files:
-            uploader = s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET'])
-            documents_url = url_for('.dashboard', _external=True) + '/assets/'
+        bucket_name = current_app.config['DM_SUBMISSIONS_BUCKET']
+        documents_url = url_for('.dashboard', _external=True) + '/assets/'
+        # Documents the browser has already uploaded straight to S3
+        uploaded_documents, document_errors = record_direct_uploads(
+            bucket_name, 'submissions', documents_url, draft, request.form, section)
+
+        if request.files and not document_errors:
             # This utils method filters out any empty documents and validates against service document rules
-            uploaded_documents, document_errors = upload_service_documents(
-                uploader, 'submissions', documents_url, draft, request.files, section,
+            uploaded_files, document_errors = upload_service_documents(
+                s3.S3(bucket_name), 'submissions', documents_url, draft, request.files, section,
                 public=False)
+            uploaded_documents.update(uploaded_files or {})
 
-            if document_errors:
-                errors = section.get_error_messages(document_errors, question_descriptor_from="question")
-            else:
-                update_data.update(uploaded_documents)
+        if document_errors:
+            errors = section.get_error_messages(document_errors, question_descriptor_from="question")
+        else:
+            update_data.update(uploaded_documents)
 
         if not errors and section.has_changes_to_save(draft, update_data):
             try:
@@ -647,9 +648,38 @@ def edit_service_submission(framework_slug, lot_slug, service_id, section_id, qu
         force_continue_button=force_continue_button,
         session_timeout=session_timeout,
         errors=errors,
+        direct_upload_url=url_for(
+            ".create_service_submission_upload",
+            framework_slug=framework['slug'],
+            lot_slug=draft['lotSlug'],
+            service_id=service_id,
+        ),
     )
 
 
+@main.route('/frameworks/<framework_slug>/submissions/<lot_slug>/<service_id>/upload', methods=['POST'])
+@login_required
+@EnsureApplicationCompanyDetailsHaveBeenConfirmed(data_api_client)
+@return_404_if_applications_closed(lambda: data_api_client)
+def create_service_submission_upload(framework_slug, lot_slug, service_id):
+    """Return the credentials for the browser to upload a document for a draft service straight to S3"""
+    get_framework_and_lot_or_404(data_api_client, framework_slug, lot_slug, allowed_statuses=['open'])
+    draft = get_draft_service_or_404(data_api_client, service_id, framework_slug, lot_slug)
+
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', draft)
+    question = content.get_question(request.form.get('question'))
+    if question is None or question.type != 'upload':
+        abort(404)
+
+    upload = create_direct_upload(
+        current_app.config['DM_SUBMISSIONS_BUCKET'], 'submissions', draft, question.id,
+        request.form.get('filename', ''), public=False)
+    if upload is None:
+        return jsonify(error='file_is_open_document_format'), 400
+
+    return jsonify(upload)
+
+
 @main.route('/frameworks/<framework_slug>/submissions/<lot_slug>/<service_id>/remove/<section_id>/<question_slug>',
             methods=['GET'])
 @login_required
@@ -666,7 +696,7 @@ def confirm_subsection_remove(framework_slug, lot_slug, service_id, section_id,
     if not is_service_associated_with_supplier(draft):
         abort(404)
 
-    content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(draft, inplace_allowed=True)
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', draft)
     section = content.get_section(section_id)
     containing_section = section
     if section and (question_slug is not None):
@@ -715,7 +745,7 @@ def confirm_subsection_remove(framework_slug, lot_slug, service_id, section_id,
 def remove_subsection(framework_slug, lot_slug, service_id, section_id, question_slug):
     draft = get_draft_service_or_404(data_api_client, service_id, framework_slug, lot_slug)
 
-    content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(draft, inplace_allowed=True)
+    content = content_loader.get_filtered_manifest(framework_slug, 'edit_submission', draft)
     section = content.get_section(section_id)
     containing_section = section
     if section and (question_slug is not None):
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+import json
+import os
+import tempfile
+from threading import Lock
+
+from jinja2 import FileSystemBytecodeCache, TemplateError, Undefined, nodes
+from jinja2.ext import Extension
+
+# built by scripts/build-template-cache.py - lets workers skip compiling the templates the first time they're rendered
+TEMPLATE_CACHE_PATH = 'app/template-cache'
+
+# the templates in the app, govuk-frontend and digitalmarketplace-govuk-frontend, rather than the other files alongside
+# them in node_modules
+TEMPLATE_EXTENSIONS = ('html', 'njk')
+
+# enough for the fragments of every framework's pages, for each combination of their keys that's in use at a time
+FRAGMENT_CACHE_SIZE = 512
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """Compiled templates, shared by every worker through the filesystem.
+
+    Jinja ignores any bytecode compiled from a different version of a template's source or by a different version of
+    Python, so a stale cache just means compiling as if there were none. Templates that weren't compiled at build time
+    are added by whichever worker compiles them first, if it can write to the cache.
+    """
+    def dump_bytecode(self, bucket):
+        # written to a temporary file and moved into place, so that other workers never read a half-written file
+        try:
+            fd, temporary_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        except OSError:
+            # the cache is read-only, so only has what was compiled at build time
+            return
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(temporary_path, self._get_cache_filename(bucket))
+        except OSError:
+            os.unlink(temporary_path)
+
+
+class FragmentCache:
+    """Rendered template fragments, shared by every thread in a worker"""
+    def __init__(self, size=FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._lock = Lock()
+        # least recently used first, key -> rendered fragment
+        self._fragments = OrderedDict()
+
+    def get(self, key, render):
+        """Return the fragment cached for `key`, or render and cache it with `render()`"""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        fragment = render()
+
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+
+        return fragment
+
+
+def _fragment_key_default(value):
+    # e.g. an attribute of a context variable that's None, which would otherwise depend on the kind of Undefined
+    if isinstance(value, Undefined):
+        return None
+    return str(value)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds a `cache` tag to templates, which renders what's inside it once for each distinct set of keys:
+
+        {% cache framework.slug, framework.status %}
+          ...
+        {% endcache %}
+
+    The keys must include everything the fragment depends on, as whatever was rendered first for them is used from
+    then on, by any request. So nothing specific to a request, such as a CSRF token, can be inside the tag. The keys
+    can be anything JSON can represent, and each `cache` tag is cached separately.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        keys = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            keys.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.Const(parser.name), nodes.Const(lineno), nodes.List(keys)]),
+            [], [], body,
+        ).set_lineno(lineno)
+
+    def _render_cached(self, template_name, lineno, keys, caller):
+        key = (template_name, lineno, json.dumps(keys, sort_keys=True, default=_fragment_key_default))
+        return self.environment.fragment_cache.get(key, caller)
+
+
+def init_app(application, cache_path=TEMPLATE_CACHE_PATH):
+    """Add the `cache` tag for template fragments, and load compiled templates from `cache_path` if it has been built"""
+    application.jinja_env.add_extension(FragmentCacheExtension)
+
+    if os.path.isdir(cache_path):
+        application.jinja_env.bytecode_cache = TemplateBytecodeCache(cache_path)
+
+
+def build_template_cache(application, cache_path=TEMPLATE_CACHE_PATH):
+    """Compile all of the application's templates into `cache_path`. Returns the names of the templates compiled and of
+    any that couldn't be.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    environment = application.jinja_env
+    environment.bytecode_cache = TemplateBytecodeCache(cache_path)
+    environment.bytecode_cache.clear()
+
+    compiled, failed = [], []
+    for name in environment.list_templates(extensions=TEMPLATE_EXTENSIONS):
+        try:
+            environment.get_template(name)
+        except (TemplateError, UnicodeDecodeError):
+            # not every file that looks like a template is one this app can use, e.g. govuk-frontend's examples
+            failed.append(name)
+        else:
+            compiled.append(name)
+
+    return compiled, failed
@@ -216,6 +216,16 @@ gulp.task(
   )
 )
 
+// the content snapshot records the frameworks package's version, to tell whether the content has changed since
+gulp.task('copy:frameworks:version', function () {
+  return gulp
+    .src(path.join(sspContentRoot, 'package.json'))
+    .pipe(gulp.dest(path.join('app', 'content')))
+    .on('end', function () {
+      console.log('📂  Copied frameworks package version into app folder')
+    })
+})
+
 gulp.task(
   'copy:govuk_frontend_assets:fonts',
   copyFactory(
@@ -285,6 +295,7 @@ gulp.task('set_environment_to_production', function (cb) {
 
 gulp.task('copy', gulp.parallel(
   'copy:frameworks',
+  'copy:frameworks:version',
   'copy:govuk_toolkit_assets:images',
   'copy:dm_toolkit_assets:stylesheets',
   'copy:dm_toolkit_assets:images',
@@ -308,7 +319,7 @@ gulp.task('build:production', gulp.series(gulp.parallel('set_environment_to_prod
 gulp.task('watch', gulp.series('build:development', function () {
   const jsWatcher = gulp.watch([path.join(assetsFolder, '**', '*.js')], gulp.series('js'))
   const cssWatcher = gulp.watch([path.join(assetsFolder, '**', '*.scss')], gulp.series('sass'))
-  const dmWatcher = gulp.watch([path.join(npmRoot, 'digitalmarketplace-frameworks', '**')], gulp.series('copy:frameworks'))
+  const dmWatcher = gulp.watch([path.join(npmRoot, 'digitalmarketplace-frameworks', '**')], gulp.series('copy:frameworks', 'copy:frameworks:version'))
   const notice = function (event) {
     console.log('File ' + event.path + ' was ' + event.type + ' running tasks...')
   }
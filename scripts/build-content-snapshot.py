@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""Load the frameworks content from YAML and save it as a snapshot that app workers restore at startup.
+
+Must be run from the repository root after the frontend build has copied the frameworks content into app/content, and
+by the same Python and content loader the app runs with - workers ignore a snapshot built by any others, and fall back
+to loading the YAML themselves, as they do if the content has changed since the snapshot was built.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+# app.main.CONTENT_SNAPSHOT_PATH, which can't be imported without loading the content. Any snapshot left over from a
+# previous build is removed first, so that importing app.main loads the content from YAML.
+CONTENT_SNAPSHOT_PATH = 'app/content-snapshot.pickle'
+if os.path.exists(CONTENT_SNAPSHOT_PATH):
+    os.remove(CONTENT_SNAPSHOT_PATH)
+
+from app.main import get_content_loader  # noqa: E402
+
+get_content_loader().dump_snapshot(CONTENT_SNAPSHOT_PATH)
+print(f"Content snapshot written to {CONTENT_SNAPSHOT_PATH}", file=sys.stderr)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""Compile the app's templates, and the govuk-frontend ones it uses, into a bytecode cache that app workers load them
+from, so that a freshly started worker doesn't have to compile each template the first time it's rendered.
+
+Must be run from the repository root after the frontend build has installed the govuk-frontend templates into
+node_modules, from the same directory the app will run from, as compiled templates are stored by their path, and by
+the same Python the app runs with, as Jinja ignores bytecode compiled by any other. Workers compile any template whose
+source has changed since the cache was built as if there were no cache.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from app import create_app  # noqa: E402
+from app.template_cache import TEMPLATE_CACHE_PATH, build_template_cache  # noqa: E402
+
+# the templates are compiled the same whichever environment's config is used
+compiled, failed = build_template_cache(create_app('test'))
+for name in failed:
+    print(f"Couldn't compile {name}", file=sys.stderr)
+print(f"{len(compiled)} templates compiled to {TEMPLATE_CACHE_PATH}", file=sys.stderr)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Validate suppliers' declarations in bulk and count the errors for each question.
+
+Reads a JSON-lines export of supplier frameworks, one object with a "declaration" per line, and validates each
+declaration with the framework's validator and declaration manifest, the same as the declaration overview does. Writes
+a CSV of how many declarations have each error for each question to stdout, most common first.
+
+    ./scripts/validate-declarations.py g-cloud-12 supplier-frameworks.jsonl > declaration-errors.csv
+
+Must be run from the repository root, with the frameworks content in app/content. Lines are validated in chunks across
+a pool of processes.
+"""
+import argparse
+from collections import Counter
+import csv
+from functools import partial
+from itertools import islice
+import json
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from app.main import content_loader  # noqa: E402
+from app.main.helpers.validation import get_validator  # noqa: E402
+
+
+def validate_lines(framework, lines):
+    """Return how many declarations `lines` had and failed, and how many of them had each (question id, error)"""
+    totals, errors = Counter(), Counter()
+    for line in lines:
+        declaration = json.loads(line).get('declaration')
+        if not declaration:
+            totals['without a declaration'] += 1
+            continue
+
+        content = content_loader.get_filtered_manifest(framework['slug'], 'declaration', declaration)
+        validator = get_validator(framework, content, declaration)
+        # the same errors get_error_messages would show, for just the questions in the manifest
+        declaration_errors = [
+            (question_id, error) for question_id, error in validator.errors().items()
+            if question_id in validator.plan.questions
+        ]
+
+        totals['validated'] += 1
+        if declaration_errors:
+            totals['failed'] += 1
+        errors.update(declaration_errors)
+
+    return totals, errors
+
+
+def chunks(lines, size):
+    lines = (line for line in lines if line.strip())
+    return iter(lambda: list(islice(lines, size)), [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('framework_slug')
+    parser.add_argument('declarations', type=argparse.FileType('r'), help="JSON-lines file, or - for stdin")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="default: one per CPU")
+    parser.add_argument('--chunk-size', type=int, default=500, help="declarations sent to a process at a time")
+    args = parser.parse_args()
+
+    framework = {'slug': args.framework_slug}
+    totals, errors = Counter(), Counter()
+
+    # load the declaration before forking, so that the workers share this process's copy rather than each loading it
+    # again - its framework may only be loaded the first time it's used
+    content_loader.get_manifest(args.framework_slug, 'declaration')
+
+    with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+        for chunk_totals, chunk_errors in pool.imap_unordered(
+            partial(validate_lines, framework), chunks(args.declarations, args.chunk_size)
+        ):
+            totals.update(chunk_totals)
+            errors.update(chunk_errors)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['question', 'error', 'declarations'])
+    for (question_id, error), count in errors.most_common():
+        writer.writerow([question_id, error, count])
+
+    print(
+        "{} declarations validated, {} failed, {} lines without a declaration".format(
+            totals['validated'], totals['failed'], totals['without a declaration']
+        ),
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    main()
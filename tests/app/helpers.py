@@ -249,6 +249,11 @@ class BaseApplicationTest:
         self.session_mock = patch('dmutils.session.init_app')
         self.session_mock.start()
 
+        # the boto3 client documents are streamed and copied with, see app/main/helpers/s3_client.py
+        self.boto3_mock = patch('app.main.helpers.s3_client.boto3')
+        self.boto3 = self.boto3_mock.start()
+        self.s3_client = self.boto3.client.return_value
+
         self.app = create_app('test')
         self.app.jinja_options = ImmutableDict({**self.app.jinja_options, 'undefined': jinja2.StrictUndefined})
         self.app.register_blueprint(login_for_tests)
@@ -259,6 +264,7 @@ class BaseApplicationTest:
         self.teardown_login()
         self.app_env_var_mock.stop()
         self.session_mock.stop()
+        self.boto3_mock.stop()
 
     @staticmethod
     def get_cookie_by_name(response, name):
@@ -0,0 +1,206 @@
+"""Test for app/main/helpers/communications.py"""
+import threading
+
+import mock
+import pytest
+
+from app.main.helpers.communications import (
+    FileIndex, S3ListingCache, communication_found, get_communications, invalidate_communications,
+)
+
+from ...helpers import BaseApplicationTest
+
+
+def paths(index):
+    return [file['path'] for files in index.group_by_folder('').values() for file in files]
+
+
+class TestFileIndex:
+    listing = [
+        {'path': 'g-cloud-12/communications/updates/communications/b.pdf', 'last_modified': '2020-01-01'},
+        {'path': 'g-cloud-12/communications/g-cloud-12-invitation.pdf', 'last_modified': '2020-01-02'},
+        {'path': 'g-cloud-12/communications/updates/clarifications/c.pdf', 'last_modified': '2020-01-03'},
+        {'path': 'g-cloud-12/communications/updates/communications/a.pdf', 'last_modified': '2020-01-04'},
+        {'path': 'g-cloud-12/communications/g-cloud-12-invitation-old.pdf', 'last_modified': '2020-01-05'},
+    ]
+
+    @pytest.mark.parametrize('prefix, expected_latest', (
+        ('g-cloud-12/communications/', 4),
+        ('g-cloud-12/communications/updates/', 3),
+        ('g-cloud-12/communications/updates/clarifications/', 2),
+        ('g-cloud-12/communications/g-cloud-12-invitation.pdf', 1),
+        ('g-cloud-12/communications/g-cloud-12-invitation', 4),
+        ('g-cloud-12/communications/updates/communications/b', 0),
+    ))
+    def test_latest_matches_the_last_matching_file_in_the_listing(self, prefix, expected_latest):
+        assert FileIndex(self.listing).latest(prefix) is self.listing[expected_latest]
+
+    @pytest.mark.parametrize('listing_size', range(1, 20))
+    def test_latest_matches_a_scan_of_the_listing_for_every_prefix(self, listing_size):
+        listing = [{'path': 'folder/{:03b}/{}'.format(i * 7 % 9, i)} for i in range(listing_size)]
+        index = FileIndex(listing)
+
+        for prefix in {file['path'][:length] for file in listing for length in range(len(file['path']) + 1)}:
+            expected = next(file for file in reversed(listing) if file['path'].startswith(prefix))
+            assert index.latest(prefix) is expected
+
+    def test_latest_with_no_matching_files(self):
+        assert FileIndex(self.listing).latest('g-cloud-11/') is None
+        assert FileIndex([]).latest('') is None
+
+    def test_contains_only_exact_paths(self):
+        index = FileIndex(self.listing)
+
+        assert 'g-cloud-12/communications/g-cloud-12-invitation.pdf' in index
+        assert 'g-cloud-12/communications/g-cloud-12-invitation' not in index
+        assert 'g-cloud-12/communications/updates/' not in index
+
+    def test_group_by_folder_keeps_files_in_listing_order(self):
+        assert FileIndex(self.listing).group_by_folder('g-cloud-12/communications/updates/') == {
+            'communications': [self.listing[0], self.listing[3]],
+            'clarifications': [self.listing[2]],
+        }
+
+
+@mock.patch('app.main.helpers.communications.time')
+@mock.patch('dmutils.s3.S3')
+class TestS3ListingCache(BaseApplicationTest):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.cache = S3ListingCache(ttl=10, stale_ttl=100)
+
+    def listing(self, s3, *paths):
+        s3.return_value.list.return_value = [{'path': path} for path in paths]
+
+    def test_listings_are_cached_until_they_go_out_of_date(self, s3, time):
+        self.listing(s3, 'g-cloud-12/communications/a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            first = self.cache.get('bucket', 'g-cloud-12/communications')
+            time.monotonic.return_value = 9
+            second = self.cache.get('bucket', 'g-cloud-12/communications')
+
+        assert first is second
+        assert paths(first) == ['g-cloud-12/communications/a.pdf']
+        assert s3.call_args_list == [mock.call('bucket')]
+        assert s3.return_value.list.call_args_list == [mock.call('g-cloud-12/communications', load_timestamps=True)]
+
+    def test_listings_are_cached_by_bucket_and_prefix(self, s3, time):
+        self.listing(s3, 'g-cloud-12/communications/a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            self.cache.get('bucket', 'g-cloud-12/communications')
+            self.cache.get('bucket', 'g-cloud-12/communications/updates/')
+            self.cache.get('other-bucket', 'g-cloud-12/communications')
+
+        assert len(s3.return_value.list.call_args_list) == 3
+
+    def test_stale_listings_are_returned_while_they_are_refreshed(self, s3, time):
+        self.listing(s3, 'a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            self.cache.get('bucket', 'prefix')
+
+            self.listing(s3, 'a.pdf', 'b.pdf')
+            time.monotonic.return_value = 50
+            with mock.patch.object(threading.Thread, 'start', autospec=True) as start:
+                assert paths(self.cache.get('bucket', 'prefix')) == ['a.pdf']
+                # only one refresh is started at a time
+                assert paths(self.cache.get('bucket', 'prefix')) == ['a.pdf']
+
+            assert len(start.call_args_list) == 1
+            start.call_args_list[0][0][0].run()
+
+            assert paths(self.cache.get('bucket', 'prefix')) == ['a.pdf', 'b.pdf']
+
+        assert len(s3.return_value.list.call_args_list) == 2
+
+    def test_listings_are_fetched_again_once_too_stale(self, s3, time):
+        self.listing(s3, 'a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            self.cache.get('bucket', 'prefix')
+
+            self.listing(s3, 'a.pdf', 'b.pdf')
+            time.monotonic.return_value = 110
+            assert paths(self.cache.get('bucket', 'prefix')) == ['a.pdf', 'b.pdf']
+
+    def test_invalidate_forgets_listings_that_could_include_the_path(self, s3, time):
+        self.listing(s3, 'a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            for prefix in ('g-cloud-12/communications', 'g-cloud-12/communications/updates/', 'g-cloud-11/'):
+                self.cache.get('bucket', prefix)
+
+            self.cache.invalidate('bucket', 'g-cloud-12/communications/updates/clarifications/c.pdf')
+
+        assert list(self.cache._listings) == [('bucket', 'g-cloud-11/')]
+
+    def test_invalidate_unless_listed_keeps_listings_that_include_the_path(self, s3, time):
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            self.listing(s3, 'g-cloud-12/communications/a.pdf')
+            self.cache.get('bucket', 'g-cloud-12/communications')
+            self.listing(s3, 'g-cloud-12/communications/updates/b.pdf')
+            self.cache.get('bucket', 'g-cloud-12/communications/updates/')
+
+            self.cache.invalidate('bucket', 'g-cloud-12/communications/a.pdf', unless_listed=True)
+            assert list(self.cache._listings) == [
+                ('bucket', 'g-cloud-12/communications'), ('bucket', 'g-cloud-12/communications/updates/'),
+            ]
+
+            self.cache.invalidate('bucket', 'g-cloud-12/communications/updates/c.pdf', unless_listed=True)
+            assert list(self.cache._listings) == []
+
+    def test_listings_fetched_before_an_invalidation_are_not_cached(self, s3, time):
+        time.monotonic.return_value = 0
+
+        def list_and_invalidate(*args, **kwargs):
+            self.cache.invalidate('bucket')
+            return [{'path': 'a.pdf'}]
+        s3.return_value.list.side_effect = list_and_invalidate
+
+        with self.app.app_context():
+            self.cache.get('bucket', 'prefix')
+
+        assert self.cache._listings == {}
+
+    def test_communications_listings_are_kept_for_the_app(self, s3, time):
+        self.app.config['DM_COMMUNICATIONS_BUCKET'] = 'communications-bucket'
+        self.listing(s3, 'g-cloud-12/communications/a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            get_communications('g-cloud-12')
+            get_communications('g-cloud-12')
+            invalidate_communications('g-cloud-12/communications/a.pdf')
+            get_communications('g-cloud-12')
+
+        assert s3.call_args_list == [mock.call('communications-bucket'), mock.call('communications-bucket')]
+        assert s3.return_value.list.call_args_list == [
+            mock.call('g-cloud-12/communications', load_timestamps=True),
+        ] * 2
+
+    def test_communications_are_listed_again_when_a_new_one_is_found(self, s3, time):
+        self.app.config['DM_COMMUNICATIONS_BUCKET'] = 'communications-bucket'
+        self.listing(s3, 'g-cloud-12/communications/a.pdf')
+        time.monotonic.return_value = 0
+
+        with self.app.app_context():
+            get_communications('g-cloud-12')
+            communication_found('g-cloud-12/communications/a.pdf')
+            get_communications('g-cloud-12')
+
+            self.listing(s3, 'g-cloud-12/communications/a.pdf', 'g-cloud-12/communications/b.pdf')
+            communication_found('g-cloud-12/communications/b.pdf')
+            assert paths(get_communications('g-cloud-12')) == [
+                'g-cloud-12/communications/a.pdf', 'g-cloud-12/communications/b.pdf',
+            ]
+
+        assert len(s3.return_value.list.call_args_list) == 2
@@ -0,0 +1,70 @@
+"""Test for app/main/helpers/concurrency.py"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from io import BytesIO
+import threading
+import time
+
+from flask import abort, g, has_app_context, has_request_context, request
+import pytest
+from werkzeug.exceptions import NotFound
+
+from app.main.helpers.concurrency import call_concurrently
+
+from ...helpers import BaseApplicationTest
+
+
+class TestCallConcurrently(BaseApplicationTest):
+    def test_results_are_returned_in_order(self):
+        with self.app.test_request_context('/'):
+            assert call_concurrently(lambda: 1, lambda: 2, lambda: 3) == [1, 2, 3]
+
+    def test_calls_run_at_the_same_time(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        with self.app.test_request_context('/'):
+            # would time out waiting at the barrier if the calls were made one after another
+            assert call_concurrently(barrier.wait, barrier.wait, barrier.wait, timeout=10) is not None
+
+    def test_calls_share_the_requests_globals(self):
+        with self.app.test_request_context('/'):
+            g.marker = 'from the request'
+
+            def call():
+                g.other_marker = 'from a call'
+                return g.marker
+
+            assert call_concurrently(call) == ['from the request']
+            assert g.other_marker == 'from a call'
+
+    def test_calls_do_not_run_in_the_request_context(self):
+        with self.app.test_request_context('/'):
+            assert call_concurrently(has_request_context, has_app_context) == [False, True]
+
+    def test_the_requests_files_are_left_open(self):
+        with self.app.test_request_context(
+            '/', method='POST', data={'first': (BytesIO(b'one'), 'one.pdf'), 'second': (BytesIO(b'two'), 'two.pdf')},
+        ):
+            files = request.files
+            call_concurrently(lambda: None, lambda: None)
+
+            assert [files[name].read() for name in ('first', 'second')] == [b'one', b'two']
+
+    def test_calls_can_be_run_on_their_own_executor(self):
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='test-executor')
+
+        with self.app.test_request_context('/'):
+            assert call_concurrently(lambda: threading.current_thread().name, executor=executor)[0].startswith(
+                'test-executor'
+            )
+
+        executor.shutdown()
+
+    def test_aborting_in_a_call_aborts_the_request(self):
+        with self.app.test_request_context('/'):
+            with pytest.raises(NotFound):
+                call_concurrently(lambda: 1, lambda: abort(404))
+
+    def test_slow_calls_time_out(self):
+        with self.app.test_request_context('/'):
+            with pytest.raises(TimeoutError):
+                call_concurrently(lambda: time.sleep(1), timeout=0.1)
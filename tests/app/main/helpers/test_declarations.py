@@ -0,0 +1,167 @@
+"""Test for app/main/helpers/declarations.py"""
+import mock
+import pytest
+
+from dmcontent import govuk_frontend
+from dmcontent.content_loader import ContentManifest
+
+from app.main.helpers.declarations import (
+    DeclarationOverviewCache,
+    DeclarationOverviewSection,
+    _adjust_question_params,
+    build_declaration_overview,
+    declaration_hash,
+    get_declaration_overview,
+    get_declaration_question_params,
+)
+
+from ...helpers import BaseApplicationTest
+
+
+def test_declaration_hash_only_depends_on_the_answers():
+    assert declaration_hash({'a': 1, 'b': [1, 2]}) == declaration_hash({'b': [1, 2], 'a': 1})
+    assert declaration_hash({'a': 1}) != declaration_hash({'a': 2})
+
+
+@mock.patch('app.main.helpers.declarations.build_declaration_overview')
+class TestDeclarationOverviewCache:
+    framework = {'slug': 'g-cloud-12', 'status': 'open'}
+
+    def setup_method(self, method):
+        self.cache = DeclarationOverviewCache(size=2)
+
+    def supplier_framework(self, declaration, prefill=None):
+        return {'declaration': declaration, 'prefillDeclarationFromFrameworkSlug': prefill}
+
+    def test_overviews_are_cached_by_declaration(self, build_declaration_overview):
+        build_declaration_overview.side_effect = lambda framework, sf: (sf['declaration'], True)
+
+        assert self.cache.get(self.framework, self.supplier_framework({'a': 1})) == ({'a': 1}, True)
+        assert self.cache.get(self.framework, self.supplier_framework({'a': 1})) == ({'a': 1}, True)
+        assert self.cache.get(self.framework, self.supplier_framework({'a': 2})) == ({'a': 2}, True)
+
+        assert len(build_declaration_overview.call_args_list) == 2
+
+    def test_overviews_depend_on_the_framework_status_and_prefilling(self, build_declaration_overview):
+        self.cache.get(self.framework, self.supplier_framework({'a': 1}))
+        self.cache.get(dict(self.framework, status='live'), self.supplier_framework({'a': 1}))
+        self.cache.get(self.framework, self.supplier_framework({'a': 1}, prefill='g-cloud-11'))
+
+        assert len(build_declaration_overview.call_args_list) == 3
+
+    def test_least_recently_used_overviews_are_dropped(self, build_declaration_overview):
+        for answer in (1, 2, 1, 3):
+            self.cache.get(self.framework, self.supplier_framework({'a': answer}))
+
+        assert [key[-1] for key in self.cache._overviews] == [
+            declaration_hash({'a': 1}), declaration_hash({'a': 3}),
+        ]
+
+
+@mock.patch('app.main.helpers.declarations.get_validator')
+@mock.patch('app.main.helpers.declarations.content_loader')
+class TestBuildDeclarationOverview(BaseApplicationTest):
+    def test_only_the_rows_and_errors_are_kept(self, content_loader, get_validator):
+        content_loader.get_filtered_manifest.return_value = ContentManifest([{
+            'slug': 'about-you', 'id': 'about-you', 'name': 'About you', 'editable': True, 'questions': [
+                {'id': 'name', 'question': 'Name', 'type': 'text'},
+                {'id': 'established', 'question': 'Same as [[name]]?', 'type': 'boolean'},
+            ],
+        }])
+        get_validator.return_value.get_error_messages_by_section.return_value = {'about-you': {'name': 'required'}}
+
+        with self.app.test_request_context('/suppliers'):
+            sections_errors, validates = build_declaration_overview(
+                {'slug': 'g-cloud-12', 'status': 'open'},
+                {'declaration': {'established': True}, 'prefillDeclarationFromFrameworkSlug': None},
+            )
+
+        section, errors = sections_errors['about-you']
+        assert isinstance(section, DeclarationOverviewSection)
+        assert (section.slug, section.id, section.name, section.editable) == (
+            'about-you', 'about-you', 'About you', True,
+        )
+        assert isinstance(section.summary_list, tuple)
+        assert [row['key']['text'] for row in section.summary_list] == ['Name', 'Same as 1?']
+        assert errors == {'name': 'required'}
+        assert validates is False
+
+
+class TestGetDeclarationOverview(BaseApplicationTest):
+    @mock.patch('app.main.helpers.declarations.build_declaration_overview')
+    def test_get_declaration_overview_uses_the_app_cache(self, build_declaration_overview):
+        framework = {'slug': 'g-cloud-12', 'status': 'open'}
+        supplier_framework = {'declaration': {'a': 1}, 'prefillDeclarationFromFrameworkSlug': None}
+
+        with self.app.app_context():
+            assert get_declaration_overview(framework, supplier_framework) is build_declaration_overview.return_value
+            assert get_declaration_overview(framework, supplier_framework) is build_declaration_overview.return_value
+
+        assert build_declaration_overview.call_args_list == [mock.call(framework, supplier_framework)]
+
+
+class TestGetDeclarationQuestionParams:
+    def setup_method(self, method):
+        self.content = ContentManifest([{'slug': 'about-you', 'id': 'about-you', 'name': 'About you', 'questions': [
+            {'id': 'name', 'question': 'Name', 'type': 'text', 'hint': 'As in question [[established]]'},
+            {'id': 'established', 'question': 'Established in the UK?', 'type': 'boolean'},
+            {'id': 'tradingStatus', 'question': 'Trading status', 'type': 'radios', 'options': [
+                {'label': 'Limited company', 'value': 'limited company'}, {'label': 'Other', 'value': 'other'},
+            ]},
+            {'id': 'contact', 'question': 'Contact', 'type': 'multiquestion', 'questions': [
+                {'id': 'contactName', 'question': 'Contact name', 'type': 'text'},
+            ]},
+        ]}])
+        self.section = self.content.get_section('about-you')
+
+    def get_params(self, answers, errors, **kwargs):
+        return get_declaration_question_params(
+            'g-cloud-12', self.section, self.content.get_question, answers, errors, **kwargs
+        )
+
+    def expected_params(self, answers, errors):
+        return [
+            _adjust_question_params(
+                govuk_frontend.from_question(question, answers, errors, is_page_heading=False),
+                question, self.content.get_question,
+            )
+            for question in self.section.questions
+        ]
+
+    @pytest.mark.parametrize('answers, errors', (
+        ({}, {}),
+        ({'name': 'Blah', 'established': False, 'tradingStatus': 'other', 'contactName': 'Someone'}, {}),
+        ({'established': True}, {
+            'name': {'input_name': 'name', 'question': 'Name', 'message': 'See question [[established]]'},
+            'contactName': {'input_name': 'contactName', 'question': 'Contact name', 'message': 'Answer this'},
+        }),
+    ))
+    def test_params_are_the_same_as_building_them_for_the_answers(self, answers, errors):
+        assert self.get_params(answers, errors) == self.expected_params(answers, errors)
+        # and again, from the cache
+        assert self.get_params(answers, errors) == self.expected_params(answers, errors)
+
+    def test_unanswered_params_are_only_built_once_for_each_section(self):
+        self.get_params({}, {})
+
+        with mock.patch.object(govuk_frontend, 'from_question', wraps=govuk_frontend.from_question) as from_question:
+            self.get_params({}, {})
+            self.get_params({'name': 'Blah', 'established': True}, {})
+            self.get_params({'contactName': 'Someone'}, {})
+
+        # only the multiquestion (and so its subquestion) has to be built for its answers
+        assert [call[0][0].id for call in from_question.call_args_list] == ['contact', 'contactName']
+
+    def test_params_for_a_request_can_be_changed(self):
+        self.get_params({}, {})[0]['params']['value'] = 'Changed'
+
+        assert 'value' not in self.get_params({}, {})[0]['params']
+
+    def test_prefilled_answers_have_a_notice(self):
+        params = self.get_params(
+            {'name': 'Blah', 'established': True}, {},
+            prefilled_from_framework_name='G-Cloud 11', prefilled_answers={'name': 'Blah'},
+        )
+
+        assert params[0]['params']['errorMessage']['text'] == 'This answer is from your G-Cloud 11 declaration'
+        assert 'errorMessage' not in params[1]['params']
@@ -0,0 +1,148 @@
+"""Test for app/main/helpers/direct_uploads.py"""
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+import mock
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app.main.helpers.direct_uploads import create_direct_upload, record_direct_uploads
+
+from ...helpers import BaseApplicationTest
+
+PDF = b'%PDF-1.5\n' + b'0' * 1000
+
+
+class FakeS3Client:
+    """A stand-in for a bucket, enough to upload to with presigned POSTs and check the uploads"""
+    def __init__(self):
+        self.objects = {}
+
+    def generate_presigned_post(self, bucket_name, key, Fields, Conditions, ExpiresIn):
+        return {
+            'url': 'https://{}.s3.amazonaws.com/'.format(bucket_name),
+            'fields': dict(Fields, key=key, policy='policy', signature='signature'),
+        }
+
+    def upload(self, upload, contents):
+        self.objects[upload['fields']['key']] = contents
+
+    def get_object(self, Bucket, Key, Range):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        contents = self.objects[Key]
+        return {'Body': BytesIO(contents[:128]), 'ContentRange': 'bytes 0-127/{}'.format(len(contents))}
+
+    def delete(self, key):
+        del self.objects[key]
+
+
+class TestDirectUploads(BaseApplicationTest):
+    service = {'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 5678}
+
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.client = FakeS3Client()
+        self.s3_patch = mock.patch('dmutils.s3.S3')
+        s3 = self.s3_patch.start()
+        self.boto3.client.return_value = self.client
+        s3.return_value.delete_key.side_effect = self.client.delete
+
+        self.section = mock.Mock()
+        self.section.get_question_ids.return_value = ['pricingDocumentURL']
+
+    def teardown_method(self, method):
+        self.s3_patch.stop()
+        super().teardown_method(method)
+
+    def create(self, filename='pricing.pdf', service=None):
+        return create_direct_upload(
+            'submissions-bucket', 'submissions', service or self.service, 'pricingDocumentURL', filename,
+            public=False,
+        )
+
+    def record(self, upload, service=None):
+        return record_direct_uploads(
+            'submissions-bucket', 'submissions', 'http://localhost/suppliers/assets/', service or self.service,
+            MultiDict({'pricingDocumentURL-upload-token': upload['token']}), self.section,
+        )
+
+    @mock.patch('app.main.helpers.direct_uploads.generate_file_name', return_value='g-cloud-12/path/pricing.pdf')
+    def test_create_direct_upload_limits_what_can_be_uploaded(self, generate_file_name):
+        with mock.patch.object(self.client, 'generate_presigned_post', autospec=True) as generate_presigned_post:
+            with self.app.app_context():
+                self.create()
+
+        assert generate_file_name.call_args_list == [
+            mock.call('g-cloud-12', 'submissions', 1234, 5678, 'pricingDocumentURL', 'pricing.pdf'),
+        ]
+        assert generate_presigned_post.call_args_list == [mock.call(
+            'submissions-bucket',
+            'g-cloud-12/path/pricing.pdf',
+            Fields={'acl': 'bucket-owner-full-control', 'Content-Type': 'application/pdf'},
+            Conditions=[
+                {'acl': 'bucket-owner-full-control'},
+                {'Content-Type': 'application/pdf'},
+                ['content-length-range', 1, 5399999],
+            ],
+            ExpiresIn=600,
+        )]
+
+    def test_create_direct_upload_rejects_other_types_of_document(self):
+        with self.app.app_context():
+            assert self.create(filename='pricing.docx') is None
+
+    def test_uploaded_documents_are_recorded(self):
+        with self.app.app_context():
+            upload = self.create()
+            self.client.upload(upload, PDF)
+
+            documents, errors = self.record(upload)
+
+        key = upload['fields']['key']
+        assert key.startswith('g-cloud-12/submissions/1234/5678-pricing-document-')
+        assert documents == {'pricingDocumentURL': 'http://localhost/suppliers/assets/' + key}
+        assert errors == {}
+
+    def test_questions_without_a_token_are_ignored(self):
+        with self.app.app_context():
+            assert record_direct_uploads(
+                'submissions-bucket', 'submissions', 'http://localhost/suppliers/assets/', self.service,
+                MultiDict(), self.section,
+            ) == ({}, {})
+
+    @pytest.mark.parametrize('contents, error', (
+        (b'not a pdf' * 100, 'file_is_open_document_format'),
+        (PDF + b'0' * 5400000, 'file_is_less_than_5mb'),
+    ))
+    def test_invalid_documents_are_removed(self, contents, error):
+        with self.app.app_context():
+            upload = self.create()
+            self.client.upload(upload, contents)
+
+            assert self.record(upload) == ({}, {'pricingDocumentURL': error})
+
+        assert self.client.objects == {}
+
+    def test_documents_that_were_never_uploaded_are_an_error(self):
+        with self.app.app_context():
+            upload = self.create()
+
+            assert self.record(upload) == ({}, {'pricingDocumentURL': 'file_can_be_saved'})
+
+    def test_tokens_for_another_service_are_an_error(self):
+        with self.app.app_context():
+            upload = self.create(service=dict(self.service, id=9999))
+            self.client.upload(upload, PDF)
+
+            assert self.record(upload) == ({}, {'pricingDocumentURL': 'file_can_be_saved'})
+
+        # it's not ours to remove
+        assert len(self.client.objects) == 1
+
+    def test_tampered_tokens_are_an_error(self):
+        with self.app.app_context():
+            upload = self.create()
+            self.client.upload(upload, PDF)
+
+            assert self.record({'token': upload['token'] + 'x'}) == ({}, {'pricingDocumentURL': 'file_can_be_saved'})
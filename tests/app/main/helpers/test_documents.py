@@ -0,0 +1,222 @@
+"""Test for app/main/helpers/documents.py"""
+from io import BytesIO
+import threading
+
+from boto3.exceptions import S3UploadFailedError
+from dmtestutils.fixtures import valid_pdf_bytes
+from freezegun import freeze_time
+import mock
+import pytest
+from redis import RedisError
+from werkzeug.datastructures import FileStorage
+
+from app.main.helpers.documents import upload_declaration_documents, upload_service_documents
+
+from ...helpers import BaseApplicationTest
+
+
+class TestUploadServiceDocuments(BaseApplicationTest):
+    service = {'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 5678}
+
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.uploader = mock.Mock(bucket_name='submissions-bucket')
+        self.upload_fileobj = self.s3_client.upload_fileobj
+
+        self.section = mock.Mock()
+        self.section.get_question_ids.return_value = ['serviceDefinitionDocumentURL', 'pricingDocumentURL']
+
+    def upload(self, request_files, **kwargs):
+        with self.app.test_request_context('/'):
+            return upload_service_documents(
+                self.uploader, 'submissions', 'http://localhost/suppliers/assets/', self.service,
+                request_files, self.section, **kwargs
+            )
+
+    def pdf(self):
+        return FileStorage(BytesIO(valid_pdf_bytes), filename='document.pdf')
+
+    def test_documents_are_streamed_to_s3(self):
+        document = self.pdf()
+        document.stream.read()
+
+        with freeze_time('2020-01-02 03:04:05'):
+            documents, errors = self.upload({'pricingDocumentURL': document}, public=False)
+
+        path = 'g-cloud-12/submissions/1234/5678-pricing-document-2020-01-02-0304.pdf'
+        assert documents == {'pricingDocumentURL': 'http://localhost/suppliers/assets/' + path}
+        assert errors == {}
+        assert self.upload_fileobj.call_args_list == [mock.call(
+            document.stream,
+            'submissions-bucket',
+            path,
+            ExtraArgs={
+                'ACL': 'bucket-owner-full-control',
+                'ContentType': 'application/pdf',
+                'Metadata': {'timestamp': '2020-01-02T03:04:05.000000Z'},
+            },
+            Config=mock.ANY,
+        )]
+        # from the start of the file, however much of it has already been read
+        assert document.stream.tell() == 0
+
+    def test_documents_are_uploaded_at_the_same_time(self):
+        barrier = threading.Barrier(2, timeout=5)
+        # would time out waiting at the barrier if the documents were uploaded one after another
+        self.upload_fileobj.side_effect = lambda *args, **kwargs: barrier.wait()
+
+        documents, errors = self.upload({'serviceDefinitionDocumentURL': self.pdf(), 'pricingDocumentURL': self.pdf()})
+
+        assert set(documents) == {'serviceDefinitionDocumentURL', 'pricingDocumentURL'}
+        assert errors == {}
+
+    def test_invalid_documents_are_not_uploaded(self):
+        documents, errors = self.upload({
+            'serviceDefinitionDocumentURL': self.pdf(),
+            'pricingDocumentURL': FileStorage(BytesIO(b'doc'), filename='document.doc'),
+        })
+
+        assert documents is None
+        assert errors == {'pricingDocumentURL': 'file_is_open_document_format'}
+        assert self.upload_fileobj.called is False
+
+    def test_empty_and_unknown_documents_are_ignored(self):
+        assert self.upload({
+            'serviceDefinitionDocumentURL': FileStorage(BytesIO(b''), filename='document.pdf'),
+            'unknownDocumentURL': self.pdf(),
+        }) == ({}, {})
+        assert self.upload_fileobj.called is False
+
+    def test_documents_that_fail_to_upload_are_an_error(self):
+        def upload_fileobj(stream, bucket_name, path, **kwargs):
+            if 'service-definition-document' in path:
+                raise S3UploadFailedError('Access Denied')
+        self.upload_fileobj.side_effect = upload_fileobj
+
+        documents, errors = self.upload({'serviceDefinitionDocumentURL': self.pdf(), 'pricingDocumentURL': self.pdf()})
+
+        assert errors == {'serviceDefinitionDocumentURL': 'file_can_be_saved'}
+
+    def test_unexpected_upload_type(self):
+        with pytest.raises(ValueError):
+            upload_service_documents(self.uploader, 'agreements', 'http://asset-host/', self.service, {}, self.section)
+
+    def test_declaration_documents_are_named_without_a_service_id(self):
+        self.section.get_question_ids.return_value = ['modernSlaveryStatement']
+
+        with freeze_time('2020-01-02 03:04:05'):
+            with self.app.test_request_context('/'):
+                documents, errors = upload_declaration_documents(
+                    self.uploader, 'documents', 'http://asset-host/', {'modernSlaveryStatement': self.pdf()},
+                    self.section, 'g-cloud-12', 1234,
+                )
+
+        assert documents == {
+            'modernSlaveryStatement': 'http://asset-host/g-cloud-12/documents/1234/modern-slavery-statement-2020-01-02-0304.pdf'  # noqa
+        }
+        assert self.upload_fileobj.call_args[1]['ExtraArgs']['ACL'] == 'public-read'
+
+
+class TestUploadServiceDocumentsDeduplication(BaseApplicationTest):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.uploader = mock.Mock(bucket_name='submissions-bucket')
+        self.uploader.path_exists.return_value = True
+        self.client = self.s3_client
+
+        self.cache = mock.Mock()
+        self.stored = {}
+        self.cache.get.side_effect = self.stored.get
+        self.cache.set.side_effect = lambda key, value, ex: self.stored.__setitem__(key, value.encode())
+        self.app.config['SESSION_REDIS'] = self.cache
+
+        self.section = mock.Mock()
+        self.section.get_question_ids.return_value = ['pricingDocumentURL']
+
+    def upload(self, service, contents=valid_pdf_bytes):
+        with freeze_time('2020-01-02 03:04:05'):
+            with self.app.test_request_context('/'):
+                return upload_service_documents(
+                    self.uploader, 'submissions', 'http://localhost/suppliers/assets/', service,
+                    {'pricingDocumentURL': FileStorage(BytesIO(contents), filename='document.pdf')}, self.section,
+                    public=False,
+                )
+
+    def test_documents_already_uploaded_for_the_framework_are_copied_to_their_own_path(self):
+        first, _ = self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 1})
+        second, errors = self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 2})
+
+        path = 'g-cloud-12/submissions/1234/2-pricing-document-2020-01-02-0304.pdf'
+        assert first == {
+            'pricingDocumentURL':
+                'http://localhost/suppliers/assets/g-cloud-12/submissions/1234/1-pricing-document-2020-01-02-0304.pdf',
+        }
+        assert second == {'pricingDocumentURL': 'http://localhost/suppliers/assets/' + path}
+        assert errors == {}
+        assert len(self.client.upload_fileobj.call_args_list) == 1
+        assert self.uploader.path_exists.call_args_list == [
+            mock.call('g-cloud-12/submissions/1234/1-pricing-document-2020-01-02-0304.pdf'),
+        ]
+        assert [c[1]['CopySource']['Key'] for c in self.client.copy_object.call_args_list] == [
+            'g-cloud-12/submissions/1234/1-pricing-document-2020-01-02-0304.pdf',
+        ]
+        assert [c[1]['Key'] for c in self.client.copy_object.call_args_list] == [path]
+
+    def test_documents_already_at_their_path_are_not_saved_again(self):
+        service = {'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 1}
+        first, _ = self.upload(service)
+        second, errors = self.upload(service)
+
+        assert second == first
+        assert errors == {}
+        assert len(self.client.upload_fileobj.call_args_list) == 1
+        assert self.client.copy_object.called is False
+
+    def test_documents_uploaded_for_another_framework_are_copied(self):
+        self.upload({'frameworkSlug': 'g-cloud-11', 'supplierId': 1234, 'id': 1})
+        documents, errors = self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 2})
+
+        path = 'g-cloud-12/submissions/1234/2-pricing-document-2020-01-02-0304.pdf'
+        assert documents == {'pricingDocumentURL': 'http://localhost/suppliers/assets/' + path}
+        assert len(self.client.upload_fileobj.call_args_list) == 1
+        assert self.client.copy_object.call_args_list == [mock.call(
+            CopySource={
+                'Bucket': 'submissions-bucket',
+                'Key': 'g-cloud-11/submissions/1234/1-pricing-document-2020-01-02-0304.pdf',
+            },
+            Bucket='submissions-bucket',
+            Key=path,
+            ACL='bucket-owner-full-control',
+            ContentType='application/pdf',
+            Metadata={'timestamp': '2020-01-02T03:04:05.000000Z'},
+            MetadataDirective='REPLACE',
+        )]
+
+    @pytest.mark.parametrize('service, contents', (
+        ({'frameworkSlug': 'g-cloud-12', 'supplierId': 5678, 'id': 2}, valid_pdf_bytes),
+        ({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 2}, valid_pdf_bytes + b'\n'),
+    ))
+    def test_other_suppliers_and_other_documents_are_uploaded(self, service, contents):
+        self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 1})
+        self.upload(service, contents)
+
+        assert len(self.client.upload_fileobj.call_args_list) == 2
+
+    def test_documents_that_have_since_been_removed_are_uploaded_again(self):
+        self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 1})
+        self.uploader.path_exists.return_value = False
+        documents, _ = self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 2})
+
+        assert documents == {
+            'pricingDocumentURL':
+                'http://localhost/suppliers/assets/g-cloud-12/submissions/1234/2-pricing-document-2020-01-02-0304.pdf',
+        }
+        assert len(self.client.upload_fileobj.call_args_list) == 2
+
+    def test_documents_are_uploaded_if_redis_is_unavailable(self):
+        self.cache.get.side_effect = self.cache.set.side_effect = RedisError('connection refused')
+
+        documents, errors = self.upload({'frameworkSlug': 'g-cloud-12', 'supplierId': 1234, 'id': 1})
+
+        assert errors == {}
+        assert len(self.client.upload_fileobj.call_args_list) == 1
@@ -15,7 +15,8 @@ from app.main.helpers.frameworks import (
     check_agreement_is_related_to_supplier_framework_or_abort, get_framework_for_reuse, get_statuses_for_lot,
     return_supplier_framework_info_if_on_framework_or_abort, order_frameworks_for_reuse,
     get_frameworks_closed_and_open_for_applications, get_supplier_registered_name_from_declaration,
-    get_framework_or_500, EnsureApplicationCompanyDetailsHaveBeenConfirmed, return_404_if_applications_closed
+    get_framework_or_500, EnsureApplicationCompanyDetailsHaveBeenConfirmed, return_404_if_applications_closed,
+    count_drafts_by_lot, get_completed_lots,
 )
 
 from ...helpers import BaseApplicationTest
@@ -636,6 +637,37 @@ def test_get_supplier_registered_name_from_declaration(name_of_org, supplier_reg
     assert get_supplier_registered_name_from_declaration(declaration) == expected_result
 
 
+def test_count_drafts_by_lot():
+    drafts = [{'lotSlug': 'cloud-hosting'}, {'lotSlug': 'cloud-support'}, {'lotSlug': 'cloud-hosting'}]
+
+    counts = count_drafts_by_lot(iter(drafts))
+
+    assert counts['cloud-hosting'] == 2
+    assert counts['cloud-support'] == 1
+    assert counts['cloud-software'] == 0
+
+
+def test_get_completed_lots_only_lists_drafts_once():
+    data_api_client = mock.Mock(spec=DataAPIClient)
+    data_api_client.find_draft_services_iter.return_value = iter([
+        {'lotSlug': 'cloud-hosting', 'status': 'submitted'},
+        {'lotSlug': 'cloud-software', 'status': 'not-submitted'},
+        {'lotSlug': 'cloud-support', 'status': 'failed'},
+        {'lotSlug': 'cloud-support', 'status': 'submitted'},
+    ])
+    lots = [
+        {'slug': 'cloud-hosting', 'name': 'Cloud hosting'},
+        {'slug': 'cloud-software', 'name': 'Cloud software'},
+        {'slug': 'cloud-support', 'name': 'Cloud support'},
+    ]
+
+    assert get_completed_lots(data_api_client, lots, 'g-cloud-12', 1234) == [
+        'Lot 1: Cloud hosting', 'Lot 3: Cloud support',
+    ]
+    data_api_client.find_draft_services_iter.assert_called_once_with(1234, framework='g-cloud-12')
+    assert data_api_client.find_draft_services_by_framework.called is False
+
+
 class CustomAbortException(Exception):
     """Custom error for testing abort"""
     pass
@@ -0,0 +1,27 @@
+"""Test for app/main/helpers/s3_client.py"""
+import mock
+
+from app.main.helpers.s3_client import get_s3_client
+
+from ...helpers import BaseApplicationTest
+
+
+class TestGetS3Client(BaseApplicationTest):
+    def test_one_client_is_shared_by_the_app(self):
+        with self.app.app_context():
+            assert get_s3_client() is get_s3_client() is self.s3_client
+
+        assert self.boto3.client.call_args_list == [
+            mock.call('s3', region_name='eu-west-1', endpoint_url=None),
+        ]
+
+    def test_the_local_endpoint_is_used_in_development(self):
+        self.app.env = 'development'
+        self.app.config['DM_S3_ENDPOINT_URL'] = 'http://localhost:4566'
+
+        with self.app.app_context():
+            get_s3_client()
+
+        assert self.boto3.client.call_args_list == [
+            mock.call('s3', region_name='eu-west-1', endpoint_url='http://localhost:4566'),
+        ]
@@ -1,9 +1,18 @@
+from flask import g
 import mock
 import pytest
 
+from dmapiclient.base import BaseAPIClient
 from dmtestutils.api_model_stubs import SupplierFrameworkStub
+from redis import RedisError
 
-from app.main.helpers.services import copy_service_from_previous_framework
+from app.api_client import RequestCachedDataAPIClient
+from app.main.helpers.services import (
+    add_unanswered_counts_to_drafts, copy_service_from_previous_framework, count_drafts_by_lot_and_status,
+    get_draft_counts,
+)
+
+from ...helpers import BaseApplicationTest
 
 
 class CustomAbortException(Exception):
@@ -138,3 +147,116 @@ class TestCopyServiceFromPreviousFramework():
             )
 
         self.assert_404_and_no_copy(assertion_error='Service being copied must belong to the current users supplier')
+
+
+@mock.patch('app.main.helpers.services.current_user')
+class TestDraftCounts:
+    drafts = [
+        {'lotSlug': 'cloud-hosting', 'status': 'not-submitted', 'serviceName': 'One'},
+        {'lotSlug': 'cloud-hosting', 'status': 'submitted', 'serviceName': 'Two'},
+        {'lotSlug': 'cloud-hosting', 'status': 'not-submitted', 'serviceName': 'Three'},
+        {'lotSlug': 'cloud-support', 'status': 'failed', 'serviceName': 'Four'},
+    ]
+
+    def api_client(self):
+        api_client_mock = mock.Mock()
+        api_client_mock.find_draft_services_iter.return_value = iter(self.drafts)
+        return api_client_mock
+
+    def test_count_drafts_by_lot_and_status(self, current_user):
+        current_user.supplier_id = 1234
+        api_client_mock = self.api_client()
+
+        assert count_drafts_by_lot_and_status(api_client_mock, 'g-cloud-12') == {
+            ('cloud-hosting', 'not-submitted'): 2,
+            ('cloud-hosting', 'submitted'): 1,
+            ('cloud-support', 'failed'): 1,
+        }
+        assert api_client_mock.find_draft_services_iter.call_args_list == [mock.call(1234, framework='g-cloud-12')]
+
+    def test_count_drafts_for_a_given_supplier(self, current_user):
+        current_user.supplier_id = 1234
+        api_client_mock = self.api_client()
+
+        count_drafts_by_lot_and_status(api_client_mock, 'g-cloud-12', supplier_id=5678)
+
+        assert api_client_mock.find_draft_services_iter.call_args_list == [mock.call(5678, framework='g-cloud-12')]
+
+    def test_get_draft_counts(self, current_user):
+        draft_counts, complete_counts = get_draft_counts(self.api_client(), 'g-cloud-12')
+
+        assert draft_counts == {'cloud-hosting': 2}
+        assert complete_counts == {'cloud-hosting': 1, 'cloud-support': 1}
+
+
+class TestDraftCountsWithTheRequestCache(BaseApplicationTest):
+    pages = {
+        '/frameworks/g-cloud-12': {'frameworks': {'slug': 'g-cloud-12'}},
+        '/draft-services': {
+            'services': TestDraftCounts.drafts[:2], 'links': {'next': 'http://api/draft-services?page=2'},
+        },
+        'http://api/draft-services?page=2': {'services': TestDraftCounts.drafts[2:], 'links': {}},
+    }
+
+    def test_draft_pages_are_not_kept_for_the_rest_of_the_request(self):
+        api_client = RequestCachedDataAPIClient(base_url='http://api', auth_token='token')
+
+        with mock.patch.object(
+            BaseAPIClient, '_request', autospec=True, side_effect=lambda client, method, url, **kwargs: self.pages[url],
+        ):
+            with self.app.test_request_context('/'):
+                api_client.get_framework('g-cloud-12')
+                assert sum(count_drafts_by_lot_and_status(api_client, 'g-cloud-12', supplier_id=1234).values()) == 4
+
+                assert list(g.data_api_cache) == ['/frameworks/g-cloud-12']
+
+
+@mock.patch('app.main.helpers.services.count_unanswered_questions', return_value=(3, 1))
+class TestAddUnansweredCountsToDrafts(BaseApplicationTest):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.redis = mock.Mock()
+        self.app.config['SESSION_REDIS'] = self.redis
+        self.sections = mock.Mock()
+
+    def drafts(self):
+        return [
+            {'id': 1, 'updatedAt': '2020-01-01T00:00:00.000000Z'},
+            {'id': 2, 'updatedAt': '2020-01-02T00:00:00.000000Z'},
+        ]
+
+    def test_counts_are_cached_by_draft_id_and_updated_at(self, count_unanswered_questions):
+        self.redis.mget.return_value = [None, None]
+        drafts = self.drafts()
+
+        with self.app.app_context():
+            add_unanswered_counts_to_drafts('g-cloud-12', self.sections, drafts)
+            version = self.app.config['VERSION']
+
+        assert [(draft['unanswered_required'], draft['unanswered_optional']) for draft in drafts] == [(3, 1), (3, 1)]
+        assert self.redis.pipeline.return_value.set.call_args_list == [
+            mock.call(f'unanswered-counts:{version}:g-cloud-12:1:2020-01-01T00:00:00.000000Z', '3,1', ex=604800),
+            mock.call(f'unanswered-counts:{version}:g-cloud-12:2:2020-01-02T00:00:00.000000Z', '3,1', ex=604800),
+        ]
+
+    def test_only_drafts_without_cached_counts_are_summarised(self, count_unanswered_questions):
+        self.redis.mget.return_value = [b'0,2', None]
+        drafts = self.drafts()
+
+        with self.app.app_context():
+            add_unanswered_counts_to_drafts('g-cloud-12', self.sections, drafts)
+
+        assert self.sections.summary.call_args_list == [mock.call(drafts[1], inplace_allowed=True)]
+        assert (drafts[0]['unanswered_required'], drafts[0]['unanswered_optional']) == (0, 2)
+        assert (drafts[1]['unanswered_required'], drafts[1]['unanswered_optional']) == (3, 1)
+        assert len(self.redis.pipeline.return_value.set.call_args_list) == 1
+
+    def test_counts_are_still_added_if_redis_is_unavailable(self, count_unanswered_questions):
+        self.redis.mget.side_effect = RedisError('Connection refused')
+        self.redis.pipeline.side_effect = RedisError('Connection refused')
+        drafts = self.drafts()
+
+        with self.app.app_context():
+            add_unanswered_counts_to_drafts('g-cloud-12', self.sections, drafts)
+
+        assert [(draft['unanswered_required'], draft['unanswered_optional']) for draft in drafts] == [(3, 1), (3, 1)]
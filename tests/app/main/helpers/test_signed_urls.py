@@ -0,0 +1,65 @@
+"""Test for app/main/helpers/signed_urls.py"""
+import mock
+
+from app.main.helpers.signed_urls import SignedURLCache, get_signed_document_url
+
+from ...helpers import BaseApplicationTest
+
+
+@mock.patch('app.main.helpers.signed_urls.time')
+@mock.patch('dmutils.s3.S3')
+class TestSignedURLCache:
+    def setup_method(self, method):
+        self.cache = SignedURLCache(expires_in=30, margin=5, size=2)
+
+    def test_urls_are_rewritten_to_the_base_url(self, s3, time):
+        s3.return_value.get_signed_url.return_value = 'https://bucket.s3.amazonaws.com/path?Signature=1'
+        time.monotonic.return_value = 0
+
+        assert self.cache.get('bucket', 'path', 'https://assets.example') == 'https://assets.example/path?Signature=1'
+        assert self.cache.get('other-bucket', 'path', None) == 'https://bucket.s3.amazonaws.com/path?Signature=1'
+        assert s3.return_value.get_signed_url.call_args_list == [mock.call('path', expires_in=30)] * 2
+
+    def test_urls_are_cached_until_shortly_before_they_expire(self, s3, time):
+        s3.return_value.get_signed_url.side_effect = [
+            'https://bucket/path?Signature=1', 'https://bucket/path?Signature=2',
+        ]
+        time.monotonic.return_value = 0
+
+        assert self.cache.get('bucket', 'path', None) == 'https://bucket/path?Signature=1'
+        time.monotonic.return_value = 24
+        assert self.cache.get('bucket', 'path', None) == 'https://bucket/path?Signature=1'
+        time.monotonic.return_value = 25
+        assert self.cache.get('bucket', 'path', None) == 'https://bucket/path?Signature=2'
+
+        assert s3.call_args_list == [mock.call('bucket')] * 2
+
+    def test_missing_documents_are_not_cached(self, s3, time):
+        s3.return_value.get_signed_url.return_value = None
+        time.monotonic.return_value = 0
+
+        assert self.cache.get('bucket', 'path', None) is None
+        assert self.cache.get('bucket', 'path', None) is None
+        assert len(s3.return_value.get_signed_url.call_args_list) == 2
+
+    def test_least_recently_signed_urls_are_dropped(self, s3, time):
+        s3.return_value.get_signed_url.side_effect = lambda path, expires_in: 'https://bucket/' + path
+        time.monotonic.return_value = 0
+
+        for path in ('a', 'b', 'c'):
+            self.cache.get('bucket', path, None)
+
+        assert list(self.cache._urls) == [('bucket', 'b', None), ('bucket', 'c', None)]
+
+
+@mock.patch('dmutils.s3.S3')
+class TestGetSignedDocumentUrl(BaseApplicationTest):
+    def test_get_signed_document_url_uses_the_assets_url_and_the_app_cache(self, s3):
+        s3.return_value.get_signed_url.return_value = 'https://bucket/path?Signature=1'
+        self.app.config['DM_ASSETS_URL'] = 'https://assets.example'
+
+        with self.app.app_context():
+            assert get_signed_document_url('bucket', 'path') == 'https://assets.example/path?Signature=1'
+            assert get_signed_document_url('bucket', 'path') == 'https://assets.example/path?Signature=1'
+
+        assert s3.call_args_list == [mock.call('bucket')]
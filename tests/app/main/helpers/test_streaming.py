@@ -0,0 +1,76 @@
+"""Test for app/main/helpers/streaming.py"""
+import logging
+
+from flask import Response, flash, session
+import jinja2
+import mock
+
+from app.main.helpers.streaming import stream_template
+
+from ...helpers import BaseApplicationTest
+
+
+class TestStreamTemplate(BaseApplicationTest):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.app.jinja_loader = jinja2.DictLoader({
+            'listing.html': (
+                '{% for message in get_flashed_messages() %}{{ message }} {% endfor %}'
+                '{% for item in items %}<li>{{ item }}</li>{% endfor %}'
+                '{{ csrf_token() }}'
+            ),
+        })
+
+    def test_templates_are_rendered_as_they_are_sent(self):
+        rendered = []
+
+        def items():
+            for item in range(200):
+                rendered.append(item)
+                yield item
+
+        with self.app.test_request_context('/'):
+            response = Response(stream_template('listing.html', items=items()))
+
+            assert response.is_streamed
+            assert rendered == []
+
+            first_chunk = next(response.response)
+            assert first_chunk.startswith('<li>0</li>')
+            assert len(rendered) < 200
+
+            assert '<li>199</li>' in ''.join(response.response)
+
+    def test_the_session_is_updated_before_the_template_is_sent(self):
+        with self.app.test_request_context('/'):
+            flash('Your service was removed')
+            stream = stream_template('listing.html', items=[])
+
+            # as the session cookie is set before any of the template is rendered
+            assert '_flashes' not in session
+            assert 'csrf_token' in session
+
+            assert ''.join(stream).startswith('Your service was removed ')
+
+    @mock.patch('app.main.helpers.streaming.logged_duration')
+    def test_the_time_spent_is_logged_once_the_template_has_been_sent(self, logged_duration):
+        with self.app.test_request_context('/'):
+            stream = stream_template('listing.html', items=range(200))
+            assert logged_duration.return_value.__exit__.call_args_list == []
+
+            next(stream)
+            assert logged_duration.return_value.__enter__.call_args_list == [mock.call()]
+            assert logged_duration.return_value.__exit__.call_args_list == []
+
+            ''.join(stream)
+
+        assert logged_duration.call_args[1]['message'] == "Spent {duration_real}s in stream_template"
+        assert len(logged_duration.return_value.__exit__.call_args_list) == 1
+
+    @mock.patch('app.main.helpers.streaming.SLOW_RENDER_THRESHOLD', -1)
+    def test_slow_streams_are_logged(self):
+        with self.app.test_request_context('/'):
+            with mock.patch.object(logging.getLogger('dmutils.timing'), 'log') as log:
+                ''.join(stream_template('listing.html', items=[]))
+
+        assert [call[0][1] for call in log.call_args_list] == ["Spent {duration_real}s in stream_template"]
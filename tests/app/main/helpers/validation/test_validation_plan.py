@@ -0,0 +1,86 @@
+from dmcontent.content_loader import ContentManifest
+
+from app.main.helpers.validation import (
+    DOSValidator, Rule, SharedValidator, answer_in, answer_is, get_validation_plan
+)
+from app.main import content_loader
+
+
+def test_plan_has_the_questions_and_limits_of_the_manifest():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+
+    plan = get_validation_plan(SharedValidator, content)
+
+    assert plan.fields == [
+        question_id for section in content for question_id in section.get_question_ids()
+    ]
+    assert all(plan.questions[question_id] is content.get_question(question_id) for question_id in plan.fields)
+    assert plan.text_fields['mitigatingFactors'] == 500
+    assert 'mitigatingFactors' not in plan.required_fields
+    assert [field for field, _ in plan.number_string_patterns] == ['dunsNumber']
+
+
+def test_plan_is_shared_by_manifests_with_the_same_questions():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+    plan = get_validation_plan(SharedValidator, content)
+
+    assert get_validation_plan(SharedValidator, ContentManifest(content.sections)) is plan
+    assert get_validation_plan(DOSValidator, content) is not plan
+    assert get_validation_plan(
+        SharedValidator, content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+    ) is not plan
+
+
+def test_validators_use_the_plan():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+
+    assert SharedValidator(content, {}).plan is get_validation_plan(SharedValidator, content)
+
+
+def test_page_errors_only_validate_the_questions_on_the_page():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+    section = content.sections[0]
+    validator = DOSValidator(content, {})
+
+    errors = validator.get_error_messages_for_page(section)
+
+    assert list(errors) == [
+        question_id for question_id in section.get_question_ids() if question_id in validator.get_required_fields()
+    ]
+    assert validator.errors(section.get_question_ids()) == {question_id: 'answer_required' for question_id in errors}
+
+
+def test_errors_by_section_are_the_same_as_page_errors():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+    validator = DOSValidator(content, {'mitigatingFactors': 'word ' * 501, 'dunsNumber': 'abc'})
+
+    errors_by_section = validator.get_error_messages_by_section(content.sections)
+
+    assert list(errors_by_section) == [section.slug for section in content.sections]
+    for section in content.sections:
+        assert errors_by_section[section.slug] == validator.get_error_messages_for_page(section)
+
+
+class RulesValidator(SharedValidator):
+    required_when = [Rule('tradingStatusOther', answer_in('tradingStatus', ['other (please specify)']))]
+    not_required_when = [Rule('dunsNumber', answer_is('establishedInTheUK', False))]
+    conflicting_answers = [Rule(['bankrupt', 'taxEvasion'], answer_is('bankrupt', True), answer_is('taxEvasion', True))]
+
+
+def test_rules_decide_which_fields_are_required():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+    validator = RulesValidator(content, {'tradingStatus': 'other (please specify)', 'establishedInTheUK': False})
+
+    required_fields = validator.get_required_fields()
+
+    assert 'tradingStatusOther' in required_fields
+    assert 'dunsNumber' not in required_fields
+    assert 'appropriateTradeRegisters' not in required_fields
+
+
+def test_rules_for_conflicting_answers():
+    content = content_loader.get_builder('digital-outcomes-and-specialists-4', 'declaration')
+
+    errors = RulesValidator(content, {'bankrupt': True, 'taxEvasion': True}).errors()
+
+    assert errors['bankrupt'] == errors['taxEvasion'] == 'dependent_question_error'
@@ -0,0 +1,232 @@
+from threading import Event, Thread
+
+import mock
+import pytest
+
+from dmcontent.content_loader import ContentNotFoundError
+
+from app.main import content_loader, get_content_loader, _make_content_loader, CONTENT_PATH
+from app.main.content_loader import SharedContentLoader, HOT, WARM, COLD, content_stamp, get_context_keys
+
+
+class TestSharedContentLoader:
+    def test_all_threads_share_the_same_loader(self):
+        loaders = []
+        threads = [Thread(target=lambda: loaders.append(get_content_loader())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(loaders) == 4
+        assert all(loader is get_content_loader() for loader in loaders)
+        assert isinstance(get_content_loader(), SharedContentLoader)
+
+    def test_filtering_a_manifest_in_place_does_not_affect_other_manifests(self):
+        full_manifest = content_loader.get_manifest('g-cloud-12', 'edit_submission')
+        cloud_hosting = content_loader.get_manifest('g-cloud-12', 'edit_submission').filter(
+            {'lot': 'cloud-hosting'}, inplace_allowed=True
+        )
+        cloud_support = content_loader.get_manifest('g-cloud-12', 'edit_submission').filter(
+            {'lot': 'cloud-support'}, inplace_allowed=True
+        )
+
+        def question_count(manifest):
+            return sum(len(section.get_question_ids()) for section in manifest)
+
+        assert cloud_hosting is not cloud_support
+        assert question_count(full_manifest) == question_count(
+            content_loader.get_manifest('g-cloud-12', 'edit_submission')
+        )
+        assert question_count(full_manifest) > question_count(cloud_hosting)
+        assert question_count(full_manifest) > question_count(cloud_support)
+
+    def test_get_builder_is_the_shared_get_manifest(self):
+        assert content_loader.get_builder('g-cloud-12', 'declaration').get_question('dunsNumber') is not None
+
+    def test_unknown_manifest_raises_content_not_found(self):
+        with pytest.raises(ContentNotFoundError):
+            content_loader.get_manifest('g-cloud-12', 'not-a-manifest')
+
+
+class TestFilteredManifests:
+    def question_ids(self, manifest):
+        return [question_id for section in manifest for question_id in section.get_question_ids()]
+
+    @pytest.mark.parametrize('lot', ('cloud-hosting', 'cloud-software', 'cloud-support'))
+    def test_filtered_manifest_matches_filtering_directly(self, lot):
+        draft = {'lot': lot, 'serviceName': 'My service', 'id': 1234}
+
+        assert self.question_ids(content_loader.get_filtered_manifest('g-cloud-12', 'edit_submission', draft)) == \
+            self.question_ids(content_loader.get_manifest('g-cloud-12', 'edit_submission').filter(draft))
+
+    def test_drafts_in_the_same_lot_share_a_filtered_manifest(self):
+        loader = SharedContentLoader(CONTENT_PATH)
+        loader.load_manifest('g-cloud-12', 'services', 'edit_submission')
+
+        first = loader.get_filtered_manifest('g-cloud-12', 'edit_submission', {'lot': 'cloud-hosting', 'id': 1})
+        second = loader.get_filtered_manifest('g-cloud-12', 'edit_submission', {'lot': 'cloud-hosting', 'id': 2})
+        loader.get_filtered_manifest('g-cloud-12', 'edit_submission', {'lot': 'cloud-support', 'id': 3})
+
+        assert 'id' not in loader._context_keys[('g-cloud-12', 'edit_submission')]
+        assert len(loader._filtered_manifests[('g-cloud-12', 'edit_submission')]) == 2
+        assert first is not second
+        assert first.sections[0].questions[0] is second.sections[0].questions[0]
+
+    def test_summarising_a_filtered_manifest_in_place_does_not_change_the_cached_one(self):
+        draft = {'lot': 'cloud-hosting', 'serviceName': 'My service'}
+
+        summary = content_loader.get_filtered_manifest('g-cloud-12', 'edit_submission', draft).summary(
+            draft, inplace_allowed=True
+        )
+        assert summary.get_question('serviceName').value == 'My service'
+
+        unsummarised = content_loader.get_filtered_manifest('g-cloud-12', 'edit_submission', draft)
+        assert not hasattr(unsummarised.get_question('serviceName'), 'value')
+
+    def test_only_the_questions_of_cached_filtered_manifests_are_shared(self):
+        draft = {'lot': 'cloud-hosting', 'serviceName': 'My service'}
+        filtered = content_loader.get_filtered_manifest('g-cloud-12', 'edit_submission', draft)
+
+        assert content_loader.is_shared(filtered.sections)
+        assert content_loader.is_shared(filtered.sections[:1])
+        assert not content_loader.is_shared(filtered.summary(draft).sections)
+        assert not content_loader.is_shared(content_loader.get_manifest('g-cloud-12', 'edit_submission').filter(draft))
+
+    def test_dynamic_lists_are_not_cached(self):
+        assert get_context_keys([{'questions': [{'id': 'q', 'type': 'dynamic_list'}]}]) is None
+
+
+class TestContentTiers:
+    manifests = {'edit_service': 'services', 'declaration': 'declaration'}
+
+    def test_hot_manifests_are_loaded_immediately(self):
+        loader = SharedContentLoader(CONTENT_PATH)
+        loader.load_manifests('g-cloud-7', self.manifests, tier=HOT)
+
+        assert isinstance(loader._content['g-cloud-7']['declaration'], list)
+
+    def test_warm_manifests_are_loaded_on_first_use(self):
+        loader = SharedContentLoader(CONTENT_PATH)
+        loader.load_manifests('g-cloud-7', self.manifests, tier=WARM)
+
+        assert 'declaration' not in loader._content['g-cloud-7']._loaded
+        assert loader.get_manifest('g-cloud-7', 'declaration').get_question('SQ1-1a') is not None
+        assert 'declaration' in loader._content['g-cloud-7']._loaded
+        assert 'edit_service' not in loader._content['g-cloud-7']._loaded
+
+    @pytest.mark.parametrize('tier', (WARM, COLD))
+    def test_loading_a_manifest_does_not_hold_up_other_content(self, tier):
+        loader = SharedContentLoader(CONTENT_PATH)
+        loader.load_manifests('g-cloud-7', self.manifests, tier=tier)
+        loader.load_manifests('g-cloud-9', {'declaration': 'declaration'}, tier=HOT)
+
+        loading, finish_loading = Event(), Event()
+        generate_manifest = loader.generate_manifest
+
+        def slow_generate_manifest(framework_slug, question_set, manifest):
+            if manifest == 'declaration':
+                loading.set()
+                finish_loading.wait(5)
+            return generate_manifest(framework_slug, question_set, manifest)
+
+        with mock.patch.object(loader, 'generate_manifest', side_effect=slow_generate_manifest) as patched:
+            declarations = []
+            threads = [
+                Thread(target=lambda: declarations.append(loader.get_manifest('g-cloud-7', 'declaration')))
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            assert loading.wait(5)
+
+            # while the declaration is loading, the rest of the content can still be used
+            assert loader.get_manifest('g-cloud-9', 'declaration').get_question('SQ1-1a') is not None
+            assert loader.get_manifest('g-cloud-7', 'edit_service') is not None
+
+            finish_loading.set()
+            for thread in threads:
+                thread.join()
+
+        assert len(declarations) == 2
+        # and it was only loaded once
+        assert [c[0] for c in patched.call_args_list] == [
+            ('g-cloud-7', 'declaration', 'declaration'), ('g-cloud-7', 'services', 'edit_service'),
+        ]
+
+    def test_cold_manifests_are_evicted_when_over_budget(self):
+        loader = SharedContentLoader(CONTENT_PATH, cold_content_budget=1)
+        loader.load_manifests('g-cloud-7', self.manifests, tier=COLD)
+
+        assert list(loader._cold_manifests) == []
+
+        loader.get_manifest('g-cloud-7', 'declaration')
+        assert list(loader._cold_manifests) == [('g-cloud-7', 'declaration')]
+
+        loader.get_manifest('g-cloud-7', 'edit_service')
+        assert list(loader._cold_manifests) == [('g-cloud-7', 'edit_service')]
+        assert 'g-cloud-7' not in loader._questions
+
+        # and can be loaded again when needed
+        assert loader.get_manifest('g-cloud-7', 'declaration').get_question('SQ1-1a') is not None
+
+    def test_cold_manifests_within_budget_are_kept(self):
+        loader = SharedContentLoader(CONTENT_PATH, cold_content_budget=None)
+        loader.load_manifests('g-cloud-7', self.manifests, tier=COLD)
+
+        first = loader._get_manifest_sections('g-cloud-7', 'declaration')
+        loader.get_manifest('g-cloud-7', 'edit_service')
+
+        assert loader._get_manifest_sections('g-cloud-7', 'declaration') is first
+        assert len(loader._cold_manifests) == 2
+
+    def test_unknown_tier(self):
+        with pytest.raises(ValueError):
+            SharedContentLoader(CONTENT_PATH).load_manifests('g-cloud-7', self.manifests, tier='lukewarm')
+
+
+class TestContentSnapshot:
+    def test_snapshot_restores_loaded_content(self, tmp_path):
+        snapshot_path = str(tmp_path / 'content.pickle')
+        _make_content_loader(snapshot_path=None).dump_snapshot(snapshot_path)
+
+        restored = SharedContentLoader(CONTENT_PATH)
+        assert restored.load_snapshot(snapshot_path) is True
+
+        for framework_slug, manifest in (('g-cloud-12', 'declaration'), ('g-cloud-9', 'edit_service')):
+            original_manifest = content_loader.get_manifest(framework_slug, manifest)
+            restored_manifest = restored.get_manifest(framework_slug, manifest)
+            assert [section.name for section in restored_manifest] == [section.name for section in original_manifest]
+
+        assert restored.get_message('g-cloud-12', 'urls') == content_loader.get_message('g-cloud-12', 'urls')
+        assert restored.get_metadata('g-cloud-12', 'copy_services', 'source_framework') == 'g-cloud-11'
+
+    def test_missing_snapshot_is_ignored(self, tmp_path):
+        assert SharedContentLoader(CONTENT_PATH).load_snapshot(str(tmp_path / 'nope.pickle')) is False
+
+    def test_snapshot_of_different_content_is_ignored(self, tmp_path):
+        snapshot_path = str(tmp_path / 'content.pickle')
+        _make_content_loader(snapshot_path=None).dump_snapshot(snapshot_path)
+
+        restored = SharedContentLoader(CONTENT_PATH)
+        with mock.patch('app.main.content_loader.content_stamp', return_value='something-else'):
+            assert restored.load_snapshot(snapshot_path) is False
+
+        with pytest.raises(ContentNotFoundError):
+            restored.get_manifest('g-cloud-12', 'declaration')
+
+    def test_content_stamp_is_the_frameworks_package_version(self, tmp_path):
+        (tmp_path / 'package.json').write_text('{"name": "digitalmarketplace-frameworks", "version": "18.4.1"}')
+        (tmp_path / 'frameworks').mkdir()
+
+        with mock.patch('app.main.content_loader.content_hash') as content_hash:
+            assert content_stamp(str(tmp_path)) == 'digitalmarketplace-frameworks==18.4.1'
+
+        assert content_hash.called is False
+
+    def test_content_is_hashed_without_a_package_version(self, tmp_path):
+        (tmp_path / 'manifest.yml').write_text('a: 1')
+        stamp = content_stamp(str(tmp_path))
+
+        (tmp_path / 'manifest.yml').write_text('a: 2')
+        assert content_stamp(str(tmp_path)) != stamp
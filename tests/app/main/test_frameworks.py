@@ -1921,7 +1921,7 @@ class TestFrameworkAgreementDocumentDownload(BaseApplicationTest):
 
         assert res.status_code == 302
         assert res.location == 'http://asset-host/path?param=value'
-        uploader.get_signed_url.assert_called_with('g-cloud-7/agreements/1234/1234-example.pdf')
+        uploader.get_signed_url.assert_called_with('g-cloud-7/agreements/1234/1234-example.pdf', expires_in=30)
 
     def test_download_document_with_asset_url(self, S3):
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework()
@@ -1937,7 +1937,7 @@ class TestFrameworkAgreementDocumentDownload(BaseApplicationTest):
 
         assert res.status_code == 302
         assert res.location == 'https://example/path?param=value'
-        uploader.get_signed_url.assert_called_with('g-cloud-7/agreements/1234/1234-example.pdf')
+        uploader.get_signed_url.assert_called_with('g-cloud-7/agreements/1234/1234-example.pdf', expires_in=30)
 
 
 @mock.patch('dmutils.s3.S3')
@@ -1953,7 +1953,20 @@ class TestFrameworkDocumentDownload(BaseApplicationTest):
 
         assert res.status_code == 302
         assert res.location == 'http://asset-host/path?param=value'
-        uploader.get_signed_url.assert_called_with('g-cloud-7/communications/example.pdf')
+        uploader.get_signed_url.assert_called_with('g-cloud-7/communications/example.pdf', expires_in=30)
+
+    @mock.patch('app.main.views.frameworks.communication_found')
+    def test_download_document_refreshes_the_communications_listing(self, communication_found, S3):
+        S3.return_value.get_signed_url.return_value = 'http://url/path?param=value'
+
+        self.login()
+
+        res = self.client.get('/suppliers/frameworks/g-cloud-7/files/updates/communications/example.pdf')
+
+        assert res.status_code == 302
+        assert communication_found.call_args_list == [
+            mock.call('g-cloud-7/communications/updates/communications/example.pdf'),
+        ]
 
     def test_download_document_returns_404_if_url_is_None(self, S3):
         uploader = mock.Mock()
@@ -3263,10 +3276,72 @@ class TestSupplierDeclaration(BaseApplicationTest, MockEnsureApplicationCompanyD
                 "email@email.com"
             )
         ]
-        s3.return_value.save.assert_called_once_with(
+        self.s3_client.upload_fileobj.assert_called_once_with(
+            mock.ANY, s3.return_value.bucket_name,
             'g-cloud-11/documents/1234/modern-slavery-statement-2017-11-12-1314.pdf',
-            mock.ANY, acl='public-read'
+            ExtraArgs={
+                'ACL': 'public-read',
+                'ContentType': 'application/pdf',
+                'Metadata': {'timestamp': '2017-11-12T13:14:15.000000Z'},
+            },
+            Config=mock.ANY,
+        )
+
+    @mock.patch('dmutils.s3.S3')
+    def test_post_valid_data_with_direct_document_upload(self, s3):
+        self.login()
+
+        self.data_api_client.get_framework.return_value = self.framework(status='open', slug="g-cloud-11")
+        self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
+            framework_slug="g-cloud-11",
+            declaration={"status": "started"}
         )
+        client = self.s3_client
+        client.generate_presigned_post.return_value = {'url': 'https://documents.s3.amazonaws.com/', 'fields': {}}
+        client.get_object.return_value = {
+            'Body': BytesIO(valid_pdf_bytes[:128]), 'ContentRange': 'bytes 0-127/{}'.format(len(valid_pdf_bytes)),
+        }
+
+        with freeze_time('2017-11-12 13:14:15'):
+            upload_res = self.client.post(
+                '/suppliers/frameworks/g-cloud-11/declaration/upload',
+                data={'question': 'modernSlaveryStatementOptional', 'filename': 'document.pdf'},
+            )
+            res = self.client.post(
+                '/suppliers/frameworks/g-cloud-11/declaration/edit/modern-slavery',
+                data={
+                    'modernSlaveryTurnover': False,
+                    'modernSlaveryReportingRequirements': None,
+                    'mitigatingFactors3': None,
+                    'modernSlaveryStatement': None,
+                    'modernSlaveryStatementOptional-upload-token': upload_res.json['token'],
+                }
+            )
+
+        assert upload_res.status_code == 200
+        assert client.generate_presigned_post.call_args_list == [mock.call(
+            None,
+            'g-cloud-11/documents/1234/modern-slavery-statement-2017-11-12-1314.pdf',
+            Fields={'acl': 'public-read', 'Content-Type': 'application/pdf'},
+            Conditions=mock.ANY,
+            ExpiresIn=600,
+        )]
+        assert res.status_code == 302
+        assert self.data_api_client.set_supplier_declaration.call_args[0][2]['modernSlaveryStatementOptional'] == (
+            'http://asset-host/g-cloud-11/documents/1234/modern-slavery-statement-2017-11-12-1314.pdf'
+        )
+        assert self.s3_client.upload_fileobj.called is False
+
+    def test_direct_upload_credentials_are_not_given_for_other_questions(self):
+        self.login()
+        self.data_api_client.get_framework.return_value = self.framework(status='open', slug="g-cloud-11")
+
+        res = self.client.post(
+            '/suppliers/frameworks/g-cloud-11/declaration/upload',
+            data={'question': 'modernSlaveryTurnover', 'filename': 'document.pdf'},
+        )
+
+        assert res.status_code == 404
 
     def test_post_valid_data_to_complete_declaration(self):
         self.login()
@@ -3411,7 +3486,7 @@ class TestSupplierDeclaration(BaseApplicationTest, MockEnsureApplicationCompanyD
             text="Your document is not in an open format.",
         )) == 1
         assert self.data_api_client.set_supplier_declaration.called is False
-        assert s3.return_value.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
 
     @mock.patch('dmutils.s3.S3')
     def test_post_declaration_answer_with_existing_document(self, s3):
@@ -3434,7 +3509,7 @@ class TestSupplierDeclaration(BaseApplicationTest, MockEnsureApplicationCompanyD
 
         assert res.status_code == 302
         assert self.data_api_client.set_supplier_declaration.called
-        assert s3.return_value.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
 
     def test_has_session_timeout_warning(self):
         self.data_api_client.get_framework.return_value = self.framework(status='open', slug="g-cloud-11")
@@ -3973,7 +4048,7 @@ class TestFrameworkChooseLotsOrServices(BaseApplicationTest, MockEnsureApplicati
         assert '/suppliers/frameworks/digital-outcomes-and-specialists/submissions/digital-specialists' in res.location
 
 
-@mock.patch('app.main.views.frameworks.count_unanswered_questions')
+@mock.patch('app.main.helpers.services.count_unanswered_questions')
 class TestFrameworkSubmissionLots(BaseApplicationTest, MockEnsureApplicationCompanyDetailsHaveBeenConfirmedMixin):
 
     def setup_method(self, method):
@@ -5054,6 +5129,13 @@ class TestSignatureLegalAuthority(BaseApplicationTest):
 class TestSignFrameworkAgreement(BaseApplicationTest):
     """Tests for app.main.views.frameworks.sign_framework_agreement"""
 
+    submitted_drafts = [
+        {'lotSlug': 'cloud-hosting', 'status': 'submitted'},
+        {'lotSlug': 'cloud-software', 'status': 'submitted'},
+        {'lotSlug': 'cloud-support', 'status': 'submitted'},
+        {'lotSlug': 'cloud-support', 'status': 'not-submitted'},
+    ]
+
     def setup_method(self, method):
         super().setup_method(method)
         self.data_api_client_patch = mock.patch('app.main.views.frameworks.data_api_client', autospec=True)
@@ -5078,9 +5160,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
             slug='g-cloud-12',
             framework_agreement_version="1",
             is_e_signature_supported=is_e_signature_supported)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
             on_framework=on_framework)
 
@@ -5103,9 +5183,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
                                                                          slug='g-cloud-12',
                                                                          framework_agreement_version="1",
                                                                          is_e_signature_supported=True)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
             on_framework=True)
         self.login()
@@ -5119,9 +5197,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
                                                                          slug='g-cloud-12',
                                                                          framework_agreement_version="1",
                                                                          is_e_signature_supported=True)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
             on_framework=True)
 
@@ -5136,9 +5212,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
         self.data_api_client.create_framework_agreement.return_value = {"agreement": {"id": 789}}
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
             on_framework=True)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_framework.return_value = self.framework(status='standstill',
                                                                          slug='g-cloud-12',
                                                                          framework_agreement_version="1",
@@ -5180,9 +5254,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
         self.data_api_client.create_framework_agreement.return_value = {"agreement": {"id": 789}}
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(
             on_framework=True)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_framework.return_value = self.framework(status='standstill',
                                                                          slug='g-cloud-12',
                                                                          framework_agreement_version="1",
@@ -5203,9 +5275,7 @@ class TestSignFrameworkAgreement(BaseApplicationTest):
                                                                          slug='g-cloud-12',
                                                                          framework_agreement_version="1",
                                                                          is_e_signature_supported=True)
-        self.data_api_client.find_draft_services_by_framework.return_value = {
-            'meta': {'total': 1}
-        }
+        self.data_api_client.find_draft_services_iter.return_value = self.submitted_drafts
         self.data_api_client.get_supplier_framework_info.return_value = self.supplier_framework(on_framework=True)
 
         self.data_api_client.get_supplier.return_value = {'suppliers': {'registeredName': 'Acme Company',
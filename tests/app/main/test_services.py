@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import copy
 import re
+import threading
+import time
 from datetime import datetime
 from functools import partial
 from io import BytesIO
@@ -186,6 +188,7 @@ class TestListServices(BaseApplicationTest):
 
         res = self.client.get('/suppliers/frameworks/g-cloud-909/services')
         assert res.status_code == 200
+        assert res.is_streamed
 
         document = html.fromstring(res.get_data(as_text=True))
         assert document.xpath(
@@ -1294,11 +1297,50 @@ class TestSupplierEditUpdateServiceSectionG9(BaseApplicationTest):
             'email@email.com',
         )
 
-        s3.return_value.save.assert_called_once_with(
+        self.s3_client.upload_fileobj.assert_called_once_with(
+            mock.ANY, s3.return_value.bucket_name,
             f"g-cloud-9/documents/1234/321-service-definition-document-2017-11-12-1314.{file_extension}",
-            mock.ANY, acl='public-read'
+            ExtraArgs={
+                'ACL': 'public-read',
+                'ContentType': mock.ANY,
+                'Metadata': {'timestamp': '2017-11-12T13:14:15.000000Z'},
+            },
+            Config=mock.ANY,
         )
 
+    def test_several_files_can_be_uploaded_at_once(self, s3):
+        self.data_api_client.get_service.return_value = self.base_service
+        self.data_api_client.get_framework.return_value = self._get_framework_response()
+        # big enough for Werkzeug to spool each file to disk
+        document_bytes = valid_pdf_bytes + b'\0' * 600000
+
+        uploaded = {}
+        service_definition_uploaded = threading.Event()
+
+        def upload_fileobj(stream, bucket_name, path, **kwargs):
+            if 'service-definition-document' in path:
+                uploaded['serviceDefinitionDocumentURL'] = stream.read()
+                service_definition_uploaded.set()
+            else:
+                # the other upload's thread has finished with the request by the time this one reads its file
+                service_definition_uploaded.wait(5)
+                time.sleep(0.2)
+                uploaded['pricingDocumentURL'] = stream.read()
+        self.s3_client.upload_fileobj.side_effect = upload_fileobj
+
+        res = self.client.post(
+            '/suppliers/frameworks/g-cloud-9/services/321/edit/documents',
+            data={
+                'serviceDefinitionDocumentURL': (BytesIO(document_bytes), 'service-definition.pdf'),
+                'pricingDocumentURL': (BytesIO(document_bytes), 'pricing.pdf'),
+            })
+
+        assert res.status_code == 302
+        assert uploaded == {'serviceDefinitionDocumentURL': document_bytes, 'pricingDocumentURL': document_bytes}
+        assert set(self.data_api_client.update_service.call_args[0][1]) == {
+            'serviceDefinitionDocumentURL', 'pricingDocumentURL',
+        }
+
     def test_S3_should_not_be_called_if_there_are_no_files(self, s3):
         self.data_api_client.get_service.return_value = self.base_service
         self.data_api_client.get_framework.return_value = self._get_framework_response()
@@ -1310,7 +1352,7 @@ class TestSupplierEditUpdateServiceSectionG9(BaseApplicationTest):
             })
 
         assert res.status_code == 302
-        assert s3.return_value.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
 
     def test_file_upload_filters_empty_and_unknown_files(self, s3):
         self.data_api_client.get_service.return_value = self.base_service
@@ -1323,7 +1365,7 @@ class TestSupplierEditUpdateServiceSectionG9(BaseApplicationTest):
             })
 
         assert res.status_code == 302
-        assert s3.return_value.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
         self.data_api_client.update_service.assert_called_once_with('321', {}, 'email@email.com')
 
     def test_upload_question_can_not_be_set_by_form_data(self, s3):
@@ -1604,8 +1646,6 @@ class TestEditDraftService(BaseApplicationTest, MockEnsureApplicationCompanyDeta
         assert self.data_api_client.update_draft_service.called is False
 
     def test_S3_should_not_be_called_if_there_are_no_files(self, s3):
-        uploader = mock.Mock()
-        s3.return_value = uploader
         self.data_api_client.get_draft_service.return_value = self.empty_draft
         res = self.client.post(
             '/suppliers/frameworks/g-cloud-7/submissions/scs/1/edit/service-description',
@@ -1614,7 +1654,7 @@ class TestEditDraftService(BaseApplicationTest, MockEnsureApplicationCompanyDeta
             })
 
         assert res.status_code == 302
-        assert uploader.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
 
     def test_editing_readonly_section_is_not_allowed(self, s3):
         self.data_api_client.get_draft_service.return_value = self.empty_draft
@@ -1703,9 +1743,15 @@ class TestEditDraftService(BaseApplicationTest, MockEnsureApplicationCompanyDeta
             page_questions=['serviceDefinitionDocumentURL']
         )
 
-        s3.return_value.save.assert_called_once_with(
+        self.s3_client.upload_fileobj.assert_called_once_with(
+            mock.ANY, s3.return_value.bucket_name,
             'g-cloud-7/submissions/1234/1-service-definition-document-2015-01-02-0304.pdf',
-            mock.ANY, acl='bucket-owner-full-control'
+            ExtraArgs={
+                'ACL': 'bucket-owner-full-control',
+                'ContentType': 'application/pdf',
+                'Metadata': {'timestamp': '2015-01-02T03:04:05.000000Z'},
+            },
+            Config=mock.ANY,
         )
 
     def test_file_upload_filters_empty_and_unknown_files(self, s3):
@@ -1724,7 +1770,7 @@ class TestEditDraftService(BaseApplicationTest, MockEnsureApplicationCompanyDeta
             page_questions=['serviceDefinitionDocumentURL']
         )
 
-        assert s3.return_value.save.called is False
+        assert self.s3_client.upload_fileobj.called is False
 
     def test_upload_question_not_accepted_as_form_data(self, s3):
         self.data_api_client.get_draft_service.return_value = self.empty_draft
@@ -1740,6 +1786,72 @@ class TestEditDraftService(BaseApplicationTest, MockEnsureApplicationCompanyDeta
             page_questions=['serviceDefinitionDocumentURL']
         )
 
+    def test_direct_upload_credentials_are_given_for_upload_questions(self, s3):
+        self.data_api_client.get_draft_service.return_value = self.empty_draft
+        self.s3_client.generate_presigned_post.return_value = {
+            'url': 'https://submissions.s3.amazonaws.com/', 'fields': {'key': 'document.pdf'},
+        }
+
+        with freeze_time('2015-01-02 03:04:05'):
+            res = self.client.post(
+                '/suppliers/frameworks/g-cloud-7/submissions/scs/1/upload',
+                data={'question': 'serviceDefinitionDocumentURL', 'filename': 'document.pdf'},
+            )
+
+        assert res.status_code == 200
+        assert res.json['url'] == 'https://submissions.s3.amazonaws.com/'
+        assert res.json['token']
+        self.s3_client.generate_presigned_post.assert_called_once_with(
+            None,
+            'g-cloud-7/submissions/1234/1-service-definition-document-2015-01-02-0304.pdf',
+            Fields=mock.ANY, Conditions=mock.ANY, ExpiresIn=600,
+        )
+
+    @pytest.mark.parametrize('question, filename, status_code', (
+        ('serviceDefinitionDocumentURL', 'document.docx', 400),
+        ('serviceSummary', 'document.pdf', 404),
+        ('unknownDocumentURL', 'document.pdf', 404),
+    ))
+    def test_direct_upload_credentials_are_not_given_for_other_questions_or_documents(
+        self, s3, question, filename, status_code
+    ):
+        self.data_api_client.get_draft_service.return_value = self.empty_draft
+
+        res = self.client.post(
+            '/suppliers/frameworks/g-cloud-7/submissions/scs/1/upload',
+            data={'question': question, 'filename': filename},
+        )
+
+        assert res.status_code == status_code
+        assert self.s3_client.generate_presigned_post.called is False
+
+    def test_direct_upload(self, s3):
+        self.data_api_client.get_draft_service.return_value = self.empty_draft
+        client = self.s3_client
+        client.generate_presigned_post.return_value = {'url': 'https://submissions.s3.amazonaws.com/', 'fields': {}}
+        client.get_object.return_value = {
+            'Body': BytesIO(valid_pdf_bytes[:128]), 'ContentRange': 'bytes 0-127/{}'.format(len(valid_pdf_bytes)),
+        }
+
+        with freeze_time('2015-01-02 03:04:05'):
+            token = self.client.post(
+                '/suppliers/frameworks/g-cloud-7/submissions/scs/1/upload',
+                data={'question': 'serviceDefinitionDocumentURL', 'filename': 'document.pdf'},
+            ).json['token']
+            res = self.client.post(
+                '/suppliers/frameworks/g-cloud-7/submissions/scs/1/edit/service-definition',
+                data={'serviceDefinitionDocumentURL-upload-token': token},
+            )
+
+        assert res.status_code == 302
+        self.data_api_client.update_draft_service.assert_called_once_with(
+            '1', {
+                'serviceDefinitionDocumentURL': 'http://localhost/suppliers/assets/g-cloud-7/submissions/1234/1-service-definition-document-2015-01-02-0304.pdf'  # noqa
+            }, 'email@email.com',
+            page_questions=['serviceDefinitionDocumentURL']
+        )
+        assert self.s3_client.upload_fileobj.called is False
+
     def test_pricing_fields_are_added_correctly(self, s3):
         self.data_api_client.get_draft_service.return_value = self.empty_draft
         res = self.client.post(
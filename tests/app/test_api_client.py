@@ -0,0 +1,100 @@
+from flask import g
+import mock
+
+from dmapiclient.base import BaseAPIClient
+
+from app.api_client import RequestCachedDataAPIClient
+from app.main.helpers.concurrency import call_concurrently
+from .helpers import BaseApplicationTest
+
+
+class TestRequestCachedDataAPIClient(BaseApplicationTest):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.request_patch = mock.patch.object(
+            BaseAPIClient, '_request', autospec=True, side_effect=lambda *args, **kwargs: {'frameworks': {}}
+        )
+        self.base_request = self.request_patch.start()
+        self.client = RequestCachedDataAPIClient(base_url='http://api', auth_token='token')
+
+    def teardown_method(self, method):
+        self.request_patch.stop()
+        super().teardown_method(method)
+
+    def test_identical_gets_are_only_made_once_per_request(self):
+        with self.app.test_request_context('/'):
+            self.client.get_framework('g-cloud-12')
+            self.client.get_framework('g-cloud-12')
+            self.client.get_framework('g-cloud-11')
+
+        assert self.base_request.call_count == 2
+
+    def test_suppliers_and_their_frameworks_and_declarations_are_cached(self):
+        self.base_request.side_effect = lambda *args, **kwargs: {'frameworkInterest': {'declaration': {}}}
+
+        with self.app.test_request_context('/'):
+            for _ in range(2):
+                self.client.get_supplier(1234)
+                self.client.get_supplier_framework_info(1234, 'g-cloud-12')
+                self.client.get_supplier_declaration(1234, 'g-cloud-12')
+
+        assert [call[0][2] for call in self.base_request.call_args_list] == [
+            '/suppliers/1234', '/suppliers/1234/frameworks/g-cloud-12',
+        ]
+
+    def test_lists_and_other_gets_are_not_cached(self):
+        with self.app.test_request_context('/'):
+            for _ in range(2):
+                self.client.find_draft_services(1234, framework='g-cloud-12')
+                self.client.get_supplier_frameworks(1234)
+                self.client.get_draft_service(1)
+
+            assert 'data_api_cache' not in g
+
+        assert self.base_request.call_count == 6
+
+    def test_responses_are_not_shared_between_requests(self):
+        with self.app.test_request_context('/'):
+            self.client.get_framework('g-cloud-12')
+        with self.app.test_request_context('/'):
+            self.client.get_framework('g-cloud-12')
+
+        assert self.base_request.call_count == 2
+
+    def test_writes_clear_the_cache(self):
+        with self.app.test_request_context('/'):
+            self.client.get_supplier(1234)
+            self.client.update_supplier(1234, {'name': 'new name'}, 'user@example.com')
+            self.client.get_supplier(1234)
+
+        assert [call[0][1] for call in self.base_request.call_args_list] == ['GET', 'POST', 'GET']
+
+    def test_cached_responses_can_be_modified_by_callers(self):
+        with self.app.test_request_context('/'):
+            self.client.get_framework('g-cloud-12')['frameworks']['status'] = 'changed'
+
+            assert self.client.get_framework('g-cloud-12') == {'frameworks': {}}
+
+    def test_nothing_is_cached_outside_a_request(self):
+        self.client.get_framework('g-cloud-12')
+        self.client.get_framework('g-cloud-12')
+
+        assert self.base_request.call_count == 2
+
+    def test_calls_made_for_a_request_on_other_threads_share_its_cache(self):
+        with self.app.test_request_context('/'):
+            self.client.get_framework('g-cloud-12')
+            call_concurrently(
+                lambda: self.client.get_framework('g-cloud-12'), lambda: self.client.get_framework('g-cloud-11'),
+            )
+            self.client.get_framework('g-cloud-11')
+
+        assert self.base_request.call_count == 2
+
+    def test_writes_on_other_threads_clear_the_requests_cache(self):
+        with self.app.test_request_context('/'):
+            self.client.get_supplier(1234)
+            call_concurrently(lambda: self.client.update_supplier(1234, {'name': 'new name'}, 'user@example.com'))
+            self.client.get_supplier(1234)
+
+        assert [call[0][1] for call in self.base_request.call_args_list] == ['GET', 'POST', 'GET']
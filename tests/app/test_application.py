@@ -4,8 +4,10 @@ from lxml import html
 
 from wtforms import ValidationError
 from dmapiclient.errors import HTTPError
+from dmcontent.content_loader import ContentManifest
+from flask import Markup
 
-from app.main.helpers.frameworks import question_references
+from app.main.helpers.frameworks import _get_question_numbers, question_references
 from .helpers import BaseApplicationTest
 
 
@@ -107,3 +109,48 @@ class TestQuestionReferences(object):
             'Here’s ]][[ a [[string full of ] misused square brackets]',
             self.get_question_mock
         ) == 'Here’s ]][[ a [[string full of ] misused square brackets]'
+
+    def manifest(self):
+        return ContentManifest([
+            {'slug': 'first', 'name': 'First', 'questions': [{'id': 'q1', 'question': 'One', 'type': 'text'}]},
+            {'slug': 'second', 'name': 'Second', 'questions': [{'id': 'q2', 'question': 'Two', 'type': 'text'}]},
+        ])
+
+    def test_question_numbers_come_from_the_manifest_or_section(self):
+        manifest = self.manifest()
+
+        assert question_references('See [[q2]] and [[q1]]', manifest.get_question) == 'See 2 and 1'
+        assert question_references('See [[q2]]', manifest.sections[1].get_question) == 'See 2'
+
+    def test_numbers_are_not_kept_for_content_the_content_loader_does_not_share(self):
+        manifest = self.manifest()
+
+        assert _get_question_numbers(manifest.get_question) is None
+        assert _get_question_numbers(manifest.sections[0].get_question) is None
+        assert question_references('See [[q2]]', manifest.get_question) == 'See 2'
+
+    @mock.patch('app.main.helpers.frameworks.get_content_loader')
+    def test_replaced_strings_are_reused_by_manifests_with_the_same_questions(self, get_content_loader):
+        get_content_loader.return_value.is_shared.return_value = True
+        manifest = self.manifest()
+        replaced = question_references(Markup('See <b>[[q2]]</b>'), manifest.get_question)
+
+        assert question_references(
+            Markup('See <b>[[q2]]</b>'), ContentManifest(manifest.sections).get_question
+        ) is replaced
+        assert replaced == Markup('See <b>2</b>')
+
+    @mock.patch('app.main.helpers.frameworks.REPLACED_STRINGS_CACHE_SIZE', 2)
+    @mock.patch('app.main.helpers.frameworks.get_content_loader')
+    def test_only_the_most_recently_replaced_strings_are_kept(self, get_content_loader):
+        get_content_loader.return_value.is_shared.return_value = True
+        manifest = self.manifest()
+        first = question_references('See [[q1]]', manifest.get_question)
+        question_references('See [[q2]]', manifest.get_question)
+        question_references('See [[q1]]', manifest.get_question)
+        question_references('See [[q2]] and [[q1]]', manifest.get_question)
+
+        assert question_references('See [[q1]]', manifest.get_question) is first
+        question_references('See [[q2]]', manifest.get_question)
+        question_references('See [[q2]] and [[q1]]', manifest.get_question)
+        assert question_references('See [[q1]]', manifest.get_question) is not first
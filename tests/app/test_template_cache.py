@@ -0,0 +1,113 @@
+"""Test for app/template_cache.py"""
+import os
+
+import jinja2
+from markupsafe import Markup
+import mock
+
+from app.template_cache import (
+    FragmentCache, FragmentCacheExtension, TemplateBytecodeCache, build_template_cache, init_app,
+)
+
+
+class TestTemplateCache:
+    def setup_method(self, method):
+        self.templates = {
+            'index.html': '{% for i in range(3) %}{{ i }}{% endfor %}',
+            'govuk/components/button/template.njk': '<button>{{ params.text }}</button>',
+            'broken.html': '{% if %}',
+            'README.md': '# Not a template',
+        }
+        self.application = mock.Mock(jinja_env=self.environment())
+
+    def environment(self):
+        return jinja2.Environment(loader=jinja2.DictLoader(self.templates))
+
+    def test_all_templates_are_compiled_into_the_cache(self, tmpdir):
+        compiled, failed = build_template_cache(self.application, str(tmpdir))
+
+        assert sorted(compiled) == ['govuk/components/button/template.njk', 'index.html']
+        assert failed == ['broken.html']
+        assert len([name for name in os.listdir(str(tmpdir)) if name.endswith('.cache')]) == 2
+
+    def test_templates_are_loaded_from_the_cache(self, tmpdir):
+        build_template_cache(self.application, str(tmpdir))
+
+        environment = self.environment()
+        init_app(mock.Mock(jinja_env=environment), str(tmpdir))
+
+        with mock.patch.object(environment, 'compile', wraps=environment.compile) as compile:
+            assert environment.get_template('index.html').render() == '012'
+
+        assert compile.called is False
+
+    def test_templates_changed_since_the_cache_was_built_are_compiled_again(self, tmpdir):
+        build_template_cache(self.application, str(tmpdir))
+        self.templates['index.html'] = 'changed'
+
+        environment = self.environment()
+        init_app(mock.Mock(jinja_env=environment), str(tmpdir))
+
+        assert environment.get_template('index.html').render() == 'changed'
+
+    def test_no_cache_is_used_if_it_has_not_been_built(self, tmpdir):
+        init_app(self.application, str(tmpdir.join('template-cache')))
+
+        assert self.application.jinja_env.bytecode_cache is None
+
+    def test_a_read_only_cache_is_not_written_to(self, tmpdir):
+        bytecode_cache = TemplateBytecodeCache(str(tmpdir))
+        environment = self.environment()
+        environment.bytecode_cache = bytecode_cache
+
+        with mock.patch('tempfile.mkstemp', side_effect=PermissionError):
+            assert environment.get_template('index.html').render() == '012'
+
+        assert os.listdir(str(tmpdir)) == []
+
+
+class TestFragmentCacheExtension:
+    def setup_method(self, method):
+        self.environment = jinja2.Environment(
+            loader=jinja2.DictLoader({
+                'fragment.html': (
+                    '{% cache framework.slug, framework.status %}'
+                    '{{ render(framework.name) }}'
+                    '{% endcache %}'
+                    '{% cache framework.slug %}, {{ framework.name }}{% endcache %}'
+                ),
+            }),
+            autoescape=True,
+            extensions=[FragmentCacheExtension],
+        )
+        self.render = mock.Mock(side_effect=lambda name: name)
+
+    def render_fragment(self, **framework):
+        return self.environment.get_template('fragment.html').render(framework=framework, render=self.render)
+
+    def test_fragments_are_rendered_once_for_their_keys(self):
+        assert self.render_fragment(slug='g-cloud-12', status='open', name='G-Cloud 12') == 'G-Cloud 12, G-Cloud 12'
+        # nothing else the fragments use is checked
+        assert self.render_fragment(slug='g-cloud-12', status='open', name='G-Cloud 13') == 'G-Cloud 12, G-Cloud 12'
+        assert self.render.call_args_list == [mock.call('G-Cloud 12')]
+
+    def test_fragments_are_rendered_again_for_other_keys(self):
+        self.render_fragment(slug='g-cloud-12', status='open', name='G-Cloud 12')
+
+        assert self.render_fragment(slug='g-cloud-12', status='live', name='G-Cloud 13') == 'G-Cloud 13, G-Cloud 12'
+        assert self.render_fragment(slug='g-cloud-11', name='G-Cloud 11') == 'G-Cloud 11, G-Cloud 11'
+
+    def test_cached_fragments_are_escaped_once(self):
+        assert self.render_fragment(slug='g-cloud-12', status='open', name='<b>') == '&lt;b&gt;, &lt;b&gt;'
+        assert self.render_fragment(slug='g-cloud-12', status='open', name='<b>') == '&lt;b&gt;, &lt;b&gt;'
+
+    def test_keys_can_be_undefined(self):
+        assert self.render_fragment(name='G-Cloud 12') == 'G-Cloud 12, G-Cloud 12'
+
+
+def test_least_recently_used_fragments_are_dropped():
+    fragment_cache = FragmentCache(size=2)
+    for key in ('a', 'b', 'a', 'c'):
+        fragment_cache.get(key, lambda: Markup(key))
+
+    assert list(fragment_cache._fragments) == ['a', 'c']